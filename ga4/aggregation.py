@@ -0,0 +1,84 @@
+from functools import cached_property
+
+import pandas as pd
+
+
+class AggregationContext:
+    """한 필터 상태에 대한 집계를 필요할 때 한 번만 계산해 보관합니다.
+
+    여러 섹션이 같은 집계(이벤트별 합계, 일별 추이, 소스/기기별 분포)를
+    사용하므로, 한 번의 실행에서 같은 그룹 집계가 두 번 일어나지 않도록
+    모든 섹션이 이 객체를 통해 조회합니다. df 대신 데이터프레임을 반환하는
+    함수를 넘기면 실제로 집계가 필요할 때까지 필터링을 미룹니다.
+    """
+
+    def __init__(self, df):
+        self._source = df
+
+    @cached_property
+    def df(self):
+        """집계 대상 데이터프레임"""
+        return self._source() if callable(self._source) else self._source
+
+    def _sum_users(self, keys):
+        return self.df.groupby(keys, observed=True)['users'].sum()
+
+    @cached_property
+    def event_totals(self):
+        """이벤트별 사용자 수 합계"""
+        return self._sum_users('event_name')
+
+    @cached_property
+    def daily_users(self):
+        """일별 전체 사용자/신규 사용자 수 (date, users, new_users)"""
+        return self.df.groupby('date').agg({
+            'users': 'sum',
+            'new_users': 'sum'
+        }).reset_index()
+
+    @cached_property
+    def event_date_users(self):
+        """(이벤트, 날짜)별 사용자 수"""
+        return self._sum_users(['event_name', 'date'])
+
+    @cached_property
+    def event_source_users(self):
+        """(이벤트, 소스/매체)별 사용자 수"""
+        return self._sum_users(['event_name', 'source_medium'])
+
+    @cached_property
+    def event_device_users(self):
+        """(이벤트, 기기 유형)별 사용자 수"""
+        return self._sum_users(['event_name', 'device_category'])
+
+    def segment_event_users(self, dimension):
+        """(이벤트, 세그먼트)별 사용자 수. 세그먼트는 소스/매체 또는 기기 유형입니다."""
+        if dimension == 'source_medium':
+            return self.event_source_users
+        if dimension == 'device_category':
+            return self.event_device_users
+        raise ValueError(f"unsupported breakdown dimension: {dimension}")
+
+    def event_total(self, event):
+        """이벤트 하나의 사용자 수 합계"""
+        return int(self.event_totals.get(event, 0))
+
+    def event_by_date(self, event):
+        """이벤트의 일별 사용자 수 (날짜 인덱스)"""
+        return self._select_event(self.event_date_users, event)
+
+    def event_by_source(self, event):
+        """이벤트의 소스/매체별 사용자 수"""
+        return self._select_event(self.event_source_users, event)
+
+    def event_by_device(self, event):
+        """이벤트의 기기 유형별 사용자 수"""
+        return self._select_event(self.event_device_users, event)
+
+    @staticmethod
+    def _select_event(series, event):
+        try:
+            return series.loc[event]
+        except KeyError:
+            level = series.index.levels[1]
+            return pd.Series([], index=level[:0], name=series.name, dtype='int64')
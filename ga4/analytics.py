@@ -0,0 +1,305 @@
+"""GA4 분석 계산 모듈.
+
+대시보드, 일괄 리포트, 벤치마크가 공통으로 사용하는 집계 함수 모음입니다.
+Streamlit이나 Altair에 의존하지 않고 표(데이터프레임)와 값만 반환하므로
+결과 캐시, 워커 프로세스, 명령행 도구에서 같은 코드를 그대로 사용할 수 있습니다.
+차트는 charts.py, 화면 배치는 streamlit_ga4.py가 이 결과를 받아 만듭니다.
+
+ctx 인자는 AggregationContext 또는 그 하위 클래스(PrefixAggregationContext,
+SqlAggregationContext)입니다.
+"""
+import os
+from dataclasses import dataclass, replace
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from aggregation import AggregationContext
+from filter_index import FilterSpec
+from funnel import FUNNEL_STEPS, compute_funnel
+from incremental import IncrementalDataset
+from prefix_index import PrefixAggregationContext
+
+# 기간 비교 방식 {키: 화면 이름}
+COMPARISON_MODES = {'previous': '이전 기간', 'week': '전주', 'year': '전년'}
+
+# 분포 차트에 개별로 표시할 상위 소스/매체 수 (나머지는 '기타'로 합산)
+TOP_SOURCES = int(os.environ.get('GA4_TOP_SOURCES', 15))
+OTHER_LABEL = '기타'
+
+# 최고 전환율 채널 후보가 되기 위한 최소 page_view 사용자 수
+MIN_CHANNEL_PAGEVIEWS = int(os.environ.get('GA4_MIN_CHANNEL_PAGEVIEWS', 100))
+
+
+def open_context(dataset: IncrementalDataset, spec: FilterSpec | None = None) -> AggregationContext:
+    """데이터셋과 필터 상태의 집계 컨텍스트를 만듭니다.
+
+    누적합 인덱스가 있으면 조회만으로 집계하고, 없으면 첫 집계 때 필터링합니다.
+    """
+    if dataset.prefix_index is not None:
+        return PrefixAggregationContext(dataset.prefix_index, spec)
+    if spec is None:
+        return AggregationContext(dataset.cube)
+    filter_index = dataset.filter_index
+    return AggregationContext(lambda: filter_index.select(spec))
+
+
+def compute_kpi_metrics(ctx: AggregationContext, min_pageviews: int = MIN_CHANNEL_PAGEVIEWS) -> dict:
+    """주요 KPI 지표를 계산합니다.
+
+    최고 전환율 채널은 page_view 사용자가 min_pageviews 이상인 채널 중에서 고릅니다.
+    기준을 넘는 채널이 없으면 page_view가 있는 채널 중에서 고르고 below_threshold를 참으로 표시합니다.
+    """
+    # 구매 전환 관련 데이터 계산
+    total_purchases = ctx.event_total('purchase')
+
+    # 최대 구매 발생일 계산
+    daily_purchases = ctx.event_by_date('purchase')
+    if not daily_purchases.empty:
+        max_purchase_date = daily_purchases.idxmax()
+        max_purchase_count = daily_purchases.max()
+    else:
+        max_purchase_date = None
+        max_purchase_count = 0
+
+    # 채널별 전환율과 최소 방문 기준을 한 번에 계산해 가장 높은 채널 선택
+    # (page_view가 없는 채널은 전환율을 정의할 수 없으므로 제외)
+    channel_pageviews = ctx.event_by_source('page_view')
+    pageviews = channel_pageviews.to_numpy()
+    purchases = ctx.event_by_source('purchase').reindex(channel_pageviews.index, fill_value=0).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conversion_rates = (purchases / pageviews * 100).round(2)
+    has_pageviews = pageviews > 0
+    eligible = has_pageviews & (pageviews >= min_pageviews)
+    # 기준을 넘는 채널이 없으면(필터로 좁힌 경우 등) page_view가 있는 채널 중에서 고름
+    below_threshold = not eligible.any()
+    candidates = has_pageviews if below_threshold else eligible
+    if candidates.any():
+        best = int(np.argmax(np.where(candidates, conversion_rates, -np.inf)))
+        best_channel = {
+            'source_medium': channel_pageviews.index[best],
+            'conversion_rate': conversion_rates[best],
+            'below_threshold': below_threshold
+        }
+    else:
+        best_channel = {
+            'source_medium': "데이터 없음",
+            'conversion_rate': 0,
+            'below_threshold': False
+        }
+
+    return {
+        'total_purchases': total_purchases,
+        'best_channel': best_channel,
+        'max_purchase_date': max_purchase_date,
+        'max_purchase_count': max_purchase_count
+    }
+
+
+def funnel_stats(ctx: AggregationContext, steps=FUNNEL_STEPS) -> pd.DataFrame:
+    """퍼널 단계별 사용자 수와 전체 대비/이전 단계 대비 전환율 (step, users, conversion_from_start, step_to_step_rate)"""
+    return compute_funnel(ctx.event_totals, steps)
+
+
+def daily_user_stats(ctx: AggregationContext) -> pd.DataFrame:
+    """일별 사용자 수에 재방문 사용자 수와 신규 사용자 비율을 더합니다."""
+    users_df = ctx.daily_users.copy()
+    users_df['returning_users'] = users_df['users'] - users_df['new_users']
+    users_df['new_users_ratio'] = (users_df['new_users'] / users_df['users'] * 100).round(1)
+    return users_df
+
+
+def purchase_trend(ctx: AggregationContext) -> pd.DataFrame:
+    """일별 구매 사용자 수 (date, users)"""
+    return ctx.event_by_date('purchase').reset_index()
+
+
+def top_k(series: pd.Series, k: int, other_label: str = OTHER_LABEL) -> pd.Series:
+    """값이 큰 상위 k개를 내림차순으로 남기고 나머지는 other_label 하나로 합칩니다.
+
+    전체 정렬 대신 부분 선택(argpartition)으로 상위 k개만 고른 뒤 그 k개만 정렬하므로
+    항목 수가 많아도 비용이 거의 선형입니다. 합계는 원래와 같습니다.
+    항목이 k개 이하이면 그대로 반환합니다.
+    """
+    if len(series) <= k:
+        return series
+    values = series.to_numpy()
+    top = np.argpartition(-values, k - 1)[:k]
+    top = top[np.argsort(-values[top], kind='stable')]
+    rest = np.ones(len(values), dtype=bool)
+    rest[top] = False
+    index = pd.Index(np.append(series.index[top].astype(object), other_label), name=series.index.name)
+    return pd.Series(np.append(values[top], values[rest].sum()), index=index, name=series.name)
+
+
+def event_distribution(ctx: AggregationContext, event: str, dimension: str, top: int | None = None) -> pd.DataFrame:
+    """이벤트의 소스/매체 또는 기기 유형별 사용자 수와 비율(%) (dimension, users, percentage)
+
+    top을 주면 상위 top개와 나머지를 합친 '기타' 행만 반환합니다. 비율은 전체 합계 기준입니다.
+    """
+    if dimension == 'source_medium':
+        series = ctx.event_by_source(event)
+    elif dimension == 'device_category':
+        series = ctx.event_by_device(event)
+    else:
+        raise ValueError(f"unsupported breakdown dimension: {dimension}")
+    if top is not None:
+        series = top_k(series, top)
+    table = series.reset_index()
+    total = table['users'].sum()
+    table['percentage'] = (table['users'] / total * 100).round(1) if total else 0.0
+    return table
+
+
+def comparison_spec(spec: FilterSpec, mode: str) -> FilterSpec:
+    """같은 소스/매체와 기기 유형으로 비교 기간의 필터 상태를 만듭니다.
+
+    previous는 선택한 기간 바로 앞의 같은 길이 기간, week는 7일 전, year는 1년 전입니다.
+    """
+    start, end = spec.date_range
+    if mode == 'previous':
+        shift = end - start + timedelta(days=1)
+    elif mode == 'week':
+        shift = timedelta(days=7)
+    elif mode == 'year':
+        start, end = ((pd.Timestamp(date) - pd.DateOffset(years=1)).date() for date in (start, end))
+        return replace(spec, date_range=(start, end))
+    else:
+        raise ValueError(f"unsupported comparison mode: {mode}")
+    return replace(spec, date_range=(start - shift, end - shift))
+
+
+def _change_rate(current, previous):
+    """변화율(%). 비교 값이 0이면 NaN입니다."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous > 0, (current - previous) / previous * 100, np.nan).round(1)
+
+
+def compare_kpis(current: dict, previous: dict) -> dict:
+    """KPI의 비교 기간 대비 변화량
+
+    total_purchases는 (차이, 변화율%), best_channel_rate는 최고 전환율의 차이(%p),
+    max_purchase_count는 최대 일 구매 수의 차이입니다.
+    """
+    purchases_delta = current['total_purchases'] - previous['total_purchases']
+    return {
+        'total_purchases': (purchases_delta,
+                            float(_change_rate(current['total_purchases'], previous['total_purchases']))),
+        'best_channel_rate': round(current['best_channel']['conversion_rate']
+                                   - previous['best_channel']['conversion_rate'], 2),
+        'max_purchase_count': int(current['max_purchase_count'] - previous['max_purchase_count'])
+    }
+
+
+def compare_funnel(current: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """퍼널 단계별 사용자 수와 전환율의 비교 기간 대비 변화
+
+    (step, users, previous_users, users_change, conversion_from_start, conversion_change,
+    step_to_step_rate, step_rate_change) 표이며 전환율 변화는 %p 차이입니다.
+    """
+    users = current['users'].to_numpy()
+    previous_users = previous['users'].to_numpy()
+    return pd.DataFrame({
+        'step': current['step'],
+        'users': users,
+        'previous_users': previous_users,
+        'users_change': _change_rate(users, previous_users),
+        'conversion_from_start': current['conversion_from_start'],
+        'conversion_change': (current['conversion_from_start'] - previous['conversion_from_start']).round(1),
+        'step_to_step_rate': current['step_to_step_rate'],
+        'step_rate_change': (current['step_to_step_rate'] - previous['step_to_step_rate']).round(1)
+    })
+
+
+# 내려받기용 표 (화면의 다운로드 버튼, 전체 내보내기, 일괄 리포트가 같은 형식 사용)
+def funnel_download_table(funnel_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        '단계': funnel_df['step'],
+        '사용자 수': funnel_df['users'],
+        '전체 대비 전환율(%)': funnel_df['conversion_from_start'],
+        '이전 단계 대비 전환율(%)': funnel_df['step_to_step_rate']
+    })
+
+
+def users_download_table(users_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        '날짜': users_df['date'],
+        '전체 사용자': users_df['users'],
+        '신규 사용자': users_df['new_users'],
+        '재방문 사용자': users_df['returning_users'],
+        '신규 사용자 비율(%)': users_df['new_users_ratio']
+    })
+
+
+def purchase_download_table(purchase_df: pd.DataFrame) -> pd.DataFrame | None:
+    """구매 데이터가 없으면 None입니다."""
+    if len(purchase_df) == 0:
+        return None
+    return pd.DataFrame({
+        '날짜': purchase_df['date'],
+        '구매 사용자 수': purchase_df['users']
+    })
+
+
+def funnel_comparison_table(comparison_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        '단계': comparison_df['step'],
+        '사용자 수': comparison_df['users'],
+        '비교 기간 사용자 수': comparison_df['previous_users'],
+        '사용자 변화율(%)': comparison_df['users_change'],
+        '전체 대비 전환율(%)': comparison_df['conversion_from_start'],
+        '전체 대비 전환율 변화(%p)': comparison_df['conversion_change'],
+        '이전 단계 대비 전환율(%)': comparison_df['step_to_step_rate'],
+        '이전 단계 대비 전환율 변화(%p)': comparison_df['step_rate_change']
+    })
+
+
+def event_distribution_table(ctx: AggregationContext, dimension: str, events=FUNNEL_STEPS) -> pd.DataFrame:
+    """여러 이벤트의 분포를 event_name 컬럼을 붙여 한 표로 합칩니다."""
+    tables = []
+    for event in events:
+        table = event_distribution(ctx, event, dimension)
+        table.insert(0, 'event_name', event)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+@dataclass
+class Report:
+    """필터 상태 하나에 대한 전체 섹션 결과입니다."""
+
+    kpis: dict
+    funnel: pd.DataFrame
+    users: pd.DataFrame
+    purchase_trend: pd.DataFrame | None
+    event_sources: pd.DataFrame
+    event_devices: pd.DataFrame
+
+    def tables(self) -> dict:
+        """내보낼 표 {이름: 데이터프레임} (구매 데이터가 없으면 구매 추이 제외)"""
+        tables = {
+            'funnel': self.funnel,
+            'users': self.users,
+            'purchase_trend': self.purchase_trend,
+            'event_sources': self.event_sources,
+            'event_devices': self.event_devices
+        }
+        return {name: table for name, table in tables.items() if table is not None}
+
+
+def compute_report(dataset: IncrementalDataset, spec: FilterSpec | None = None, steps=FUNNEL_STEPS) -> Report:
+    """데이터셋과 필터 상태로 모든 섹션의 결과 표를 계산합니다."""
+    return report_from_context(open_context(dataset, spec), steps)
+
+
+def report_from_context(ctx: AggregationContext, steps=FUNNEL_STEPS) -> Report:
+    """집계 컨텍스트로 모든 섹션의 결과 표를 계산합니다. 차트도 만들 때 같은 컨텍스트를 재사용합니다."""
+    return Report(
+        kpis=compute_kpi_metrics(ctx),
+        funnel=funnel_download_table(funnel_stats(ctx, steps)),
+        users=users_download_table(daily_user_stats(ctx)),
+        purchase_trend=purchase_download_table(purchase_trend(ctx)),
+        event_sources=event_distribution_table(ctx, 'source_medium'),
+        event_devices=event_distribution_table(ctx, 'device_category')
+    )
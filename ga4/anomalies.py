@@ -0,0 +1,215 @@
+"""시계열 이상 탐지.
+
+(소스/매체, 기기 유형, 이벤트) 조합마다 일별 사용자 수 시계열을 만들고,
+EWMA 또는 이동 구간(rolling) 기준선 대비 z-점수를 모든 시계열에 대해
+한 번에(NumPy 배열 연산으로) 계산합니다. 각 날짜의 z-점수는 그 이전 날짜들만으로
+만든 기준선과 비교하므로, 날짜가 뒤에 추가되면 새 날짜만 계산하면 됩니다.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS
+
+# 기준선 계산 방식 (ewma 또는 rolling)
+ANOMALY_METHOD = os.environ.get('GA4_ANOMALY_METHOD', 'ewma')
+
+# EWMA 기준선의 기간(일). 가중치 alpha = 2 / (span + 1)
+EWMA_SPAN = int(os.environ.get('GA4_ANOMALY_SPAN', 14))
+
+# rolling 기준선의 구간 길이(일)
+ROLLING_WINDOW = int(os.environ.get('GA4_ANOMALY_WINDOW', 28))
+
+# z-점수를 계산하기 전에 필요한 최소 이력 일수
+MIN_PERIODS = int(os.environ.get('GA4_ANOMALY_MIN_PERIODS', 7))
+
+# 이상으로 표시할 |z| 기준
+Z_THRESHOLD = float(os.environ.get('GA4_ANOMALY_Z', 3.0))
+
+# 순위표에서 제외할 작은 시계열의 기준선 사용자 수
+MIN_BASELINE = float(os.environ.get('GA4_ANOMALY_MIN_USERS', 10))
+
+
+def ewma_zscores(values, span=EWMA_SPAN, min_periods=MIN_PERIODS, min_std=0.0, state=None):
+    """[시계열, 날짜] 배열의 EWMA 기준선과 z-점수를 계산합니다.
+
+    날짜 축만 순서대로 진행하고 각 날짜는 모든 시계열을 한 번에 계산합니다.
+    state는 이전 호출이 반환한 (평균, 분산, 이력 일수)이며, 주면 그 뒤에 이어서 계산합니다.
+    반환값은 (z-점수, 기준선, 새 state)이고, 이력이 min_periods보다 짧거나
+    표준편차가 0이면 z-점수는 NaN입니다.
+    """
+    values = np.asarray(values, dtype='float64')
+    n_series, n_days = values.shape
+    if state is None:
+        mean, var, count = np.zeros(n_series), np.zeros(n_series), np.zeros(n_series, dtype='int64')
+    else:
+        mean, var, count = (array.copy() for array in state)
+    alpha = 2.0 / (span + 1)
+
+    zscores = np.full((n_series, n_days), np.nan)
+    baseline = np.full((n_series, n_days), np.nan)
+    for day in range(n_days):
+        x = values[:, day]
+        diff = x - mean
+        std = np.maximum(np.sqrt(var), min_std)
+        ready = (count >= min_periods) & (std > 0)
+        baseline[:, day] = np.where(count > 0, mean, np.nan)
+        np.divide(diff, std, out=zscores[:, day], where=ready)
+
+        first = count == 0
+        mean = np.where(first, x, mean + alpha * diff)
+        var = np.where(first, 0.0, (1 - alpha) * (var + alpha * diff * diff))
+        count += 1
+    return zscores, baseline, (mean, var, count)
+
+
+def rolling_zscores(values, window=ROLLING_WINDOW, min_periods=MIN_PERIODS, min_std=0.0, history=None):
+    """[시계열, 날짜] 배열의 이동 구간 기준선(직전 window일 평균)과 z-점수를 계산합니다.
+
+    누적합으로 모든 시계열과 날짜를 반복문 없이 계산합니다. history는 이전 호출이
+    반환한 직전 window일의 값이며, 주면 그 뒤에 이어서 계산합니다.
+    반환값은 (z-점수, 기준선, 새 history)입니다.
+    """
+    values = np.asarray(values, dtype='float64')
+    n_series, n_days = values.shape
+    if history is None:
+        history = np.empty((n_series, 0))
+    full = np.hstack([history, values])
+    offset = history.shape[1]
+
+    # 큰 값의 제곱합에서 정밀도를 잃지 않도록 시계열별 첫 값 기준으로 이동
+    shift = full[:, :1] if full.shape[1] else np.zeros((n_series, 1))
+    centered = full - shift
+    zeros = np.zeros((n_series, 1))
+    sums = np.hstack([zeros, np.cumsum(centered, axis=1)])
+    squares = np.hstack([zeros, np.cumsum(centered * centered, axis=1)])
+
+    days = np.arange(offset, offset + n_days)
+    starts = np.maximum(days - window, 0)
+    counts = (days - starts).astype('float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        window_sum = sums[:, days] - sums[:, starts]
+        window_mean = window_sum / counts
+        window_var = (squares[:, days] - squares[:, starts] - window_sum * window_mean) / (counts - 1)
+        std = np.maximum(np.sqrt(np.maximum(window_var, 0)), min_std)
+        baseline = window_mean + shift
+        ready = (counts >= min_periods) & (std > 0)
+        zscores = np.where(ready, (centered[:, days] - window_mean) / std, np.nan)
+    baseline[:, counts == 0] = np.nan
+    return zscores, baseline, full[:, -window:]
+
+
+def series_zscores(values, method=ANOMALY_METHOD, min_std=0.0):
+    """시계열 하나의 z-점수 배열 (차트의 급증/급감 표시용)"""
+    values = np.asarray(values, dtype='float64')[np.newaxis, :]
+    if method == 'rolling':
+        return rolling_zscores(values, min_std=min_std)[0][0]
+    return ewma_zscores(values, min_std=min_std)[0][0]
+
+
+class AnomalyDetector:
+    """큐브의 모든 (소스/매체, 기기 유형, 이벤트) 시계열에 대한 이상 탐지 상태입니다.
+
+    fit()은 전체 날짜를, update()는 마지막으로 반영한 날짜 이후의 행만 계산해
+    새 탐지기를 반환합니다(기존 객체는 바꾸지 않으므로 여러 세션이 공유해도 안전).
+    latest에는 마지막 날짜의 시계열별 값, 기준선, z-점수가 들어 있습니다.
+    사용자 수는 횟수 데이터이므로 표준편차는 최소 1로 둡니다.
+    """
+
+    def __init__(self, method=ANOMALY_METHOD, metric='users'):
+        if method not in ('ewma', 'rolling'):
+            raise ValueError(f"unsupported anomaly method: {method}")
+        self.method = method
+        self.metric = metric
+        self.keys = pd.MultiIndex.from_arrays([[]] * len(DIMENSIONS), names=DIMENSIONS)
+        self.state = None
+        self.days = 0
+        self.last_date = None
+        self.latest = None
+
+    def fit(self, cube):
+        """큐브 전체로 새 탐지기를 만듭니다."""
+        return AnomalyDetector(self.method, self.metric)._advance(cube)
+
+    def update(self, tail):
+        """마지막 날짜 이후에 추가된 행(tail)만 반영한 새 탐지기를 반환합니다."""
+        if len(tail) and self.last_date is not None and tail['date'].iloc[0] <= self.last_date:
+            raise ValueError("AnomalyDetector.update requires rows after the last processed date")
+        detector = AnomalyDetector(self.method, self.metric)
+        detector.keys, detector.state, detector.days = self.keys, self.state, self.days
+        detector.last_date, detector.latest = self.last_date, self.latest
+        return detector._advance(tail)
+
+    def _advance(self, part):
+        if len(part) == 0:
+            return self
+
+        # 행을 시계열 번호와 날짜 번호로 변환 (고유 조합 수만큼만 문자열 비교)
+        combined = np.zeros(len(part), dtype='int64')
+        for col in DIMENSIONS:
+            categorical = part[col].astype('category')
+            combined = combined * (len(categorical.cat.categories) + 1) + categorical.cat.codes.to_numpy()
+        _, first_rows, group_ids = np.unique(combined, return_index=True, return_inverse=True)
+        group_keys = pd.MultiIndex.from_frame(
+            part[DIMENSIONS].iloc[first_rows].astype('object').reset_index(drop=True)
+        )
+        positions = self.keys.get_indexer(group_keys)
+        new_keys = group_keys[positions < 0]
+        if len(new_keys):
+            positions[positions < 0] = np.arange(len(self.keys), len(self.keys) + len(new_keys))
+            self.keys = self.keys.append(new_keys)
+            self.state = self._grow_state(len(new_keys))
+        series = positions[group_ids]
+
+        start = part['date'].iloc[0] if self.last_date is None else self.last_date + pd.Timedelta(days=1)
+        end = part['date'].iloc[-1]
+        days = ((part['date'] - start) // pd.Timedelta(days=1)).to_numpy()
+        n_days = (end - start).days + 1
+        values = np.zeros((len(self.keys), n_days))
+        np.add.at(values, (series, days), part[self.metric].to_numpy(dtype='float64'))
+
+        if self.method == 'ewma':
+            zscores, baseline, self.state = ewma_zscores(values, min_std=1.0, state=self.state)
+        else:
+            zscores, baseline, self.state = rolling_zscores(values, min_std=1.0, history=self.state)
+
+        self.days += n_days
+        self.last_date = end
+        self.latest = pd.DataFrame({
+            'value': values[:, -1],
+            'baseline': baseline[:, -1],
+            'zscore': zscores[:, -1]
+        }, index=self.keys)
+        return self
+
+    def _grow_state(self, count):
+        """새 시계열의 상태를 추가합니다. 새 시계열은 그동안 0이었던 것으로 봅니다."""
+        if self.state is None:
+            return None
+        if self.method == 'ewma':
+            mean, var, days = self.state
+            return (np.concatenate([mean, np.zeros(count)]), np.concatenate([var, np.zeros(count)]),
+                    np.concatenate([days, np.full(count, self.days, dtype='int64')]))
+        return np.vstack([self.state, np.zeros((count, self.state.shape[1]))])
+
+    def ranked(self, spec=None, top=50, threshold=Z_THRESHOLD, min_baseline=MIN_BASELINE):
+        """마지막 날짜에 |z|가 threshold 이상인 시계열을 |z| 큰 순서로 반환합니다.
+
+        spec(FilterSpec)을 주면 선택한 소스/매체와 기기 유형만 포함합니다.
+        """
+        columns = DIMENSIONS + ['date', 'value', 'baseline', 'zscore', 'direction']
+        if self.latest is None:
+            return pd.DataFrame(columns=columns)
+        latest = self.latest
+        mask = (latest['zscore'].abs() >= threshold) & (latest['baseline'] >= min_baseline)
+        if spec is not None and spec.sources:
+            mask &= latest.index.get_level_values('source_medium').isin(spec.sources)
+        if spec is not None and spec.device is not None:
+            mask &= latest.index.get_level_values('device_category') == spec.device
+        table = latest[mask.to_numpy()]
+        order = np.argsort(-table['zscore'].abs().to_numpy(), kind='stable')[:top]
+        table = table.iloc[order].reset_index()
+        table.insert(len(DIMENSIONS), 'date', self.last_date)
+        table['direction'] = np.where(table['zscore'] > 0, 'up', 'down')
+        return table[columns]
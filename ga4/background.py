@@ -0,0 +1,234 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from cube import build_cube, cache_key
+from dataset_cache import DatasetCache
+from ingest import DateFormatError, IngestCancelled, SchemaError, malformed_key, stream_aggregate
+
+# 동시에 실행할 백그라운드 수집 워커 프로세스 수 (환경 변수로 변경 가능)
+INGEST_WORKERS = int(os.environ.get('GA4_INGEST_WORKERS', 2))
+
+# 워커 프로세스의 nice 값 (대시보드 응답보다 낮은 우선순위로 실행)
+INGEST_NICENESS = int(os.environ.get('GA4_INGEST_NICENESS', 10))
+
+# 부분 집계 결과를 저장하는 최소 간격(초)
+PARTIAL_INTERVAL_SECONDS = float(os.environ.get('GA4_PARTIAL_INTERVAL_SECONDS', 2))
+
+# 진행 화면을 새로 고치는 간격(초)
+PROGRESS_POLL_SECONDS = float(os.environ.get('GA4_PROGRESS_POLL_SECONDS', 1))
+
+# 작업 상태 파일을 두는 캐시 하위 폴더
+JOBS_DIRNAME = 'jobs'
+
+
+def _partial_key(file_hash):
+    return f"partial-{file_hash}"
+
+
+def _status_path(jobs_root, file_hash):
+    return os.path.join(jobs_root, f"{file_hash}.json")
+
+
+def _write_json(path, payload):
+    """다른 프로세스가 쓰다 만 내용을 읽지 않도록 임시 파일에 쓴 뒤 교체합니다."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def run_ingest(path, file_hash, cache_root, cache_max_bytes):
+    """워커 프로세스에서 CSV를 청크 단위로 집계하고 큐브를 디스크 캐시에 저장합니다.
+
+    진행률, 부분 집계, 오류는 작업 폴더의 파일로 남겨 대시보드가 읽습니다.
+    """
+    jobs = DatasetCache(os.path.join(cache_root, JOBS_DIRNAME))
+    status_path = _status_path(jobs.root, file_hash)
+    last_partial = [0.0]
+
+    def on_progress(fraction):
+        _write_json(status_path, {'fraction': fraction})
+
+    def on_partial(partials):
+        now = time.monotonic()
+        if now - last_partial[0] < PARTIAL_INTERVAL_SECONDS:
+            return
+        last_partial[0] = now
+        jobs.put(_partial_key(file_hash), build_cube(pd.concat(partials, ignore_index=True)))
+
+    dataset_cache = DatasetCache(cache_root, cache_max_bytes)
+
+    def on_malformed(report):
+        dataset_cache.put(malformed_key(file_hash), report)
+
+    try:
+        with open(path, 'rb') as f:
+            cube = stream_aggregate(f, on_progress=on_progress, on_partial=on_partial, on_malformed=on_malformed)
+    except SchemaError as e:
+        _write_json(status_path, {'error': 'schema', 'missing_columns': e.missing_columns})
+        return 1
+    except DateFormatError as e:
+        _write_json(status_path, {'error': 'date_format', 'message': str(e)})
+        return 1
+    except Exception as e:
+        # 그 밖의 오류도 대시보드가 파일 이름과 함께 안내하도록 메시지를 남김 (상세 내용은 서버 로그)
+        traceback.print_exc()
+        _write_json(status_path, {'error': 'failed', 'message': str(e).strip() or type(e).__name__})
+        return 1
+    dataset_cache.put(cache_key(file_hash), cube)
+    return 0
+
+
+class IngestJob:
+    """워커 프로세스에서 진행 중인 파일 하나의 수집 작업입니다."""
+
+    def __init__(self, file_hash, name, jobs_root, spool_path=None):
+        self.file_hash = file_hash
+        self.name = name
+        self.jobs = DatasetCache(jobs_root)
+        self.spool_path = spool_path
+        self.future = None
+        self.returncode = None
+        self._process = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """queued, running, done, cancelled, failed 중 하나"""
+        if self._cancelled:
+            return 'cancelled'
+        if self.returncode is None:
+            return 'running' if self._process is not None else 'queued'
+        return 'done' if self.returncode == 0 else 'failed'
+
+    @property
+    def error(self):
+        """실패한 작업의 예외 (없으면 None)"""
+        if self.state != 'failed':
+            return None
+        status = _read_json(_status_path(self.jobs.root, self.file_hash))
+        if status.get('error') == 'schema':
+            return SchemaError(status['missing_columns'])
+        if status.get('error') == 'date_format':
+            return DateFormatError(status['message'])
+        if status.get('error') == 'failed':
+            return RuntimeError(status['message'])
+        return RuntimeError(f"ingest worker exited with code {self.returncode}")
+
+    def progress(self):
+        """워커가 마지막으로 기록한 진행률 (0~1)"""
+        return _read_json(_status_path(self.jobs.root, self.file_hash)).get('fraction', 0.0)
+
+    def partial_cube(self):
+        """지금까지 집계된 부분 큐브 (아직 없으면 None)"""
+        return self.jobs.get(_partial_key(self.file_hash))
+
+    def cancel(self):
+        """대기 중이면 실행하지 않고, 실행 중이면 워커 프로세스를 종료합니다."""
+        with self._lock:
+            self._cancelled = True
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+
+    def run(self, cache_root, cache_max_bytes, path):
+        """스레드 풀에서 호출되어 워커 프로세스를 실행하고 끝날 때까지 기다립니다."""
+        with self._lock:
+            if self._cancelled:
+                self._cleanup()
+                raise IngestCancelled(self.file_hash)
+            self._process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), path, self.file_hash,
+                 cache_root, str(cache_max_bytes)],
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+        returncode = self._process.wait()
+        self._cleanup(keep_status=returncode != 0 and not self._cancelled)
+        self.returncode = returncode
+        if self._cancelled:
+            raise IngestCancelled(self.file_hash)
+        return returncode
+
+    def _cleanup(self, keep_status=False):
+        """작업 폴더에 남은 임시 파일을 지웁니다. 실패한 작업은 오류 확인용 상태 파일을 남깁니다."""
+        leftovers = [self.jobs.path_for(_partial_key(self.file_hash)), self.spool_path]
+        if not keep_status:
+            leftovers.append(_status_path(self.jobs.root, self.file_hash))
+        for path in leftovers:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+
+class IngestManager:
+    """대용량 CSV 수집을 워커 프로세스에 맡기고 파일 해시별 작업을 관리합니다.
+
+    같은 파일은 여러 세션이 올려도 작업 하나를 공유합니다. 동시에 실행하는
+    워커 수와 우선순위를 제한해 한 사용자의 대용량 업로드가 서버 CPU를
+    독차지하지 않고, 스크립트 스레드는 기다리지 않으므로 화면도 멈추지 않습니다.
+    워커는 Streamlit 스크립트를 다시 불러오지 않도록 별도 인터프리터로 실행합니다.
+    """
+
+    def __init__(self, dataset_cache, max_workers=INGEST_WORKERS):
+        self.dataset_cache = dataset_cache
+        self.jobs_root = os.path.join(dataset_cache.root, JOBS_DIRNAME)
+        os.makedirs(self.jobs_root, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ga4-ingest')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_hash, name, source):
+        """파일 수집 작업을 시작하고 반환합니다. 이미 진행 중인 작업이 있으면 그 작업을 반환합니다.
+
+        source는 파일 경로 또는 업로드 파일 객체이며, 업로드 파일은
+        워커가 읽을 수 있도록 작업 폴더에 먼저 복사합니다.
+        """
+        with self._lock:
+            job = self._jobs.get(file_hash)
+            if job is not None and job.state != 'cancelled':
+                return job
+
+            if isinstance(source, str):
+                path, spool_path = source, None
+            else:
+                path = spool_path = os.path.join(self.jobs_root, f"{file_hash}.csv")
+                source.seek(0)
+                with open(path, 'wb') as f:
+                    shutil.copyfileobj(source, f, length=1024 * 1024)
+                source.seek(0)
+
+            job = IngestJob(file_hash, name, self.jobs_root, spool_path)
+            job.future = self._executor.submit(
+                job.run, self.dataset_cache.root, self.dataset_cache.max_bytes, path
+            )
+            self._jobs[file_hash] = job
+            return job
+
+    def discard(self, file_hash):
+        """끝난 작업을 목록에서 지웁니다."""
+        with self._lock:
+            self._jobs.pop(file_hash, None)
+
+
+if __name__ == '__main__':
+    # 워커 프로세스: background.py <CSV 경로> <파일 해시> <캐시 폴더> <캐시 용량>
+    if hasattr(os, 'nice'):
+        os.nice(INGEST_NICENESS)
+    sys.exit(run_ingest(sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])))
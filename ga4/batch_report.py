@@ -0,0 +1,196 @@
+"""GA4 리포트 일괄 생성기.
+
+모든 소스/매체 × 기기 유형 조합에 대해 대시보드와 같은 집계(KPI, 퍼널,
+신규/기존 사용자, 구매 추이, 이벤트별 소스/기기 분포)를 계산해 파일로 저장합니다.
+
+    python batch_report.py data/*.csv --out reports/2024-01-31 --charts
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from analytics import open_context, report_from_context
+from chart_payload import prepare_chart
+from charts import create_funnel_chart, create_purchase_trend_chart, create_users_chart
+from cube import cache_key
+from dataset_cache import DatasetCache, content_hash
+from export import EXPORT_FORMATS, export_table
+from filter_index import FilterSpec
+from incremental import WATCH_DIR, IncrementalDataset, scan_directory
+from ingest import read_cube
+from prefix_index import PrefixAggregationContext
+from shared_store import SharedDatasetStore
+
+# 전체(필터 없음)를 나타내는 조합 이름
+ALL_LABEL = 'all'
+
+# 워커 프로세스가 공유하는 데이터셋 (공유 저장소 파일을 매핑한 것으로, 프로세스마다 복사하지 않음)
+_DATASET = None
+
+
+def load_dataset(paths, dataset_cache):
+    """CSV 파일들을 누적 데이터셋으로 읽습니다. 디스크 캐시에 있는 파일은 다시 파싱하지 않습니다."""
+    files = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            file_hash = content_hash(f)
+            cube = dataset_cache.get(cache_key(file_hash))
+            if cube is None:
+                cube = read_cube(f, on_malformed=lambda report: print_malformed(path, report))
+                dataset_cache.put(cache_key(file_hash), cube)
+        files.append((file_hash, os.path.basename(path), cube))
+    return IncrementalDataset().extend(files)
+
+
+def print_malformed(path, report):
+    """제외한 형식 오류 행을 규칙별로 표준 오류에 출력합니다."""
+    for rule, rows, lines in report[report['rows'] > 0].itertuples(index=False):
+        examples = ', '.join(map(str, lines))
+        print(f"{os.path.basename(path)}: skipped {rows} rows ({rule}, e.g. lines {examples})", file=sys.stderr)
+
+
+def filter_combinations(cube, date_range):
+    """(소스/매체 또는 전체) × (기기 유형 또는 전체) 필터 조합 목록을 만듭니다."""
+    sources = [()] + [(source,) for source in sorted(cube['source_medium'].cat.categories)]
+    devices = [None] + sorted(cube['device_category'].cat.categories)
+    return [
+        FilterSpec(date_range=date_range, sources=source, device=device)
+        for source in sources
+        for device in devices
+    ]
+
+
+def combination_name(spec):
+    """필터 조합을 파일 이름으로 쓸 수 있는 이름으로 바꿉니다. (예: google_organic__mobile)"""
+    source = spec.sources[0] if spec.sources else ALL_LABEL
+    device = spec.device or ALL_LABEL
+    return '__'.join(re.sub(r'[^0-9A-Za-z가-힣]+', '_', part).strip('_') for part in (source, device))
+
+
+def _init_worker(store_root, dataset_key):
+    """워커 프로세스에서 공유 저장소의 데이터셋을 한 번만 매핑합니다."""
+    global _DATASET
+    if _DATASET is None:
+        _DATASET = SharedDatasetStore(store_root).open(dataset_key)
+        if _DATASET is None:
+            raise RuntimeError(f"shared dataset {dataset_key} is missing from {store_root}")
+
+
+def build_report(spec, out_dir, fmt='csv', with_charts=False):
+    """필터 조합 하나의 리포트 표(와 차트 스펙)를 저장하고 KPI 요약 행을 반환합니다."""
+    ctx = open_context(_DATASET, spec)
+    summary = {
+        'combination': combination_name(spec),
+        'source_medium': spec.sources[0] if spec.sources else ALL_LABEL,
+        'device_category': spec.device or ALL_LABEL,
+        'rows': ctx.count() if isinstance(ctx, PrefixAggregationContext) else _DATASET.filter_index.count(spec)
+    }
+    if summary['rows'] == 0:
+        return summary
+
+    report = report_from_context(ctx)
+    kpis = report.kpis
+    summary.update({
+        'total_purchases': kpis['total_purchases'],
+        'best_channel': kpis['best_channel']['source_medium'],
+        'best_channel_conversion_rate': kpis['best_channel']['conversion_rate'],
+        'best_channel_below_threshold': kpis['best_channel']['below_threshold'],
+        'max_purchase_date': kpis['max_purchase_date'],
+        'max_purchase_count': kpis['max_purchase_count']
+    })
+
+    target = os.path.join(out_dir, summary['combination'])
+    os.makedirs(target, exist_ok=True)
+    for name, table in report.tables().items():
+        with open(os.path.join(target, f"{name}.{EXPORT_FORMATS[fmt][0]}"), 'wb') as f:
+            f.write(export_table(table, fmt))
+
+    # 차트 생성 비용이 크므로 요청한 경우에만 생성
+    if with_charts:
+        bar_chart, ratio_chart, _ = create_users_chart(ctx)
+        charts = {
+            'funnel': create_funnel_chart(ctx)[0],
+            'users_bar': bar_chart,
+            'users_ratio': ratio_chart,
+            'purchase_trend': create_purchase_trend_chart(ctx)[0]
+        }
+        for name, chart in charts.items():
+            with open(os.path.join(target, f"{name}.vl.json"), 'w', encoding='utf-8') as f:
+                json.dump(prepare_chart(chart).spec, f, ensure_ascii=False, default=str)
+    return summary
+
+
+def _build_report_task(args):
+    return build_report(*args)
+
+
+def run(paths, out_dir, workers=None, fmt='csv', with_charts=False, start=None, end=None,
+        dataset_cache=None, shared_store=None):
+    """데이터를 한 번 읽고 모든 필터 조합의 리포트를 프로세스 풀에서 나눠 생성합니다."""
+    global _DATASET
+    dataset_cache = dataset_cache or DatasetCache()
+    shared_store = shared_store or SharedDatasetStore()
+    dataset = load_dataset(paths, dataset_cache)
+    if dataset.cube.empty:
+        raise SystemExit("no rows to report")
+
+    # 큐브와 누적합 인덱스를 공유 저장소에 올리고, 워커는 같은 파일을 매핑해서 사용
+    dataset = shared_store.share(dataset)
+    cube = dataset.cube
+    _DATASET = dataset
+
+    date_range = (
+        start or cube['date'].iloc[0].date(),
+        end or cube['date'].iloc[-1].date()
+    )
+    specs = filter_combinations(cube, date_range)
+    os.makedirs(out_dir, exist_ok=True)
+
+    tasks = [(spec, out_dir, fmt, with_charts) for spec in specs]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        summaries = [_build_report_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared_store.root, cache_key(dataset.dataset_hash))) as executor:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            summaries = list(executor.map(_build_report_task, tasks, chunksize=chunksize))
+
+    summary = pd.DataFrame(summaries)
+    with open(os.path.join(out_dir, f"kpi_summary.{EXPORT_FORMATS[fmt][0]}"), 'wb') as f:
+        f.write(export_table(summary, fmt))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GA4 필터 조합별 리포트를 일괄 생성합니다.")
+    parser.add_argument('paths', nargs='*', help="GA4 CSV 파일 (생략하면 GA4_WATCH_DIR의 CSV 전체)")
+    parser.add_argument('--out', required=True, help="리포트를 저장할 폴더")
+    parser.add_argument('--workers', type=int, default=None, help="워커 프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument('--format', dest='fmt', choices=['csv', 'csv.gz', 'parquet'], default='csv',
+                        help="표 저장 형식")
+    parser.add_argument('--charts', action='store_true', help="Vega-Lite 차트 스펙도 저장")
+    parser.add_argument('--start', type=date.fromisoformat, default=None, help="시작일 (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help="종료일 (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or scan_directory(WATCH_DIR)
+    if not paths:
+        parser.error("no input CSV files (pass paths or set GA4_WATCH_DIR)")
+
+    started = time.perf_counter()
+    summary = run(paths, args.out, args.workers, args.fmt, args.charts, args.start, args.end)
+    elapsed = time.perf_counter() - started
+    print(f"{len(summary)} combinations ({int((summary['rows'] > 0).sum())} with data) "
+          f"written to {args.out} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""GA4 대시보드 처리 단계별 벤치마크.
+
+합성 데이터(synthetic.py)로 파싱, 필터, 섹션별 집계, Altair 차트 생성,
+CSV 내보내기를 단계별로 측정해 소요 시간, 최대 메모리, 처리량을 출력하고
+저장된 기준값과 비교합니다. 기준보다 느려지거나 메모리를 더 쓰거나
+결과가 달라진 단계가 있으면 종료 코드 1로 끝납니다.
+
+    python benchmark.py --rows 1000000 --save-baseline   # 기준값 저장
+    python benchmark.py --rows 1000000                   # 기준값과 비교
+"""
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import hashlib
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+import pandas as pd
+import pyarrow as pa
+
+import synthetic
+from aggregation import AggregationContext
+from analytics import (compute_kpi_metrics, daily_user_stats, event_distribution_table,
+                       funnel_download_table, funnel_stats, purchase_download_table, purchase_trend,
+                       users_download_table)
+from chart_payload import prepare_chart
+from charts import (create_event_analysis_charts, create_funnel_chart, create_purchase_trend_chart,
+                    create_users_chart)
+from cube import build_cube
+from export import export_table
+from filter_index import FilterIndex, FilterSpec
+from funnel import FUNNEL_STEPS
+from incremental import IncrementalDataset
+from ingest import (STREAMING_THRESHOLD_BYTES, check_columns, parse_dates, read_strict,
+                    stream_aggregate)
+from prefix_index import PrefixAggregationContext, build_prefix_index
+from shared_store import SharedDatasetStore
+
+# 기준값 파일 경로 (환경 변수로 변경 가능)
+BASELINE_PATH = os.environ.get(
+    'GA4_BENCHMARK_BASELINE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+)
+
+# 기준값 대비 허용 증가율 (0.3이면 30%까지 허용)
+TOLERANCE = float(os.environ.get('GA4_BENCHMARK_TOLERANCE', 0.3))
+
+# 측정 잡음으로 보는 최소 차이 (허용 증가율을 넘어도 이보다 작은 증가는 회귀로 보지 않음)
+MIN_SECONDS_DELTA = float(os.environ.get('GA4_BENCHMARK_MIN_SECONDS', 0.05))
+MIN_BYTES_DELTA = int(os.environ.get('GA4_BENCHMARK_MIN_MB', 8)) * 1024 ** 2
+
+# 단계별 반복 횟수 (소요 시간은 중앙값 사용)
+REPEAT = int(os.environ.get('GA4_BENCHMARK_REPEAT', 7))
+
+# 합성 데이터를 보관할 폴더 (같은 설정이면 다시 만들지 않음)
+DATA_DIR = os.environ.get('GA4_BENCHMARK_DATA_DIR', os.path.join(tempfile.gettempdir(), 'ga4-benchmark'))
+
+
+def _digest(result):
+    """단계 결과의 요약 해시. 최적화 전후로 결과가 같은지 확인하는 데 사용합니다.
+
+    표, 바이트, dict/list가 아닌 결과(인덱스 객체 등)는 None을 반환해 비교하지 않습니다.
+    """
+    if result is None:
+        payload = b'null'
+    elif isinstance(result, (pd.DataFrame, pd.Series)):
+        payload = pd.util.hash_pandas_object(result, index=True).to_numpy().tobytes()
+    elif isinstance(result, bytes):
+        payload = result
+    elif isinstance(result, (list, tuple)):
+        payload = ''.join(str(_digest(item)) for item in result).encode('ascii')
+    elif isinstance(result, dict):
+        payload = json.dumps(result, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    else:
+        return None
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def measure(fn, repeat=REPEAT):
+    """fn을 repeat번 실행한 소요 시간의 중앙값과, 별도 1회 실행의 최대 메모리 증가량을 잽니다.
+
+    메모리는 Arrow/NumPy 버퍼처럼 Python 힙 밖의 할당도 포함하도록 프로세스 RSS 최고치
+    (Linux의 /proc/self/status VmHWM을 실행 직전에 초기화)로 잽니다. 초기화할 수 없는
+    환경에서는 tracemalloc 최대치와 Arrow 메모리 풀 증가량의 합으로 대신합니다.
+    앞 단계가 해제한 메모리를 할당기가 들고 있으면 RSS가 늘지 않으므로 측정 전에 운영체제에 돌려줍니다.
+    반환값은 (초, 최대 바이트, 메모리 측정 방식 'rss' 또는 'heap', 결과)입니다.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+        del result
+
+    _release_free_memory()
+    if _reset_peak_rss():
+        before = _proc_status_bytes('VmRSS')
+        result = fn()
+        return statistics.median(timings), max(_proc_status_bytes('VmHWM') - before, 0), 'rss', result
+
+    arrow_before = pa.total_allocated_bytes()
+    tracemalloc.start()
+    try:
+        result = fn()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    peak_bytes += max(pa.total_allocated_bytes() - arrow_before, 0)
+    return statistics.median(timings), peak_bytes, 'heap', result
+
+
+def _release_free_memory():
+    """해제된 Python 객체, Arrow 메모리 풀, glibc malloc의 남는 메모리를 운영체제에 돌려줍니다."""
+    gc.collect()
+    pa.default_memory_pool().release_unused()
+    libc_path = ctypes.util.find_library('c')
+    if libc_path:
+        libc = ctypes.CDLL(libc_path)
+        if hasattr(libc, 'malloc_trim'):
+            libc.malloc_trim(0)
+
+
+def _reset_peak_rss():
+    """프로세스의 RSS 최고치(VmHWM)를 현재 RSS로 초기화합니다. 지원하지 않으면 False를 반환합니다."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _proc_status_bytes(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def data_path(config):
+    """설정에 맞는 합성 CSV 경로를 반환하고, 없으면 만듭니다."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    name = '-'.join(f"{key}{value}" for key, value in sorted(config.items()))
+    path = os.path.join(DATA_DIR, f"synthetic-{name}.csv")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        synthetic.write_csv(tmp_path, **config)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _read_csv(path):
+    """작은 파일: 대시보드와 같이 한 번에 읽고 필수 컬럼과 날짜를 확인합니다."""
+    df = pd.read_csv(path)
+    check_columns(df.columns)
+    df['date'] = parse_dates(df['date'])
+    return df
+
+
+def _read_strict(path):
+    """작은 파일: GA4 스키마로 형식 추론 없이 읽습니다 (대시보드의 빠른 경로)."""
+    with open(path, 'rb') as f:
+        return read_strict(f)
+
+
+def _stream_ingest(path):
+    with open(path, 'rb') as f:
+        return stream_aggregate(f)
+
+
+def _filter_specs(cube):
+    """대시보드에서 흔한 필터 상태: 전체, 최근 30일, 소스 하나, 기기 하나, 소스 × 기기"""
+    start, end = cube['date'].iloc[0].date(), cube['date'].iloc[-1].date()
+    top_source = cube.groupby('source_medium', observed=True)['users'].sum().idxmax()
+    device = cube['device_category'].cat.categories[0]
+    return [
+        FilterSpec((start, end)),
+        FilterSpec((max(start, end - timedelta(days=29)), end)),
+        FilterSpec((start, end), sources=(top_source,)),
+        FilterSpec((start, end), device=device),
+        FilterSpec((start, end), sources=(top_source,), device=device)
+    ]
+
+
+def _event_tables(ctx):
+    return [event_distribution_table(ctx, 'source_medium'), event_distribution_table(ctx, 'device_category')]
+
+
+def _event_charts(ctx):
+    return [prepare_chart(create_event_analysis_charts(ctx, event)[0]).spec for event in FUNNEL_STEPS]
+
+
+# 섹션별 (표 집계, 차트 생성) 함수
+SECTIONS = {
+    'kpi': (compute_kpi_metrics, None),
+    'funnel': (lambda ctx: funnel_download_table(funnel_stats(ctx)), lambda ctx: prepare_chart(create_funnel_chart(ctx)[0]).spec),
+    'users': (lambda ctx: users_download_table(daily_user_stats(ctx)), lambda ctx: [prepare_chart(chart).spec for chart in create_users_chart(ctx)[:2]]),
+    'purchase_trend': (lambda ctx: purchase_download_table(purchase_trend(ctx)),
+                       lambda ctx: prepare_chart(create_purchase_trend_chart(ctx)[0]).spec),
+    'event_analysis': (_event_tables, _event_charts)
+}
+
+
+def run(config, data=None, repeat=REPEAT):
+    """모든 단계를 측정해 {단계: {seconds, peak_bytes, memory, rows_per_second, digest}}를 반환합니다."""
+    path = data or data_path(config)
+    input_rows = config['rows']
+    stages = {}
+
+    def record(name, fn, rows):
+        seconds, peak_bytes, memory, result = measure(fn, repeat)
+        stages[name] = {
+            'seconds': seconds,
+            'peak_bytes': peak_bytes,
+            'memory': memory,
+            'rows_per_second': rows / seconds if seconds else None,
+            'digest': _digest(result)
+        }
+        return result
+
+    # 파싱: 대시보드와 같은 기준으로 작은 파일은 한 번에, 큰 파일은 청크 단위로
+    if os.path.getsize(path) < STREAMING_THRESHOLD_BYTES:
+        raw = record('parse', lambda: _read_csv(path), input_rows)
+        record('parse:strict', lambda: _read_strict(path), input_rows)
+        cube = record('cube', lambda: build_cube(raw), input_rows)
+        del raw
+    else:
+        cube = record('parse_streaming', lambda: _stream_ingest(path), input_rows)
+
+    cube_rows = len(cube)
+    filter_index = record('index', lambda: FilterIndex(cube), cube_rows)
+    specs = _filter_specs(cube)
+    record('filter', lambda: [filter_index.select(spec) for spec in specs], cube_rows * len(specs))
+
+    # 날짜 범위 합계: 필터 후 집계와 누적합 조회 (두 단계의 결과 해시가 같아야 함)
+    prefix_index = record('prefix_index', lambda: build_prefix_index(cube), cube_rows)
+    record('range:filter', lambda: [
+        AggregationContext(filter_index.select(spec)).event_source_users for spec in specs
+    ], cube_rows * len(specs))
+    if prefix_index is not None:
+        record('range:prefix', lambda: [
+            PrefixAggregationContext(prefix_index, spec).event_source_users for spec in specs
+        ], cube_rows * len(specs))
+
+    # 공유 저장소: 한 번 저장한 뒤 다른 프로세스처럼 매핑해서 여는 비용 (결과는 큐브와 같아야 함)
+    with tempfile.TemporaryDirectory() as store_root:
+        store = SharedDatasetStore(store_root)
+        dataset = IncrementalDataset(cube, derived={'prefix_index': prefix_index})
+        store.publish('benchmark', dataset)
+        record('map', lambda: store.open('benchmark').cube, cube_rows)
+
+    # 섹션별 집계는 매번 새 컨텍스트로, 차트 생성은 집계가 끝난 컨텍스트로 측정
+    for section, (aggregate, build_chart) in SECTIONS.items():
+        record(f"aggregate:{section}", lambda: aggregate(AggregationContext(cube)), cube_rows)
+    warm_ctx = AggregationContext(cube)
+    tables = {section: aggregate(warm_ctx) for section, (aggregate, _) in SECTIONS.items()}
+    for section, (_, build_chart) in SECTIONS.items():
+        if build_chart is not None:
+            record(f"altair:{section}", lambda: build_chart(warm_ctx), cube_rows)
+
+    export_tables = [table for table in (tables['funnel'], tables['users'], tables['purchase_trend'])
+                     if table is not None]
+    export_rows = sum(len(table) for table in export_tables)
+    record('export:csv', lambda: [export_table(table, 'csv') for table in export_tables], export_rows)
+    return stages
+
+
+def config_key(config):
+    return ','.join(f"{key}={value}" for key, value in sorted(config.items()))
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, config, stages):
+    """설정별 기준값을 저장합니다. 다른 설정의 기준값은 그대로 둡니다."""
+    baseline = load_baseline(path)
+    baseline[config_key(config)] = {'config': config, 'stages': stages}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare(stages, baseline_stages, tolerance=TOLERANCE):
+    """기준값 대비 회귀한 단계의 (단계, 사유) 목록을 반환합니다."""
+    regressions = []
+    for name, current in stages.items():
+        base = baseline_stages.get(name)
+        if base is None:
+            continue
+        if (current['seconds'] > base['seconds'] * (1 + tolerance)
+                and current['seconds'] - base['seconds'] > MIN_SECONDS_DELTA):
+            regressions.append((name, f"time {base['seconds']:.3f}s -> {current['seconds']:.3f}s"))
+        # 측정 방식이 다른 기준값(이전 tracemalloc 기준 등)과는 메모리를 비교하지 않음
+        if (current.get('memory', 'heap') == base.get('memory', 'heap')
+                and current['peak_bytes'] > base['peak_bytes'] * (1 + tolerance)
+                and current['peak_bytes'] - base['peak_bytes'] > MIN_BYTES_DELTA):
+            regressions.append((name, f"memory {base['peak_bytes'] / 1024 ** 2:.1f}MB -> "
+                                      f"{current['peak_bytes'] / 1024 ** 2:.1f}MB"))
+        if current['digest'] is not None and current['digest'] != base['digest']:
+            regressions.append((name, "output changed"))
+    return regressions
+
+
+def format_report(stages, baseline_stages=None):
+    lines = [f"{'stage':<24}{'seconds':>10}{'peak MB':>10}{'rows/s':>14}{'vs base':>10}"]
+    for name, stage in stages.items():
+        base = (baseline_stages or {}).get(name)
+        ratio = f"{stage['seconds'] / base['seconds']:.2f}x" if base and base['seconds'] else '-'
+        throughput = f"{stage['rows_per_second']:,.0f}" if stage['rows_per_second'] else '-'
+        lines.append(f"{name:<24}{stage['seconds']:>10.4f}{stage['peak_bytes'] / 1024 ** 2:>10.1f}"
+                     f"{throughput:>14}{ratio:>10}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GA4 대시보드 처리 단계별 벤치마크를 실행합니다.")
+    parser.add_argument('--rows', type=int, default=100_000, help="합성 데이터 행 수")
+    parser.add_argument('--days', type=int, default=365, help="날짜 수")
+    parser.add_argument('--sources', type=int, default=10, help="소스/매체 수")
+    parser.add_argument('--devices', type=int, default=3, help="기기 유형 수")
+    parser.add_argument('--seed', type=int, default=42, help="난수 시드")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="단계별 반복 횟수 (중앙값 사용)")
+    parser.add_argument('--data', default=None, help="합성 데이터 대신 사용할 CSV (--rows와 맞춰야 함)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="기준값 JSON 경로")
+    parser.add_argument('--save-baseline', action='store_true', help="이번 결과를 기준값으로 저장")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="허용 증가율")
+    args = parser.parse_args(argv)
+
+    config = {'rows': args.rows, 'days': args.days, 'sources': args.sources,
+              'devices': args.devices, 'seed': args.seed}
+    stages = run(config, args.data, args.repeat)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, config, stages)
+        print(format_report(stages))
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    baseline_stages = load_baseline(args.baseline).get(config_key(config), {}).get('stages')
+    print(format_report(stages, baseline_stages))
+    if baseline_stages is None:
+        print(f"no baseline for {config_key(config)} in {args.baseline} (run with --save-baseline)")
+        return 0
+    regressions = compare(stages, baseline_stages, args.tolerance)
+    for name, reason in regressions:
+        print(f"REGRESSION {name}: {reason}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS
+
+# 소스/매체 선택 목록의 한 페이지 항목 수
+SOURCE_PAGE_SIZE = int(os.environ.get('GA4_SOURCE_PAGE_SIZE', 50))
+
+
+class DimensionCatalog:
+    """큐브의 날짜 범위, 차원별 고유 값과 행/사용자 수, 이벤트별 데이터 범위입니다.
+
+    데이터셋을 만들 때 범주 코드로 한 번만 계산해 두고 사이드바는 이 목록만 읽으므로,
+    재실행마다 큐브 컬럼을 다시 훑지 않습니다. 날짜순으로 정렬된 큐브를 받으며,
+    뒤에 새 날짜의 행이 붙은 큐브는 extend()로 새 행만 반영합니다.
+    """
+
+    def __init__(self, cube):
+        self.rows = 0
+        self.start = None
+        self.end = None
+        self.values = {
+            col: pd.DataFrame({'rows': np.zeros(0, dtype=np.int64), 'users': np.zeros(0, dtype=np.int64)},
+                              index=pd.Index([], name=col))
+            for col in DIMENSIONS
+        }
+        self.events = _empty_coverage()
+        self._search_cache = {}
+        if len(cube):
+            self._merge(cube, self)
+
+    def extend(self, cube):
+        """앞부분이 반영한 큐브와 같고 뒤에 새 날짜의 행이 붙은 큐브의 목록을 만듭니다."""
+        tail = cube.iloc[self.rows:]
+        if self.end is not None and len(tail) and tail['date'].iloc[0] <= self.end:
+            raise ValueError("DimensionCatalog.extend requires appended rows to start after existing dates")
+        catalog = object.__new__(DimensionCatalog)
+        catalog.rows = self.rows
+        catalog.start, catalog.end = self.start, self.end
+        catalog.values = self.values
+        catalog.events = self.events
+        catalog._search_cache = {}
+        if len(tail):
+            catalog._merge(tail, self)
+        return catalog
+
+    def _merge(self, part, previous):
+        """part(새 행)의 값별 합계를 previous의 목록에 더합니다."""
+        self.rows = previous.rows + len(part)
+        if self.start is None:
+            self.start = part['date'].iloc[0]
+        self.end = part['date'].iloc[-1]
+
+        users = part['users'].to_numpy(dtype=np.int64)
+        values = {}
+        for col in DIMENSIONS:
+            categorical = part[col]
+            codes = categorical.cat.codes.to_numpy()
+            size = len(categorical.cat.categories)
+            counts = pd.DataFrame({
+                'rows': np.bincount(codes, minlength=size),
+                'users': np.bincount(codes, weights=users, minlength=size).astype(np.int64)
+            }, index=pd.Index(categorical.cat.categories.astype(object), name=col))
+            counts = counts[counts['rows'] > 0]
+            merged = previous.values[col].add(counts, fill_value=0).astype(np.int64)
+            values[col] = merged.sort_index()
+        self.values = values
+
+        # 이벤트별 데이터 범위 (새 행의 날짜는 기존 날짜 이후이므로 날짜 수는 더하면 됨)
+        coverage = part.groupby('event_name', observed=True).agg(
+            first_date=('date', 'min'),
+            last_date=('date', 'max'),
+            days=('date', 'nunique'),
+            rows=('users', 'size'),
+            users=('users', 'sum')
+        )
+        coverage.index = coverage.index.astype(object)
+        names = previous.events.index.union(coverage.index)
+        old, new = previous.events.reindex(names), coverage.reindex(names)
+        self.events = pd.DataFrame({
+            'first_date': old['first_date'].fillna(new['first_date']),
+            'last_date': new['last_date'].fillna(old['last_date']),
+            'days': old['days'].fillna(0).astype(np.int64) + new['days'].fillna(0).astype(np.int64),
+            'rows': old['rows'].fillna(0).astype(np.int64) + new['rows'].fillna(0).astype(np.int64),
+            'users': old['users'].fillna(0).astype(np.int64) + new['users'].fillna(0).astype(np.int64)
+        }, index=pd.Index(names, name='event_name'))
+
+    def distinct(self, dimension):
+        """차원의 고유 값 목록 (이름순)"""
+        return list(self.values[dimension].index)
+
+    def search(self, dimension, query=''):
+        """이름에 query가 들어 있는(대소문자 무시) 값을 사용자 수 내림차순으로 반환합니다.
+
+        결과는 (값, rows, users) 데이터프레임이며, 같은 검색어는 다시 계산하지 않습니다.
+        """
+        key = (dimension, query.strip().lower())
+        result = self._search_cache.get(key)
+        if result is None:
+            table = self.values[dimension]
+            if key[1]:
+                names = table.index.to_series().str.lower()
+                table = table[names.str.contains(key[1], regex=False).to_numpy()]
+            result = table.sort_values('users', ascending=False, kind='stable').reset_index()
+            self._search_cache[key] = result
+        return result
+
+    def page(self, dimension, query='', page=1, page_size=SOURCE_PAGE_SIZE):
+        """검색 결과의 page번째(1부터) 페이지와 전체 검색 결과 수를 반환합니다."""
+        result = self.search(dimension, query)
+        start = (page - 1) * page_size
+        return result.iloc[start:start + page_size], len(result)
+
+
+def _empty_coverage():
+    return pd.DataFrame({
+        'first_date': pd.Series(dtype='datetime64[ns]'),
+        'last_date': pd.Series(dtype='datetime64[ns]'),
+        'days': pd.Series(dtype='int64'),
+        'rows': pd.Series(dtype='int64'),
+        'users': pd.Series(dtype='int64')
+    }, index=pd.Index([], name='event_name'))
@@ -0,0 +1,158 @@
+import copy
+import hashlib
+import json
+import re
+from collections import defaultdict
+
+import altair as alt
+
+# 하위 뷰를 담는 Vega-Lite 합성 키
+COMPOSITE_KEYS = ['layer', 'concat', 'hconcat', 'vconcat']
+
+# Vega 표현식에서 datum.field / datum['field'] 형태의 필드 참조
+DATUM_FIELD_PATTERN = re.compile(r"datum\.([A-Za-z_]\w*)|datum\[['\"]([^'\"]+)['\"]\]")
+
+
+class ChartSpec:
+    """브라우저로 보낼 최적화된 Vega-Lite 스펙과 전송량 기록입니다."""
+
+    def __init__(self, spec, raw_bytes, payload_bytes):
+        self.spec = spec
+        self.raw_bytes = raw_bytes
+        self.payload_bytes = payload_bytes
+
+    def __sizeof__(self):
+        # 결과 캐시 용량 계산용 (파이썬 객체로 풀린 스펙은 JSON보다 큼)
+        return self.payload_bytes * 4
+
+
+def _json_size(spec):
+    return len(json.dumps(spec, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def _collect_fields(node, fields):
+    """인코딩 정의에서 참조하는 데이터 필드를 모읍니다."""
+    if isinstance(node, list):
+        for item in node:
+            _collect_fields(item, fields)
+        return
+    if not isinstance(node, dict):
+        return
+    if isinstance(node.get('field'), str):
+        fields.add(node['field'])
+    if isinstance(node.get('test'), str):
+        for match in DATUM_FIELD_PATTERN.finditer(node['test']):
+            fields.add(match.group(1) or match.group(2))
+    for key in ('condition', 'sort', 'tooltip'):
+        if key in node:
+            _collect_fields(node[key], fields)
+
+
+def _evaluate_sorts(encoding, rows):
+    """집계 기준 정렬(EncodingSortField)을 파이썬에서 계산해 명시적 순서로 바꾸고 바꾼 수를 반환합니다."""
+    evaluated = 0
+    for channel in encoding.values():
+        if not isinstance(channel, dict):
+            continue
+        sort = channel.get('sort')
+        if not (isinstance(sort, dict) and sort.get('op') == 'sum' and 'field' in sort
+                and isinstance(channel.get('field'), str)):
+            continue
+        totals = defaultdict(float)
+        for row in rows:
+            totals[row.get(channel['field'])] += row.get(sort['field']) or 0
+        reverse = sort.get('order') == 'descending'
+        # 같은 값은 먼저 나온 순서를 유지 (Vega-Lite 정렬과 동일)
+        channel['sort'] = sorted(totals, key=totals.get, reverse=reverse)
+        evaluated += 1
+    return evaluated
+
+
+def optimize_spec(spec):
+    """Vega-Lite 스펙의 데이터 변환을 미리 계산하고 데이터셋을 최소화합니다.
+
+    - 집계 정렬은 명시적 순서 목록으로 바꿔 브라우저의 집계 변환을 없앱니다.
+    - 각 데이터셋은 그 데이터셋을 쓰는 모든 레이어가 참조하는 필드만 남깁니다.
+    - 내용이 같아진 데이터셋은 하나로 합쳐 레이어 간 중복 전송을 없앱니다.
+    변환(transform)이나 facet/repeat이 있는 데이터셋은 그대로 둡니다.
+    범주가 많아 명시적 순서 목록이 오히려 스펙을 키우면 집계 정렬을 그대로 둔 쪽을 사용합니다.
+    """
+    original = copy.deepcopy(spec)
+    spec, evaluated = _optimize(spec, evaluate_sorts=True)
+    if not evaluated:
+        return spec
+    unsorted, _ = _optimize(original, evaluate_sorts=False)
+    # 크기가 같으면 브라우저 집계가 없는 명시적 순서 쪽을 사용
+    return spec if _json_size(spec) <= _json_size(unsorted) else unsorted
+
+
+def _optimize(spec, evaluate_sorts):
+    """optimize_spec의 본체. 최적화한 스펙과 명시적 순서로 바꾼 정렬 수를 반환합니다."""
+    datasets = spec.get('datasets', {})
+    usage = defaultdict(set)
+    untouched = set()
+    evaluated = 0
+
+    def walk(view, inherited):
+        nonlocal evaluated
+        data = view.get('data')
+        name = inherited
+        if isinstance(data, dict):
+            name = data.get('name')
+        if name is not None:
+            if 'transform' in view or 'spec' in view:
+                untouched.add(name)
+            encoding = view.get('encoding', {})
+            if evaluate_sorts and encoding and name in datasets:
+                evaluated += _evaluate_sorts(encoding, datasets[name])
+            _collect_fields(list(encoding.values()), usage[name])
+        elif 'spec' in view:
+            untouched.update(datasets)
+        for key in COMPOSITE_KEYS:
+            for sub in view.get(key, []):
+                walk(sub, name)
+
+    walk(spec, None)
+
+    # 참조되는 필드만 남기기
+    for name, fields in usage.items():
+        if name in datasets and name not in untouched:
+            datasets[name] = [{k: row[k] for k in row if k in fields} for row in datasets[name]]
+
+    # 내용이 같은 데이터셋 합치기
+    renames = {}
+    by_digest = {}
+    for name, rows in list(datasets.items()):
+        digest = hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        if digest in by_digest:
+            renames[name] = by_digest[digest]
+            del datasets[name]
+        else:
+            by_digest[digest] = name
+
+    if renames:
+        def rename(view):
+            data = view.get('data')
+            if isinstance(data, dict) and data.get('name') in renames:
+                data['name'] = renames[data['name']]
+            for key in COMPOSITE_KEYS:
+                for sub in view.get(key, []):
+                    rename(sub)
+        rename(spec)
+    return spec, evaluated
+
+
+def prepare_chart(chart):
+    """Altair 차트를 최적화된 스펙으로 변환하고 전송량을 기록합니다."""
+    spec = chart.to_dict()
+    raw_bytes = _json_size(spec)
+    spec = optimize_spec(spec)
+    return ChartSpec(spec, raw_bytes, _json_size(spec))
+
+
+def prepare_outputs(outputs):
+    """섹션 결과 튜플에 들어 있는 Altair 차트를 모두 최적화된 스펙으로 바꿉니다."""
+    return tuple(
+        prepare_chart(item) if isinstance(item, alt.TopLevelMixin) else item
+        for item in outputs
+    )
@@ -0,0 +1,415 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from analytics import (TOP_SOURCES, daily_user_stats, event_distribution, funnel_download_table, funnel_stats,
+                       purchase_download_table, purchase_trend, users_download_table)
+from anomalies import Z_THRESHOLD, series_zscores
+from downsample import GRANULARITY_LABELS, choose_granularity, downsample_series, rollup_dates
+from funnel import FUNNEL_STEPS
+
+
+def create_funnel_chart(ctx, steps=FUNNEL_STEPS):
+    """퍼널 차트를 생성합니다."""
+    # 모든 단계의 사용자 수와 전환율을 이벤트별 합계 한 번으로 계산
+    funnel_df = funnel_stats(ctx, steps)
+    
+    # 통합된 메트릭 라벨 생성 (2줄로 구성)
+    funnel_df['main_metrics'] = [
+        f"{users:,.0f}명 (전체 대비 {rate:.1f}%)"
+        for users, rate in zip(funnel_df['users'], funnel_df['conversion_from_start'])
+    ]
+    funnel_df['step_conversion'] = [
+        f"이전 단계 전환율: {rate:.1f}%" if pd.notna(rate) else ""
+        for rate in funnel_df['step_to_step_rate']
+    ]
+    
+    # 기본 막대 차트
+    bars = alt.Chart(funnel_df).mark_bar().encode(
+        y=alt.Y('step:N', 
+                sort=list(steps),
+                title='퍼널 단계'),
+        x=alt.X('users:Q',
+                title='사용자 수'),
+        tooltip=[
+            alt.Tooltip('step:N', title='단계'),
+            alt.Tooltip('users:Q', title='사용자 수', format=','),
+            alt.Tooltip('conversion_from_start:Q', title='전체 전환율', format='.1f'),
+            alt.Tooltip('step_to_step_rate:Q', title='이전 단계 대비 전환율', format='.1f')
+        ]
+    )
+    
+    # 주요 메트릭 텍스트 (사용자 수 + 전체 전환율)
+    main_metrics_text = alt.Chart(funnel_df).mark_text(
+        align='left',
+        baseline='middle',
+        dx=5,  # 막대 끝에서 약간 띄움
+        fontSize=11,
+        fontWeight='bold'  # 텍스트를 진하게 표시
+    ).encode(
+        y=alt.Y('step:N', sort=list(steps)),
+        x='users:Q',
+        text='main_metrics'
+    )
+    
+    # 이전 단계 전환율 텍스트 (두 번째 줄)
+    conversion_text = alt.Chart(funnel_df[funnel_df['step_to_step_rate'].notna()]).mark_text(
+        align='left',
+        baseline='middle',
+        dx=5,  # 막대 끝에서 약간 띄움
+        dy=12,  # 첫 번째 텍스트보다 아래에 배치
+        fontSize=10,
+        color='#666666'  # 진한 회색으로 설정
+    ).encode(
+        y=alt.Y('step:N', sort=list(steps)),
+        x='users:Q',
+        text='step_conversion'
+    )
+    
+    # 차트 결합
+    final_chart = (bars + main_metrics_text + conversion_text).properties(
+        width=800,  # 너비 증가하여 긴 텍스트 수용
+        height=min(len(funnel_df) * 70, 500)  # 각 단계별 높이 증가
+    ).configure_axis(
+        labelFontSize=12,
+        titleFontSize=13
+    ).configure_view(
+        strokeWidth=0
+    )
+    
+    return final_chart, funnel_download_table(funnel_df)
+
+
+def create_users_chart(ctx):
+    """신규/기존 사용자 차트를 생성합니다."""
+    # 일별 사용자 집계
+    users_df = daily_user_stats(ctx)
+    
+    # 신규 사용자 비율의 평균선과, 이전 날짜들의 기준선 대비 급증/급감 지점
+    ratio_mean = users_df['new_users_ratio'].mean()
+    zscores = series_zscores(users_df['new_users_ratio'].fillna(0))
+    users_df['is_significant'] = np.abs(np.nan_to_num(zscores)) >= Z_THRESHOLD
+    ratio_text = users_df['new_users_ratio'].map('{:.1f}%'.format)
+    users_df['significant_label'] = np.where(
+        users_df['is_significant'],
+        np.where(zscores > 0, "신규 유입 급증 (", "신규 유입 급감 (") + ratio_text + ")",
+        ""
+    )
+    
+    # 1. 누적 막대 차트 데이터 준비 (포인트 예산을 넘으면 주/월 단위로 합산)
+    granularity = choose_granularity(len(users_df) * 2)
+    bar_df = rollup_dates(users_df, ['new_users', 'returning_users'], granularity)
+    date_title = '날짜' if granularity == 'day' else '기간 시작일'
+    users_melted = pd.melt(
+        bar_df,
+        id_vars=['date'],
+        value_vars=['new_users', 'returning_users'],
+        var_name='user_type',
+        value_name='count'
+    )
+    users_melted['user_type'] = users_melted['user_type'].map({
+        'new_users': '신규 사용자',
+        'returning_users': '기존 사용자'
+    })
+    
+    # 누적 막대 차트
+    bar_chart = alt.Chart(users_melted).mark_bar().encode(
+        x=alt.X('date:T', title='날짜'),
+        y=alt.Y('count:Q', title='사용자 수'),
+        color=alt.Color('user_type:N', 
+                       scale=alt.Scale(domain=['신규 사용자', '기존 사용자'],
+                                     range=['#1f77b4', '#ff7f0e']),
+                       title='사용자 유형'),
+        tooltip=[
+            alt.Tooltip('date:T', title=date_title),
+            alt.Tooltip('user_type:N', title='유형'),
+            alt.Tooltip('count:Q', title='사용자 수', format=',')
+        ]
+    ).properties(
+        title=f'{GRANULARITY_LABELS[granularity]} 신규/기존 사용자 수',
+        height=300
+    )
+    
+    # 2. 신규 사용자 비율 라인 차트 (모양을 유지하며 줄이되 급증 지점은 항상 유지)
+    ratio_df = downsample_series(users_df, 'new_users_ratio', keep_mask=users_df['is_significant'])
+    line_base = alt.Chart(ratio_df).encode(
+        x=alt.X('date:T', title='날짜')
+    )
+    
+    # 기준선 (평균)
+    mean_line = line_base.mark_rule(
+        strokeDash=[4, 4],
+        stroke='gray',
+        opacity=0.5
+    ).encode(
+        y=alt.Y(
+            datum=ratio_mean,
+            title='신규 사용자 비율 (%)'
+        )
+    )
+    
+    # 비율 라인
+    ratio_line = line_base.mark_line(
+        color='red'
+    ).encode(
+        y=alt.Y('new_users_ratio:Q',
+                title='신규 사용자 비율 (%)',
+                scale=alt.Scale(zero=False)),
+        tooltip=[
+            alt.Tooltip('date:T', title='날짜'),
+            alt.Tooltip('new_users_ratio:Q', title='신규 사용자 비율', format='.1f')
+        ]
+    )
+    
+    # 유의한 포인트 표시 (급증 지점만 미리 걸러서 전달)
+    spike_base = alt.Chart(ratio_df[ratio_df['is_significant']]).encode(
+        x=alt.X('date:T', title='날짜')
+    )
+    significant_points = spike_base.mark_point(
+        color='red',
+        size=100
+    ).encode(
+        y=alt.Y('new_users_ratio:Q')
+    )
+    
+    # 유의한 포인트 레이블
+    text_labels = spike_base.mark_text(
+        align='left',
+        baseline='bottom',
+        dx=5,
+        dy=-5,
+        fontSize=11
+    ).encode(
+        y=alt.Y('new_users_ratio:Q'),
+        text='significant_label'
+    )
+    
+    ratio_chart = (ratio_line + mean_line + significant_points + text_labels).properties(
+        title=f'신규 사용자 비율 추이 (평균: {ratio_mean:.1f}%)',
+        height=300
+    )
+    
+    return bar_chart, ratio_chart, users_download_table(users_df)
+
+
+def create_purchase_trend_chart(ctx):
+    """구매 추이 차트를 생성합니다."""
+    # 구매 이벤트 데이터 집계
+    purchase_df = purchase_trend(ctx)
+    
+    if len(purchase_df) == 0:
+        return alt.Chart().mark_text().encode(
+            text=alt.value('구매 데이터가 없습니다.')
+        ).properties(
+            width=600,
+            height=300
+        ), None
+    
+    # 최대값 찾기
+    max_point = purchase_df.loc[purchase_df['users'].idxmax()]
+    max_date_str = max_point['date'].strftime('%Y-%m-%d')
+    max_users = int(max_point['users'])
+    
+    max_df = pd.DataFrame([{
+        'date': max_point['date'],
+        'users': max_users
+    }])
+    
+    # 기본 라인 차트 (포인트 예산에 맞게 줄이되 최대 구매일은 항상 유지)
+    trend_df = downsample_series(
+        purchase_df, 'users', keep_mask=purchase_df.index == purchase_df['users'].idxmax()
+    )
+    base = alt.Chart(trend_df).encode(
+        x=alt.X('date:T',
+                title='날짜',
+                axis=alt.Axis(
+                    format='%Y-%m-%d',
+                    labelAngle=0,  # 날짜 라벨을 수평으로
+                    labelOverlap=False,  # 라벨 겹침 방지
+                    labelPadding=10,  # 라벨 여백 추가
+                    tickCount=5,  # 표시할 틱 개수 조정
+                    titlePadding=20  # 축 제목 여백
+                )),
+        y=alt.Y('users:Q',
+                title='구매 사용자 수',
+                axis=alt.Axis(
+                    labelPadding=10,  # 라벨 여백 추가
+                    titlePadding=20,  # 제목 여백 추가
+                    offset=10  # 축과 차트 사이 여백
+                )),
+        tooltip=[
+            alt.Tooltip('date:T', title='날짜', format='%Y-%m-%d'),
+            alt.Tooltip('users:Q', title='구매 사용자 수', format=',')
+        ]
+    ).properties(
+        width=600,
+        height=400  # 높이 증가
+    )
+    
+    # 라인
+    line = base.mark_line()
+    
+    # 일반 포인트
+    points = base.mark_circle(size=60)
+    
+    # 최대값 포인트 강조
+    max_point = alt.Chart(max_df).mark_circle(
+        color='red',
+        size=200,
+        opacity=1
+    ).encode(
+        x=alt.X('date:T'),
+        y=alt.Y('users:Q'),
+        tooltip=[
+            alt.Tooltip('date:T', title='최다 구매 발생일', format='%Y-%m-%d'),
+            alt.Tooltip('users:Q', title='구매 사용자 수', format=',')
+        ]
+    )
+    
+    # 최대값 레이블 추가
+    max_label = alt.Chart(max_df).mark_text(
+        align='left',
+        baseline='bottom',
+        dx=5,
+        dy=-10,
+        fontSize=11,
+        fontWeight='bold'
+    ).encode(
+        x='date:T',
+        y='users:Q',
+        text=alt.value(f"{max_users:,}")
+    )
+    
+    # 차트 결합
+    final_chart = (line + points + max_point + max_label).properties(
+        title={
+            "text": ["일별 구매 사용자 수 추이", f"최다 구매일: {max_date_str} ({max_users:,}명)"],
+            "subtitle": [""],  # 부제목을 별도 라인으로 분리
+            "align": "left",
+            "anchor": "start",
+            "fontSize": 16,
+            "dy": 20,  # 제목 위치 조정
+            "offset": 20  # 제목과 차트 사이 여백
+        }
+    ).configure_view(
+        strokeWidth=0  # 테두리 제거
+    ).configure_axis(
+        labelFontSize=11,
+        titleFontSize=12,
+        grid=True  # 그리드 추가
+    )
+    
+    return final_chart, purchase_download_table(purchase_df)
+
+
+def create_event_analysis_charts(ctx, selected_event):
+    """선택된 이벤트에 대한 분석 차트들을 생성합니다."""
+    # 소스/매체 분포 데이터 준비 (상위 소스/매체만 개별 표시하고 나머지는 '기타'로 합산)
+    source_dist = event_distribution(ctx, selected_event, 'source_medium', top=TOP_SOURCES)
+    source_total = source_dist['users'].sum()
+    # 퍼센트 기호를 포함한 텍스트 컬럼 추가
+    source_dist['percentage_label'] = [f"{x:.1f}%" for x in source_dist['percentage']]
+    
+    # 막대 순서: 사용자 수 내림차순 ('기타'로 합친 경우 이미 정렬된 순서로 '기타'를 마지막에)
+    source_sort = alt.EncodingSortField(field='users', op='sum', order='descending')
+    if len(source_dist) > TOP_SOURCES:
+        source_sort = list(source_dist['source_medium'])
+    
+    # 수평 막대 차트 생성
+    bars = alt.Chart(source_dist).mark_bar().encode(
+        y=alt.Y('source_medium:N',
+               sort=source_sort,
+               title='소스/매체'),
+        x=alt.X('users:Q', 
+               title='사용자 수'),
+        tooltip=[
+            alt.Tooltip('source_medium:N', title='소스/매체'),
+            alt.Tooltip('users:Q', title='사용자 수', format=','),
+            alt.Tooltip('percentage:Q', title='비율', format='.1f')
+        ]
+    )
+    
+    # 비율(%) 텍스트 레이블 추가
+    text = alt.Chart(source_dist).mark_text(
+        align='left',
+        baseline='middle',
+        dx=5,  # 막대 끝에서 약간 띄워서 표시
+        fontSize=11
+    ).encode(
+        y=alt.Y('source_medium:N',
+               sort=source_sort),
+        x='users:Q',
+        text='percentage_label'  # 미리 포맷팅된 텍스트 사용
+    )
+    
+    # 차트 결합
+    source_chart = (bars + text).properties(
+        # 표시하는 소스/매체 수(최대 상위 개수 + '기타')에 맞춘 높이
+        height=min(len(source_dist) * 50, 800)  # 각 막대의 높이를 50px로 증가하고 최대 800px로 확장
+    ).configure_axis(
+        labelFontSize=11,  # 축 레이블 폰트 크기
+        titleFontSize=12   # 축 제목 폰트 크기
+    )
+    
+    # 기기 분포 데이터 준비
+    device_dist = event_distribution(ctx, selected_event, 'device_category')
+    device_total = device_dist['users'].sum()
+    device_dist['label'] = device_dist.apply(
+        lambda x: f"{x['device_category']} ({x['percentage']:.1f}%)", axis=1
+    )
+    
+    # 기본 파이 차트 (라벨 없이)
+    pie = alt.Chart(device_dist).mark_arc(outerRadius=100).encode(
+        theta=alt.Theta(field='users', type='quantitative', stack=True),
+        color=alt.Color(
+            'device_category:N',
+            title='기기 유형',
+            scale=alt.Scale(scheme='category10')
+        ),
+        tooltip=[
+            alt.Tooltip('device_category:N', title='기기'),
+            alt.Tooltip('users:Q', title='사용자 수', format=','),
+            alt.Tooltip('percentage:Q', title='비율', format='.1f')
+        ]
+    )
+    
+    # 바깥쪽 레이블 (모든 기기 유형에 대해 동일하게 적용)
+    text = alt.Chart(device_dist).mark_text(
+        radius=120,  # 파이 차트 바깥쪽으로 고정 거리
+        size=12,    # 텍스트 크기 증가
+        align='left',
+        baseline='middle',
+        dx=8        # 약간 오른쪽으로 이동
+    ).encode(
+        theta=alt.Theta(
+            field='users',
+            type='quantitative',
+            stack=True,
+            sort='descending'
+        ),
+        text='label',
+        color=alt.value('black')  # 텍스트 색상 통일
+    )
+    
+    # 중앙 텍스트를 위한 데이터
+    center_df = pd.DataFrame([{'text': f'총 {device_total:,}명'}])
+    
+    # 중앙 텍스트 (단순화)
+    center_text = alt.Chart(center_df).mark_text(
+        fontSize=14,
+        fontWeight='bold',
+        align='center',
+        baseline='middle'
+    ).encode(
+        text='text:N'
+    )
+    
+    # 차트 결합
+    device_chart = (pie + text + center_text).properties(
+        width=350,  # 차트 크기 증가
+        height=350
+    ).configure_view(
+        strokeWidth=0  # 테두리 제거
+    )
+    
+    return source_chart, source_total, device_chart
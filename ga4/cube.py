@@ -0,0 +1,101 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+# 큐브 차원과 합산 지표
+CUBE_KEYS = ['date', 'source_medium', 'device_category', 'event_name']
+DIMENSIONS = ['source_medium', 'device_category', 'event_name']
+MEASURES = ['users', 'sessions', 'new_users']
+
+# 큐브 저장 형식이 바뀌면 올려서 이전 디스크 캐시를 무효화
+CUBE_FORMAT_VERSION = 2
+
+
+def rollup(df):
+    """행을 (날짜, 소스/매체, 기기, 이벤트) 단위로 합산합니다."""
+    return df.groupby(CUBE_KEYS, as_index=False, sort=False, dropna=False, observed=True)[MEASURES].sum()
+
+
+def build_cube(df):
+    """원본 행을 날짜순으로 정렬된 롤업 큐브로 변환합니다.
+
+    대시보드의 모든 지표는 users/sessions/new_users의 합계이므로
+    큐브만으로 원본과 같은 결과를 얻을 수 있고, 이후 필터와 집계 비용은
+    원본 행 수가 아니라 고유 셀 수에 비례합니다.
+    """
+    if df.empty:
+        return compact(pd.DataFrame({col: df[col] for col in CUBE_KEYS + MEASURES}))
+    return compact(rollup(df).sort_values(CUBE_KEYS, ignore_index=True))
+
+
+def empty_frame():
+    """행이 없는 원본 형식의 프레임 (build_cube로 빈 큐브를 만들 때 사용)"""
+    frame = pd.DataFrame({col: pd.Series(dtype='object') for col in CUBE_KEYS})
+    frame['date'] = frame['date'].astype('datetime64[ns]')
+    for col in MEASURES:
+        frame[col] = np.array([], dtype='int64')
+    return frame
+
+
+def concat_cubes(frames):
+    """여러 큐브를 차원 범주를 합친 뒤 순서대로 이어 붙입니다. 정렬은 하지 않습니다.
+
+    범주 목록이 같은 컬럼은 코드 변환 없이 그대로 이어 붙이므로,
+    새 범주가 없으면 비용은 행 복사뿐입니다.
+    """
+    frames = list(frames)
+    for col in DIMENSIONS:
+        categories = sorted(set().union(*(frame[col].cat.categories for frame in frames)))
+        dtype = pd.CategoricalDtype(categories)
+        frames = [
+            frame if frame[col].dtype == dtype else frame.assign(**{col: frame[col].astype(dtype)})
+            for frame in frames
+        ]
+    return compact(pd.concat(frames, ignore_index=True))
+
+
+def compact(df):
+    """차원 컬럼은 범주형으로, 정수 지표는 가장 작은 정수형으로 변환합니다.
+
+    지표는 부호 있는 정수형으로만 줄여서 users - new_users 같은 뺄셈이
+    음수가 되어도 넘치지 않게 합니다. 합계는 pandas가 int64로 올려 계산합니다.
+    """
+    df = df.copy()
+    for col in DIMENSIONS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in MEASURES:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def memory_report(df):
+    """압축 전(object 문자열, int64 기준)과 현재 메모리 사용량을 추정합니다."""
+    rows = len(df)
+    before_bytes = 0
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # 행마다 포인터 8바이트 + 문자열 객체 크기
+            category_sizes = np.array(
+                [sys.getsizeof(value) for value in series.cat.categories] + [0],
+                dtype=np.int64
+            )
+            before_bytes += rows * 8 + int(category_sizes[series.cat.codes.to_numpy()].sum())
+        elif pd.api.types.is_integer_dtype(series):
+            before_bytes += rows * 8
+        else:
+            before_bytes += int(series.memory_usage(index=False, deep=True))
+    after_bytes = int(df.memory_usage(index=False, deep=True).sum())
+    return {
+        'before_bytes': before_bytes,
+        'after_bytes': after_bytes,
+        'ratio': before_bytes / after_bytes if after_bytes else 1.0
+    }
+
+
+def cache_key(file_hash):
+    """파일 해시와 큐브 형식 버전을 조합한 디스크 캐시 키를 반환합니다."""
+    return f"cube{CUBE_FORMAT_VERSION}-{file_hash}"
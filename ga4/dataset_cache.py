@@ -0,0 +1,109 @@
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+
+# 캐시 저장소 기본 설정 (환경 변수로 변경 가능)
+DEFAULT_CACHE_DIR = os.environ.get(
+    'GA4_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ga4_dashboard')
+)
+DEFAULT_MAX_BYTES = int(os.environ.get('GA4_CACHE_MAX_BYTES', 2 * 1024 ** 3))  # 2GB
+
+
+def content_hash(data, block_size=1024 * 1024):
+    """업로드 파일 내용의 SHA-256 해시를 계산합니다.
+
+    bytes 외에 파일 객체도 받을 수 있으며, 이때는 내용을 복사하지 않고
+    블록 단위로 읽은 뒤 읽기 위치를 처음으로 되돌립니다.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    data.seek(0)
+    for block in iter(lambda: data.read(block_size), b''):
+        digest.update(block)
+    data.seek(0)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """업로드 내용의 해시를 키로 하는 로컬 Parquet 데이터셋 저장소입니다.
+
+    여러 세션과 워커 프로세스가 같은 디렉터리를 공유하며,
+    디스크 용량 한도를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다.
+    """
+
+    suffix = '.parquet'
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key):
+        """키에 해당하는 Parquet 파일 경로를 반환합니다."""
+        return os.path.join(self.root, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """저장된 데이터셋을 읽어옵니다. 없으면 None을 반환합니다."""
+        path = self.path_for(key)
+        try:
+            df = self._read(path)
+        except (FileNotFoundError, OSError):
+            return None
+        self._touch(path)
+        return df
+
+    def put(self, key, df):
+        """데이터셋을 Parquet 파일로 저장하고 용량 한도를 적용합니다."""
+        path = self.path_for(key)
+        # 다른 프로세스가 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            self._write(df, tmp_path)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def _read(self, path):
+        return pd.read_parquet(path)
+
+    def _write(self, df, path):
+        df.to_parquet(path, index=False)
+
+    def evict(self):
+        """용량 한도를 넘으면 최근 사용 시각이 오래된 항목부터 삭제합니다."""
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _touch(self, path):
+        """LRU 판단을 위해 파일의 수정 시각을 현재로 갱신합니다."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+# 차트 하나에 보낼 최대 데이터 포인트 수 (환경 변수로 변경 가능)
+POINT_BUDGET = int(os.environ.get('GA4_CHART_POINT_BUDGET', 400))
+
+# 집계 단위별 pandas 기간 규칙(월요일 시작 주, 달력 월)과 표시 이름
+PERIOD_RULES = {'week': 'W-SUN', 'month': 'M'}
+GRANULARITY_LABELS = {'day': '일별', 'week': '주별', 'month': '월별'}
+
+
+def choose_granularity(n_points, budget=POINT_BUDGET):
+    """포인트 수가 예산 안에 들어오는 가장 세밀한 집계 단위를 고릅니다."""
+    if n_points <= budget:
+        return 'day'
+    if n_points / 7 <= budget:
+        return 'week'
+    return 'month'
+
+
+def rollup_dates(df, columns, granularity, date_column='date'):
+    """일별 데이터를 주/월 단위로 합산합니다. 날짜는 각 기간의 시작일입니다."""
+    if granularity == 'day':
+        return df
+    period = df[date_column].dt.to_period(PERIOD_RULES[granularity]).dt.start_time
+    return df.groupby(period)[columns].sum().rename_axis(date_column).reset_index()
+
+
+def lttb_indices(x, y, n_out, keep=None):
+    """Largest-Triangle-Three-Buckets 방식으로 남길 포인트의 위치를 고릅니다.
+
+    모양을 유지하면서 n_out개 안팎으로 줄이며, keep에 지정한 위치
+    (최댓값, 급증 지점 등)는 항상 결과에 포함됩니다.
+    """
+    n = len(x)
+    keep = np.asarray([] if keep is None else keep, dtype=np.intp)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 다음 버킷의 평균점
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # 이전 선택점, 후보점, 다음 버킷 평균점이 만드는 삼각형 넓이가 최대인 점 선택
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        selected[i + 1] = prev
+
+    return np.union1d(selected, keep)
+
+
+def downsample_series(df, value_column, budget=POINT_BUDGET, keep_mask=None, date_column='date'):
+    """일별 시계열을 포인트 예산에 맞게 줄입니다. 남은 행의 값은 원본 그대로입니다."""
+    if len(df) <= budget:
+        return df
+    keep = np.flatnonzero(keep_mask) if keep_mask is not None else None
+    x = df[date_column].to_numpy().astype('datetime64[ns]').astype('int64')
+    y = df[value_column].to_numpy()
+    return df.iloc[lttb_indices(x, y, budget, keep)]
@@ -0,0 +1,73 @@
+import gzip
+import importlib.util
+import io
+import os
+import zipfile
+
+# 내보내기 시 한 번에 직렬화할 행 수 (환경 변수로 변경 가능)
+EXPORT_CHUNK_ROWS = int(os.environ.get('GA4_EXPORT_CHUNK_ROWS', 100_000))
+
+# 형식별 (파일 확장자, MIME 타입)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# 버튼에 표시할 형식 이름
+FORMAT_LABELS = {'csv': 'CSV', 'csv.gz': 'CSV.GZ', 'parquet': 'Parquet', 'xlsx': 'Excel'}
+
+
+def available_formats():
+    """현재 환경에서 만들 수 있는 내보내기 형식 목록입니다. (xlsx는 openpyxl 필요)"""
+    formats = ['csv', 'csv.gz', 'parquet']
+    if importlib.util.find_spec('openpyxl') is not None:
+        formats.append('xlsx')
+    return formats
+
+
+def export_file_name(base_name, fmt):
+    """기본 파일 이름(확장자 제외)에 형식별 확장자를 붙입니다."""
+    return f"{base_name}.{EXPORT_FORMATS[fmt][0]}"
+
+
+def write_csv(df, stream, chunk_rows=EXPORT_CHUNK_ROWS):
+    """데이터프레임을 UTF-8(BOM) CSV로 청크 단위로 씁니다. 스트림은 바이너리여야 합니다."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='', write_through=True)
+    try:
+        if df.empty:
+            df.to_csv(text, index=False)
+        for start in range(0, len(df), chunk_rows):
+            df.iloc[start:start + chunk_rows].to_csv(text, index=False, header=start == 0)
+        text.flush()
+    finally:
+        # 래퍼를 닫으면 원래 스트림도 닫히므로 분리만 함
+        text.detach()
+
+
+def export_table(df, fmt):
+    """표 하나를 지정한 형식의 바이트로 직렬화합니다."""
+    buffer = io.BytesIO()
+    if fmt == 'csv':
+        write_csv(df, buffer)
+    elif fmt == 'csv.gz':
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as gz:
+            write_csv(df, gz)
+    elif fmt == 'parquet':
+        df.to_parquet(buffer, index=False)
+    elif fmt == 'xlsx':
+        df.to_excel(buffer, index=False, engine='openpyxl')
+    else:
+        raise ValueError(f"unsupported export format: {fmt}")
+    return buffer.getvalue()
+
+
+def export_bundle(tables):
+    """여러 표를 CSV 파일로 담은 zip 묶음을 한 번에 만듭니다. tables는 {파일 이름: 데이터프레임}입니다."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, df in tables.items():
+            with archive.open(export_file_name(name, 'csv'), mode='w') as entry:
+                write_csv(df, entry)
+    return buffer.getvalue()
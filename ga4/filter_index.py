@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+
+# 행 번호 목록(posting list)을 만들 차원
+INDEXED_DIMENSIONS = ['source_medium', 'device_category']
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """사이드바 필터 상태입니다. 해시 가능하므로 캐시 키로도 사용합니다."""
+
+    date_range: tuple
+    sources: tuple = ()
+    device: str = None  # None이면 전체 기기
+
+
+class FilterIndex:
+    """날짜순으로 정렬된 큐브에 대한 필터 인덱스입니다.
+
+    날짜는 이진 탐색으로 행 구간을 찾고, 소스/매체와 기기는 값별로
+    정렬된 행 번호 목록을 미리 만들어 두어 필터 상태를 전체 스캔 없이
+    행 위치로 변환합니다.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.dates = df['date'].to_numpy()
+        if len(self.dates) > 1 and not (self.dates[1:] >= self.dates[:-1]).all():
+            raise ValueError("FilterIndex requires a frame sorted by date")
+        self.postings = {col: self._build_postings(df[col]) for col in INDEXED_DIMENSIONS}
+
+    def extend(self, df):
+        """앞부분이 기존 프레임과 같고 뒤에 새 날짜의 행이 붙은 프레임의 인덱스를 만듭니다.
+
+        기존 행 번호 목록은 그대로 두고 새로 붙은 행만 색인하므로,
+        비용은 전체 행 수가 아니라 추가된 행 수에 비례합니다.
+        """
+        offset = len(self.df)
+        tail = df.iloc[offset:]
+        tail_dates = tail['date'].to_numpy()
+        if len(tail_dates) and len(self.dates) and tail_dates[0] < self.dates[-1]:
+            raise ValueError("FilterIndex.extend requires appended rows to start after existing dates")
+
+        index = object.__new__(FilterIndex)
+        index.df = df
+        index.dates = np.concatenate([self.dates, tail_dates])
+        index.postings = {}
+        for col in INDEXED_DIMENSIONS:
+            postings = dict(self.postings[col])
+            for value, rows in self._build_postings(tail[col]).items():
+                if len(rows):
+                    old_rows = postings.get(value)
+                    rows = rows + offset
+                    postings[value] = rows if old_rows is None else np.concatenate([old_rows, rows])
+            index.postings[col] = postings
+        return index
+
+    @staticmethod
+    def _build_postings(series):
+        """값별로 오름차순 행 번호 배열을 만듭니다."""
+        categorical = series.astype('category')
+        codes = categorical.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(categorical.cat.categories))
+        offsets = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(codes < 0)
+        return {
+            value: order[offsets[i]:offsets[i + 1]]
+            for i, value in enumerate(categorical.cat.categories)
+        }
+
+    def date_bounds(self, start, end):
+        """[start, end] 날짜 범위에 해당하는 행 구간 (lo, hi)를 반환합니다."""
+        lo = np.searchsorted(self.dates, np.datetime64(start).astype(self.dates.dtype), side='left')
+        hi = np.searchsorted(
+            self.dates, np.datetime64(end + timedelta(days=1)).astype(self.dates.dtype), side='left'
+        )
+        return int(lo), int(hi)
+
+    def _posting_in_range(self, column, value, lo, hi):
+        rows = self.postings[column].get(value)
+        if rows is None:
+            return np.empty(0, dtype=np.intp)
+        return rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+
+    def resolve(self, spec):
+        """필터 상태를 행 위치로 변환합니다.
+
+        날짜만 지정되면 연속 구간(slice)을, 그 외에는 정렬된 행 번호 배열을 반환합니다.
+        """
+        lo, hi = self.date_bounds(*spec.date_range)
+        rows = None
+
+        if spec.sources:
+            # 각 행은 하나의 소스에만 속하므로 목록을 이어 붙이면 합집합
+            rows = np.sort(np.concatenate([
+                self._posting_in_range('source_medium', source, lo, hi)
+                for source in spec.sources
+            ]))
+
+        if spec.device is not None:
+            device_rows = self._posting_in_range('device_category', spec.device, lo, hi)
+            rows = device_rows if rows is None else np.intersect1d(rows, device_rows, assume_unique=True)
+
+        return slice(lo, hi) if rows is None else rows
+
+    def count(self, spec):
+        """필터 상태에 해당하는 행 수를 데이터를 복사하지 않고 계산합니다."""
+        rows = self.resolve(spec)
+        if isinstance(rows, slice):
+            return rows.stop - rows.start
+        return len(rows)
+
+    def select(self, spec):
+        """필터 상태에 해당하는 행만 담은 데이터프레임을 반환합니다."""
+        rows = self.resolve(spec)
+        if isinstance(rows, slice):
+            return self.df.iloc[rows]
+        return self.df.take(rows)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# 퍼널 단계 정의
+FUNNEL_STEPS = ['page_view', 'login', 'view_item', 'add_to_cart', 'begin_checkout', 'purchase']
+
+# 단계별로 비교할 수 있는 세그먼트 차원
+BREAKDOWN_DIMENSIONS = ['source_medium', 'device_category']
+
+
+def _conversion_rates(users):
+    """단계 × 세그먼트 사용자 수 행렬에서 전체 대비/이전 단계 대비 전환율을 계산합니다.
+
+    users는 마지막 축이 퍼널 단계인 배열입니다. 이전 단계 사용자가 0이면
+    이전 단계 대비 전환율은 NaN으로 둡니다.
+    """
+    users = users.astype('float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        from_start = (users / users[..., :1] * 100).round(1)
+        prev = users[..., :-1]
+        step_to_step = np.full_like(users, np.nan)
+        step_to_step[..., 1:] = np.where(prev > 0, users[..., 1:] / prev * 100, np.nan).round(1)
+    return from_start, step_to_step
+
+
+def compute_funnel(event_totals, steps=FUNNEL_STEPS):
+    """이벤트별 사용자 수 합계에서 퍼널 단계별 사용자 수와 전환율 표를 계산합니다."""
+    totals = event_totals.reindex(list(steps), fill_value=0)
+    from_start, step_to_step = _conversion_rates(totals.to_numpy())
+    return pd.DataFrame({
+        'step': list(steps),
+        'users': totals.to_numpy(),
+        'conversion_from_start': from_start,
+        'step_to_step_rate': step_to_step
+    })
+
+
+def funnel_breakdown(segment_event_users, steps=FUNNEL_STEPS):
+    """세그먼트(소스/매체, 기기 등)별 퍼널을 한 번에 계산합니다.
+
+    segment_event_users는 (이벤트, 세그먼트)별 사용자 수입니다. 반환값은 세그먼트를
+    행으로, (지표, 단계)를 열로 하는 데이터프레임이며 지표는 users,
+    conversion_from_start, step_to_step_rate 입니다.
+    """
+    matrix = (
+        segment_event_users
+        .unstack('event_name')
+        .reindex(columns=list(steps))
+        .fillna(0)
+        .astype('int64')
+    )
+    from_start, step_to_step = _conversion_rates(matrix.to_numpy())
+    columns = pd.Index(list(steps), name='step')
+    return pd.concat({
+        'users': matrix.set_axis(columns, axis=1),
+        'conversion_from_start': pd.DataFrame(from_start, index=matrix.index, columns=columns),
+        'step_to_step_rate': pd.DataFrame(step_to_step, index=matrix.index, columns=columns)
+    }, axis=1, names=['metric', 'step'])
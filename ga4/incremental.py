@@ -0,0 +1,247 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+from anomalies import AnomalyDetector
+from catalog import DimensionCatalog
+from cube import CUBE_KEYS, build_cube, cache_key, concat_cubes, empty_frame
+from filter_index import FilterIndex
+from prefix_index import build_prefix_index
+from profiling import mark_cache_miss
+
+# 새 파일을 자동으로 수집할 로컬 폴더 (비어 있으면 사용 안 함)
+WATCH_DIR = os.environ.get('GA4_WATCH_DIR', '')
+
+# 프로세스에 보관할 누적 데이터셋 스냅샷 수 (환경 변수로 변경 가능)
+DATASET_SLOTS = int(os.environ.get('GA4_DATASET_SLOTS', 4))
+
+# 큐브에서 계산해 스냅샷에 보관하는 값 (처음 사용할 때 계산하고, 이어 붙일 때는 새 행만 반영)
+DERIVED = ('filter_index', 'catalog', 'prefix_index', 'anomaly_detector')
+
+
+def dataset_hash(file_hashes):
+    """수집한 파일 해시 목록으로 누적 데이터셋의 식별자를 만듭니다.
+
+    파일이 하나면 그 파일의 해시를 그대로 사용해 기존 캐시 키와 맞춥니다.
+    """
+    if len(file_hashes) == 1:
+        return file_hashes[0]
+    return hashlib.sha256('\n'.join(file_hashes).encode('ascii')).hexdigest()
+
+
+def scan_directory(path):
+    """폴더 안의 CSV 파일 경로를 이름순으로 반환합니다."""
+    if not path or not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.lower().endswith('.csv') and os.path.isfile(os.path.join(path, name))
+    )
+
+
+class IncrementalDataset:
+    """여러 GA4 내보내기 파일을 하나의 큐브로 누적한 데이터셋 스냅샷입니다.
+
+    manifest에는 반영한 파일의 해시, 이름, 날짜 범위가 순서대로 들어 있습니다.
+    날짜가 겹치면 나중에 추가한 파일의 값으로 그 날짜 전체를 대체해 같은 날이
+    두 번 더해지지 않게 합니다. 새 파일의 날짜가 모두 기존 데이터 이후면
+    (일별 내보내기의 일반적인 경우) 기존 큐브를 다시 집계하거나 정렬하지 않고
+    뒤에 이어 붙이며, 필터 인덱스, 차원 목록, 누적합 인덱스, 이상 탐지기도
+    새로 붙은 행만 반영합니다.
+    """
+
+    def __init__(self, cube=None, manifest=(), base=None, derived=None):
+        self.cube = build_cube(empty_frame()) if cube is None else cube
+        self.manifest = tuple(manifest)
+        # 뒤에 이어 붙이기 전 스냅샷에서 이미 계산해 둔 {이름: 값} (새 행만 반영해 재사용)
+        self._base = base or {}
+        # 이 큐브로 이미 계산해 둔 {이름: 값} (공유 저장소에서 매핑한 누적합 인덱스 등)
+        self.__dict__.update(derived or {})
+
+    @cached_property
+    def filter_index(self):
+        """날짜 구간과 값별 행 번호 인덱스 (처음 사용할 때 계산)"""
+        base = self._base.get('filter_index')
+        if base is not None:
+            return base.extend(self.cube)
+        return FilterIndex(self.cube)
+
+    @cached_property
+    def catalog(self):
+        """날짜 범위와 차원별 고유 값 목록 (사이드바 위젯용)"""
+        base = self._base.get('catalog')
+        if base is not None:
+            return base.extend(self.cube)
+        return DimensionCatalog(self.cube)
+
+    @cached_property
+    def prefix_index(self):
+        """날짜 누적합 인덱스 (셀 수가 한도를 넘으면 None)"""
+        base = self._base.get('prefix_index')
+        if base is not None:
+            return base.extend(self.cube)
+        return build_prefix_index(self.cube)
+
+    @cached_property
+    def anomaly_detector(self):
+        """전체 시계열의 이상 탐지기 (처음 사용할 때 계산)"""
+        mark_cache_miss()
+        base = self._base.get('anomaly_detector')
+        if base is not None:
+            return base.update(self.cube.iloc[self._base['rows']:])
+        return AnomalyDetector().fit(self.cube)
+
+    def remap(self, shared):
+        """같은 데이터셋을 매핑해 연 스냅샷(shared)의 큐브로 바꾼 스냅샷을 반환합니다.
+
+        행 순서가 같으므로 이어 붙이기 기준값과 이미 계산한 파생 값은 그대로 쓰고,
+        shared에 있는 파생 값(매핑한 누적합 인덱스)은 그것을 씁니다. 필터 인덱스는
+        원래 큐브를 참조하므로 넘기지 않고 매핑한 큐브로 다시 만듭니다(기준값이 있으면 새 행만).
+        """
+        derived = {name: value for name, value in _derived(self).items() if name != 'filter_index'}
+        derived.update(_derived(shared))
+        return IncrementalDataset(shared.cube, shared.manifest, self._base, derived)
+
+    def warm(self, *names):
+        """파생 값(DERIVED의 이름)을 지금 계산해 두고 자신을 반환합니다."""
+        for name in names:
+            getattr(self, name)
+        return self
+
+    @property
+    def file_hashes(self):
+        return tuple(entry['hash'] for entry in self.manifest)
+
+    @property
+    def dataset_hash(self):
+        """데이터셋 식별자 (캐시 키로 사용)"""
+        return dataset_hash(self.file_hashes)
+
+    def extend(self, files):
+        """새 파일들의 큐브를 반영한 새 스냅샷을 반환합니다. files는 (해시, 이름, 큐브) 목록입니다."""
+        known = set(self.file_hashes)
+        files = [(file_hash, name, part) for file_hash, name, part in files if file_hash not in known]
+        if not files:
+            return self
+
+        # 나중 파일이 우선하도록 뒤에서부터 이미 덮인 날짜를 제외
+        covered = set()
+        parts = []
+        manifest = list(self.manifest)
+        entries = []
+        for file_hash, name, part in reversed(files):
+            part_dates = part['date'].unique()
+            if covered:
+                part = part[~part['date'].isin(covered)]
+            covered.update(part_dates)
+            entries.append(_manifest_entry(file_hash, name, part_dates))
+            if len(part):
+                parts.append(part)
+        manifest.extend(reversed(entries))
+        parts.sort(key=lambda frame: frame['date'].iloc[0])
+
+        existing = self.cube
+        last_date = existing['date'].iloc[-1] if len(existing) else None
+        if covered and last_date is not None and min(covered) <= last_date:
+            existing = existing[~existing['date'].isin(covered)]
+
+        frames = [frame for frame in [existing] + parts if len(frame)]
+        if not frames:
+            return IncrementalDataset(self.cube, manifest, derived=_derived(self))
+        cube = concat_cubes(frames)
+
+        if existing is self.cube and _is_date_ordered(parts, last_date):
+            # 새 날짜만 뒤에 붙은 경우: 정렬/색인/목록/누적합/이상 탐지는 새 행만
+            base = {name: value for name, value in _derived(self).items() if value is not None}
+            base['rows'] = len(self.cube)
+            return IncrementalDataset(cube, manifest, base)
+        cube = cube.sort_values(CUBE_KEYS, ignore_index=True)
+        return IncrementalDataset(cube, manifest)
+
+
+class DatasetRegistry:
+    """파일 해시 목록별 누적 데이터셋 스냅샷을 여러 세션이 공유하도록 보관합니다.
+
+    요청한 파일 목록의 앞부분으로 만든 스냅샷이 있으면 그 스냅샷에
+    나머지 파일만 추가하므로, 하루치 파일이 늘어나면 하루치만 처리합니다.
+    store(SharedDatasetStore)를 주면 만든 스냅샷을 저장소에 올리고 매핑한 스냅샷을
+    보관하며, 이 프로세스에 없는 스냅샷은 다른 프로세스가 올려 둔 파일을 먼저 찾습니다.
+    """
+
+    def __init__(self, max_entries=DATASET_SLOTS, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, files, load_cube):
+        """(해시, 이름) 목록에 해당하는 스냅샷을 반환합니다. load_cube(해시)는 파일 하나의 큐브를 반환합니다."""
+        # 같은 파일을 두 번 올린 경우 처음 것만 사용
+        unique_files = {}
+        for file_hash, name in files:
+            unique_files.setdefault(file_hash, name)
+        files = list(unique_files.items())
+        key = tuple(file_hash for file_hash, _ in files)
+        with self._lock:
+            base = None
+            for size in range(len(key), 0, -1):
+                if key[:size] in self._entries:
+                    base = self._entries[key[:size]]
+                    self._entries.move_to_end(key[:size])
+                    break
+        if base is not None and base.file_hashes == key:
+            return base
+
+        if self.store is not None:
+            # 프로세스에 있는 것보다 긴 앞부분의 스냅샷이 공유 저장소에 있으면 매핑해서 사용
+            known = len(base.file_hashes) if base is not None else 0
+            for size in range(len(key), known, -1):
+                shared = self.store.open(cache_key(dataset_hash(key[:size])))
+                if shared is not None:
+                    base = shared
+                    break
+
+        if base is None:
+            base = IncrementalDataset()
+        new_files = files[len(base.file_hashes):]
+        if new_files:
+            dataset = base.extend([(file_hash, name, load_cube(file_hash)) for file_hash, name in new_files])
+            if self.store is not None:
+                dataset = self.store.share(dataset)
+        else:
+            dataset = base
+
+        with self._lock:
+            self._entries[key] = dataset
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return dataset
+
+
+def _derived(dataset):
+    """스냅샷에서 이미 계산한 파생 값 {이름: 값}"""
+    return {name: dataset.__dict__[name] for name in DERIVED if name in dataset.__dict__}
+
+
+def _manifest_entry(file_hash, name, dates):
+    return {
+        'hash': file_hash,
+        'name': name,
+        'start': dates.min() if len(dates) else None,
+        'end': dates.max() if len(dates) else None,
+        'days': len(dates)
+    }
+
+
+def _is_date_ordered(parts, last_date):
+    """파일별 큐브가 기존 마지막 날짜 이후로 서로 겹치지 않게 이어지는지 확인합니다."""
+    previous = last_date
+    for part in parts:
+        if previous is not None and part['date'].iloc[0] <= previous:
+            return False
+        previous = part['date'].iloc[-1]
+    return True
+
@@ -0,0 +1,306 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from cube import CUBE_KEYS, DIMENSIONS, MEASURES, build_cube, cache_key, empty_frame, rollup
+
+# 필수 컬럼 정의
+REQUIRED_COLUMNS = ['date', 'source_medium', 'sessions', 'users', 'new_users',
+                    'device_category', 'event_name', 'step']
+
+# 스트리밍 수집 설정 (환경 변수로 변경 가능)
+CHUNK_ROWS = int(os.environ.get('GA4_CHUNK_ROWS', 500_000))
+STREAMING_THRESHOLD_BYTES = int(os.environ.get('GA4_STREAMING_THRESHOLD_MB', 100)) * 1024 ** 2
+
+# GA4 내보내기 스키마의 컬럼 형식. 빠른 경로는 형식을 추론하지 않고 큐브에 쓰는 컬럼만 이 형식으로 읽음
+# (문자열은 사전 인코딩으로 읽어 고유 값만 변환하므로 날짜도 고유 날짜 수만큼만 해석)
+SCHEMA_TYPES = {
+    **{col: pa.dictionary(pa.int32(), pa.string()) for col in ['date'] + DIMENSIONS},
+    **{col: pa.int64() for col in MEASURES}
+}
+DATE_FORMAT = '%Y-%m-%d'
+
+# 형식 오류 행 보고서에 규칙별로 남길 예시 행 번호 수
+MALFORMED_EXAMPLES = int(os.environ.get('GA4_MALFORMED_EXAMPLES', 10))
+
+# 형식 오류 행 규칙 (보고서 순서)
+MALFORMED_RULES = {
+    'bad_date': '날짜가 비어 있거나 YYYY-MM-DD 형식이 아님',
+    'negative_count': '사용자/세션 수가 음수',
+    'new_users_over_users': '신규 사용자 수가 사용자 수보다 많음'
+}
+
+
+class SchemaError(ValueError):
+    """필수 컬럼이 누락된 CSV 파일에 대한 오류입니다."""
+
+    def __init__(self, missing_columns):
+        self.missing_columns = missing_columns
+        super().__init__(f"missing required columns: {', '.join(missing_columns)}")
+
+
+class DateFormatError(ValueError):
+    """날짜 컬럼을 해석할 수 없는 CSV 파일에 대한 오류입니다."""
+
+
+class SchemaMismatch(ValueError):
+    """파일이 GA4 스키마의 형식과 달라 빠른 경로로 읽을 수 없을 때의 오류입니다 (느린 경로로 다시 읽음)."""
+
+
+class IngestCancelled(Exception):
+    """사용자가 수집을 취소했을 때 진행 콜백에서 발생시키는 예외입니다."""
+
+
+def check_columns(columns):
+    """필수 컬럼이 모두 있는지 확인하고, 없으면 SchemaError를 발생시킵니다."""
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise SchemaError(missing_columns)
+
+
+def read_header(file):
+    """본문을 읽기 전에 첫 줄만 읽어 컬럼 이름 목록을 반환합니다. 읽기 위치는 처음으로 되돌립니다."""
+    file.seek(0)
+    line = file.readline()
+    file.seek(0)
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig', errors='replace')
+    return next(csv.reader([line.lstrip('\ufeff')]), [])
+
+
+def malformed_key(file_hash):
+    """파일의 형식 오류 행 보고서를 디스크 캐시에 저장할 키를 반환합니다."""
+    return f"{cache_key(file_hash)}-malformed"
+
+
+def parse_dates(series):
+    """날짜 컬럼을 datetime으로 변환합니다.
+
+    해석할 수 없는 값은 NaT로 두어 형식 오류 행(bad_date)으로 제외하고,
+    날짜가 하나도 해석되지 않으면 DateFormatError를 발생시킵니다.
+    """
+    parsed = _coerce_dates(series)
+    if len(parsed) and parsed.isna().all():
+        raise DateFormatError(f"no parsable dates in column '{series.name}'")
+    return parsed
+
+
+def _coerce_dates(series):
+    return pd.to_datetime(series, errors='coerce')
+
+
+def strict_frame(table):
+    """빠른 경로로 읽은 Arrow 테이블을 큐브 컬럼의 데이터프레임으로 바꿉니다.
+
+    날짜는 고유 값만 DATE_FORMAT으로 해석하고 해석할 수 없는 값은 NaT로 둡니다.
+    지표에 빈 값이 있거나 날짜가 하나도 해석되지 않으면 SchemaMismatch를 발생시킵니다.
+    """
+    if any(table.column(col).null_count for col in MEASURES):
+        raise SchemaMismatch("count columns contain empty values")
+    df = table.to_pandas()
+    dates = df['date'].cat
+    parsed = pd.DatetimeIndex(pd.to_datetime(dates.categories, format=DATE_FORMAT, errors='coerce'))
+    if len(parsed) and parsed.isna().all():
+        raise SchemaMismatch(f"dates are not in {DATE_FORMAT} format")
+    df['date'] = parsed.take(dates.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT)
+    # 범주 순서를 느린 경로(이름순)와 맞춰 큐브의 행 순서가 같도록 함
+    for col in DIMENSIONS:
+        df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def read_strict(file):
+    """GA4 스키마로 파일 전체를 멀티스레드 Arrow CSV 파서로 읽습니다. 맞지 않으면 SchemaMismatch를 발생시킵니다."""
+    try:
+        table = pa_csv.read_csv(file, convert_options=_convert_options())
+    except pa.ArrowInvalid as e:
+        raise SchemaMismatch(str(e)) from e
+    return strict_frame(table)
+
+
+def read_loose(file):
+    """형식을 추론하며 파일 전체를 읽습니다 (스키마와 다른 파일을 위한 느린 경로)."""
+    df = pd.read_csv(file)
+    df['date'] = parse_dates(df['date'])
+    return df
+
+
+def find_malformed(df, offset=0):
+    """형식 오류 행을 규칙별로 찾아 (정상 행 마스크, 보고서)를 반환합니다.
+
+    보고서는 규칙(rule)별 행 수(rows)와 앞쪽 예시 행 번호(lines, 헤더를 1행으로 센 파일 행 번호)이며,
+    offset은 청크 단위로 읽을 때 이 청크 앞에 있는 데이터 행 수입니다.
+    """
+    checks = {
+        'bad_date': df['date'].isna().to_numpy(),
+        'negative_count': (df[MEASURES] < 0).any(axis=1).to_numpy(),
+        'new_users_over_users': (df['new_users'] > df['users']).to_numpy()
+    }
+    valid = ~np.logical_or.reduce(list(checks.values()))
+    report = pd.DataFrame({
+        'rule': list(checks),
+        'rows': [int(np.count_nonzero(mask)) for mask in checks.values()],
+        'lines': [(np.flatnonzero(mask)[:MALFORMED_EXAMPLES] + offset + 2).tolist() for mask in checks.values()]
+    })
+    return valid, report
+
+
+def merge_malformed(report, other):
+    """두 보고서의 행 수를 더하고 예시 행 번호를 앞에서부터 MALFORMED_EXAMPLES개까지 합칩니다."""
+    if report is None:
+        return other
+    return pd.DataFrame({
+        'rule': report['rule'],
+        'rows': report['rows'] + other['rows'],
+        'lines': [(list(a) + list(b))[:MALFORMED_EXAMPLES] for a, b in zip(report['lines'], other['lines'])]
+    })
+
+
+def drop_malformed(df, offset=0, report=None):
+    """형식 오류 행을 제외한 프레임과 지금까지의 보고서를 반환합니다."""
+    valid, chunk_report = find_malformed(df, offset)
+    if not valid.all():
+        df = df[valid]
+    return df, merge_malformed(report, chunk_report)
+
+
+def stream_aggregate(file, chunk_rows=CHUNK_ROWS, on_progress=None, on_partial=None, on_malformed=None):
+    """CSV를 청크 단위로 읽으면서 롤업 큐브로 집계하여 최대 메모리를 청크 크기로 제한합니다.
+
+    본문을 읽기 전에 헤더로 필수 컬럼을 확인하고, GA4 스키마와 맞는 파일은 Arrow CSV
+    스트리밍 파서로, 맞지 않는 파일은 처음부터 다시 형식을 추론하며 읽습니다. 형식 오류 행은
+    청크마다 제외하고, 부분 집계 결과는 일정 크기를 넘을 때마다 다시 합쳐서 고유 셀 수
+    이상으로 커지지 않게 합니다. on_progress 콜백에는 0~1 사이의 진행률이, on_partial
+    콜백에는 지금까지의 부분 집계 목록이 청크마다, on_malformed 콜백에는 형식 오류 행이
+    있을 때 보고서가 끝에 한 번 전달됩니다. 콜백에서 IngestCancelled를 발생시키면
+    수집을 중단합니다.
+    """
+    check_columns(read_header(file))
+    try:
+        return _aggregate_chunks(file, _strict_chunks(file, chunk_rows), chunk_rows,
+                                 on_progress, on_partial, on_malformed)
+    except SchemaMismatch:
+        return _aggregate_chunks(file, _loose_chunks(_rewind(file), chunk_rows), chunk_rows,
+                                 on_progress, on_partial, on_malformed)
+
+
+def _aggregate_chunks(file, chunks, chunk_rows, on_progress, on_partial, on_malformed):
+    total_bytes = file_size(file)
+    partials = []
+    partial_rows = 0
+    compact_limit = chunk_rows
+    offset = 0
+    report = None
+
+    for chunk in chunks:
+        chunk_length = len(chunk)
+        chunk, report = drop_malformed(chunk, offset, report)
+        offset += chunk_length
+
+        if len(chunk):
+            partial = rollup(chunk)
+            partials.append(partial)
+            partial_rows += len(partial)
+
+        # 부분 집계가 쌓이면 한 번 더 합쳐서 메모리 사용량을 유지
+        if partial_rows > compact_limit:
+            partials = [rollup(pd.concat(partials, ignore_index=True))]
+            partial_rows = len(partials[0])
+            compact_limit = max(chunk_rows, partial_rows * 2)
+
+        if on_partial is not None and partials:
+            on_partial(partials)
+        if on_progress is not None and total_bytes:
+            on_progress(min(file.tell() / total_bytes, 1.0))
+
+    if on_malformed is not None and report is not None and report['rows'].any():
+        on_malformed(report)
+    if not partials:
+        return build_cube(empty_frame())
+
+    cube = build_cube(pd.concat(partials, ignore_index=True))
+    if on_progress is not None:
+        on_progress(1.0)
+    return cube
+
+
+def _strict_chunks(file, chunk_rows):
+    """GA4 스키마로 읽은 Arrow 레코드 배치를 chunk_rows 행 이상씩 모아 데이터프레임으로 반환합니다."""
+    batches = []
+    rows = 0
+    # open_csv도 첫 블록을 변환하므로 파일 앞부분의 형식 오류도 같은 예외로 처리
+    try:
+        reader = pa_csv.open_csv(file, convert_options=_convert_options())
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_rows:
+                yield strict_frame(pa.Table.from_batches(batches))
+                batches, rows = [], 0
+    except pa.ArrowInvalid as e:
+        raise SchemaMismatch(str(e)) from e
+    if batches:
+        yield strict_frame(pa.Table.from_batches(batches))
+
+
+def _loose_chunks(file, chunk_rows):
+    # 날짜를 해석할 수 없는 청크도 형식 오류 행으로 보고하고, 파일 전체에 해석된 날짜가 없을 때만 중단
+    parsed_any = False
+    for chunk in pd.read_csv(file, chunksize=chunk_rows):
+        chunk = chunk[CUBE_KEYS + MEASURES]
+        dates = _coerce_dates(chunk['date'])
+        parsed_any = parsed_any or dates.notna().any()
+        yield chunk.assign(date=dates)
+    if not parsed_any:
+        raise DateFormatError("no parsable dates in column 'date'")
+
+
+def read_cube(file, on_progress=None, on_malformed=None):
+    """CSV 파일 하나를 롤업 큐브로 읽습니다. 대용량 파일은 청크 단위로 읽으면서 집계합니다.
+
+    본문을 읽기 전에 헤더로 필수 컬럼을 확인하고(없으면 SchemaError), GA4 스키마와 맞는
+    파일은 빠른 경로(read_strict)로, 맞지 않는 파일은 느린 경로(read_loose)로 읽습니다.
+    느린 경로에서 날짜가 하나도 해석되지 않으면 DateFormatError를 발생시킵니다. 형식 오류 행은
+    큐브에서 제외하고, 있으면 보고서(find_malformed)를 on_malformed 콜백에 전달합니다.
+    on_progress는 청크 단위로 읽을 때만 호출됩니다.
+    """
+    check_columns(read_header(file))
+    if file_size(file) >= STREAMING_THRESHOLD_BYTES:
+        return stream_aggregate(file, on_progress=on_progress, on_malformed=on_malformed)
+    try:
+        df = read_strict(file)
+    except SchemaMismatch:
+        df = read_loose(_rewind(file))
+    df, report = drop_malformed(df)
+    if on_malformed is not None and report['rows'].any():
+        on_malformed(report)
+    return build_cube(df)
+
+
+def file_size(file):
+    """파일 객체의 전체 크기를 바이트 단위로 반환합니다."""
+    size = getattr(file, 'size', None)
+    if size is not None:
+        return size
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def _rewind(file):
+    file.seek(0)
+    return file
+
+
+def _convert_options():
+    return pa_csv.ConvertOptions(
+        include_columns=CUBE_KEYS + MEASURES,
+        column_types=SCHEMA_TYPES,
+        strings_can_be_null=True
+    )
@@ -0,0 +1,273 @@
+"""날짜 누적합 인덱스.
+
+(이벤트, 소스/매체, 기기 유형) 시계열마다 달력 날짜 축의 누적합을 미리 만들어 두면
+임의의 날짜 범위 합계는 시계열마다 두 번의 조회(끝 누적합 - 시작 누적합)로 구할 수 있습니다.
+대시보드의 모든 섹션은 날짜에 대해 더할 수 있는 합계이므로, 날짜 범위를 바꾸거나
+비교 기간을 계산할 때 큐브 행을 다시 훑지 않고 시계열 수에 비례하는 비용으로 집계합니다.
+"""
+import os
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from aggregation import AggregationContext
+from cube import DIMENSIONS
+
+# 인덱스로 만들 최대 셀 수 (시계열 수 × 날짜 수). 넘으면 필터 인덱스로 집계
+PREFIX_MAX_CELLS = int(os.environ.get('GA4_PREFIX_MAX_CELLS', 5_000_000))
+
+# 누적합을 만드는 값 (rows는 큐브 행 수로, 해당 날짜에 데이터가 있었는지 판단)
+CHANNELS = ('rows', 'users', 'new_users')
+
+
+def build_prefix_index(cube, max_cells=PREFIX_MAX_CELLS):
+    """큐브의 누적합 인덱스를 만듭니다. 셀 수가 max_cells를 넘으면 None을 반환합니다."""
+    return PrefixSumIndex(cube.iloc[:0]).extend(cube, max_cells)
+
+
+class PrefixSumIndex:
+    """시계열별 날짜 누적합 인덱스입니다.
+
+    sums[채널]은 [시계열, 날짜 수 + 1] 배열이며 sums[:, d]는 첫날부터 d일 전까지의
+    합계입니다. 날짜는 첫날부터 마지막 날까지 빠짐없이 이어진 달력 날짜이므로
+    날짜를 열 번호로 바꾸는 데 탐색이 필요 없습니다. 큐브는 보관하지 않습니다.
+    """
+
+    def __init__(self, cube):
+        self.rows = 0
+        self.categories = {col: cube[col].cat.categories for col in DIMENSIONS}
+        self.series_codes = {col: np.empty(0, dtype=np.int64) for col in DIMENSIONS}
+        self.start = None
+        self.sums = {name: np.zeros((0, 1), dtype=np.int64) for name in CHANNELS}
+
+    @property
+    def n_days(self):
+        return self.sums['rows'].shape[1] - 1
+
+    @property
+    def n_series(self):
+        return len(self.series_codes[DIMENSIONS[0]])
+
+    @property
+    def dates(self):
+        """인덱스가 다루는 달력 날짜"""
+        if self.start is None:
+            return pd.DatetimeIndex([])
+        return pd.date_range(self.start, periods=self.n_days, freq='D')
+
+    def extend(self, cube, max_cells=PREFIX_MAX_CELLS):
+        """앞부분이 색인한 큐브와 같고 뒤에 새 날짜의 행이 붙은 큐브의 인덱스를 만듭니다.
+
+        기존 누적합은 그대로 두고 새 날짜의 열만 계산해 붙입니다.
+        셀 수가 max_cells를 넘으면 None을 반환합니다.
+        """
+        tail = cube.iloc[self.rows:]
+        if self.start is not None and len(tail) and (tail['date'].iloc[0] - self.start).days < self.n_days:
+            raise ValueError("PrefixSumIndex.extend requires appended rows to start after existing dates")
+
+        index = object.__new__(PrefixSumIndex)
+        index.rows = len(cube)
+        index.categories = {col: cube[col].cat.categories for col in DIMENSIONS}
+        index.start = self.start if self.start is not None or not len(tail) else tail['date'].iloc[0]
+
+        # 기존 시계열의 범주 코드를 새 범주 목록 기준으로 바꾸고, 새로 나온 시계열을 뒤에 추가
+        old_codes = {
+            col: index.categories[col].get_indexer(self.categories[col])[self.series_codes[col]]
+            for col in DIMENSIONS
+        }
+        tail_codes = {col: tail[col].cat.codes.to_numpy().astype(np.int64) for col in DIMENSIONS}
+        sizes = [len(index.categories[col]) for col in DIMENSIONS]
+        old_keys = np.ravel_multi_index([old_codes[col] for col in DIMENSIONS], sizes)
+        tail_keys = np.ravel_multi_index([tail_codes[col] for col in DIMENSIONS], sizes)
+        unique_keys, row_keys = np.unique(tail_keys, return_inverse=True)
+        positions = pd.Index(old_keys).get_indexer(unique_keys)
+        new_keys = unique_keys[positions < 0]
+        positions[positions < 0] = np.arange(len(old_keys), len(old_keys) + len(new_keys))
+        new_codes = np.unravel_index(new_keys, sizes)
+        index.series_codes = {
+            col: np.concatenate([old_codes[col], codes]) for col, codes in zip(DIMENSIONS, new_codes)
+        }
+
+        n_series = index.n_series
+        if not len(tail):
+            index.sums = {name: np.zeros((n_series, self.n_days + 1), dtype=np.int64) for name in CHANNELS}
+            for name in CHANNELS:
+                index.sums[name][:self.n_series] = self.sums[name]
+            return index
+        n_days = (tail['date'].iloc[-1] - index.start).days + 1
+        if n_series * (n_days + 1) > max_cells:
+            return None
+
+        # 새 날짜 구간의 [시계열, 날짜] 합계를 한 번에 더한 뒤 기존 마지막 누적합에 이어서 누적
+        added_days = n_days - self.n_days
+        series = positions[row_keys]
+        days = ((tail['date'] - index.start) // pd.Timedelta(days=1)).to_numpy() - self.n_days
+        cells = series * added_days + days
+        index.sums = {}
+        for name in CHANNELS:
+            weights = None if name == 'rows' else tail[name].to_numpy(dtype=np.float64)
+            values = np.bincount(cells, weights=weights, minlength=n_series * added_days)
+            block = np.cumsum(values.reshape(n_series, added_days).astype(np.int64), axis=1)
+            old = np.zeros((n_series, self.n_days + 1), dtype=np.int64)
+            old[:self.n_series] = self.sums[name]
+            index.sums[name] = np.hstack([old, block + old[:, -1:]])
+        return index
+
+    def to_arrow(self):
+        """시계열 한 행에 시계열의 범주 코드와 채널별 누적합 목록을 담은 Arrow 테이블로 변환합니다.
+
+        범주 목록은 큐브와 같으므로 저장하지 않고, 시작일과 큐브 행 수는 스키마 메타데이터에 둡니다.
+        """
+        width = self.n_days + 1
+        columns = {col: pa.array(self.series_codes[col], type=pa.int64()) for col in DIMENSIONS}
+        for name in CHANNELS:
+            columns[name] = pa.FixedSizeListArray.from_arrays(pa.array(self.sums[name].ravel()), width)
+        metadata = {
+            'rows': str(self.rows),
+            'start': '' if self.start is None else self.start.isoformat(),
+            'unit': '' if self.start is None else self.start.unit,
+            'width': str(width)
+        }
+        return pa.table(columns, metadata=metadata)
+
+    @staticmethod
+    def from_arrow(table, categories):
+        """to_arrow()로 만든 테이블의 인덱스입니다. 배열은 테이블 메모리를 복사하지 않고 가리킵니다.
+
+        categories는 인덱스를 만든 큐브의 {차원: 범주 목록}입니다.
+        """
+        metadata = table.schema.metadata
+        width = int(metadata[b'width'])
+        index = object.__new__(PrefixSumIndex)
+        index.rows = int(metadata[b'rows'])
+        index.categories = dict(categories)
+        index.start = None
+        if metadata[b'start']:
+            index.start = pd.Timestamp(metadata[b'start'].decode()).as_unit(metadata[b'unit'].decode())
+        columns = {name: table.column(name).combine_chunks() for name in table.column_names}
+        index.series_codes = {col: columns[col].to_numpy() for col in DIMENSIONS}
+        index.sums = {
+            name: columns[name].flatten().to_numpy().reshape(-1, width) for name in CHANNELS
+        }
+        return index
+
+    def bounds(self, date_range):
+        """[시작일, 종료일] 날짜 범위의 누적합 열 구간 (lo, hi). 데이터 밖은 잘라냅니다."""
+        if self.start is None:
+            return 0, 0
+        start, end = (pd.Timestamp(date) for date in date_range)
+        lo = min(max((start - self.start).days, 0), self.n_days)
+        hi = min(max((end - self.start).days + 1, lo), self.n_days)
+        return lo, hi
+
+    def series_mask(self, spec=None):
+        """필터 상태의 소스/매체와 기기 유형에 해당하는 시계열 (불리언 배열)"""
+        mask = np.ones(self.n_series, dtype=bool)
+        if spec is None:
+            return mask
+        if spec.sources:
+            codes = self.categories['source_medium'].get_indexer(list(spec.sources))
+            mask &= np.isin(self.series_codes['source_medium'], codes[codes >= 0])
+        if spec.device is not None:
+            # 없는 기기 유형은 코드가 -1이라 어떤 시계열과도 같지 않음
+            code = self.categories['device_category'].get_indexer([spec.device])[0]
+            mask &= self.series_codes['device_category'] == code
+        return mask
+
+    def totals(self, name, lo, hi):
+        """[lo, hi) 날짜 구간의 시계열별 합계"""
+        sums = self.sums[name]
+        return sums[:, hi] - sums[:, lo]
+
+    def daily(self, name, lo, hi):
+        """[lo, hi) 날짜 구간의 [시계열, 날짜] 일별 값"""
+        return np.diff(self.sums[name][:, lo:hi + 1], axis=1)
+
+
+class PrefixAggregationContext(AggregationContext):
+    """누적합 인덱스로 필터 상태의 집계를 계산하는 컨텍스트입니다.
+
+    AggregationContext와 같은 조회 메서드와 같은 결과(데이터가 있는 그룹만 포함)를
+    제공하며, 합계 집계는 선택한 시계열의 누적합 두 열 차이로, 일별 집계는 선택한
+    날짜 구간의 열만 읽어 계산합니다.
+    """
+
+    def __init__(self, index, spec=None):
+        self.index = index
+        self.spec = spec
+
+    @cached_property
+    def _bounds(self):
+        if self.spec is None:
+            return 0, self.index.n_days
+        return self.index.bounds(self.spec.date_range)
+
+    @cached_property
+    def _series(self):
+        """선택한 시계열 번호"""
+        return np.flatnonzero(self.index.series_mask(self.spec))
+
+    @property
+    def df(self):
+        raise AttributeError("PrefixAggregationContext does not materialize filtered rows")
+
+    def count(self):
+        """필터 상태에 해당하는 큐브 행 수"""
+        return int(self.index.totals('rows', *self._bounds)[self._series].sum())
+
+    def _values(self, name, by_date):
+        lo, hi = self._bounds
+        if by_date:
+            return self.index.daily(name, lo, hi)[self._series]
+        return self.index.totals(name, lo, hi)[self._series]
+
+    def _sum_users(self, keys):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        dims = [key for key in keys if key != 'date']
+        by_date = 'date' in keys
+        if by_date and keys[-1] != 'date':
+            raise ValueError("date must be the last grouping key")
+
+        # 선택한 시계열을 그룹 번호로 묶고 (그룹[, 날짜]) 셀별로 합산
+        sizes = [len(self.index.categories[dim]) for dim in dims]
+        groups = np.ravel_multi_index(
+            [self.index.series_codes[dim][self._series] for dim in dims], sizes
+        ) if dims else np.zeros(len(self._series), dtype=np.int64)
+        n_groups = int(np.prod(sizes))
+        rows = self._values('rows', by_date)
+        users = self._values('users', by_date)
+        n_days = rows.shape[1] if by_date else 1
+        cells = (groups[:, np.newaxis] * n_days + np.arange(n_days)).ravel()
+        present = np.bincount(cells, weights=rows.ravel(), minlength=n_groups * n_days) > 0
+        totals = np.bincount(cells, weights=users.ravel(), minlength=n_groups * n_days)
+
+        cell_ids = np.flatnonzero(present)
+        levels = []
+        if dims:
+            group_codes = np.unravel_index(cell_ids // n_days, sizes)
+            levels = [
+                pd.Categorical.from_codes(codes, categories=self.index.categories[dim])
+                for dim, codes in zip(dims, group_codes)
+            ]
+        if by_date:
+            lo = self._bounds[0]
+            levels.append(self.index.dates[lo + cell_ids % n_days])
+        if len(levels) == 1:
+            index = pd.Index(levels[0], name=keys[0])
+        else:
+            index = pd.MultiIndex.from_arrays(levels, names=keys).remove_unused_levels()
+        return pd.Series(totals[cell_ids].astype(np.int64), index=index, name='users')
+
+    @cached_property
+    def daily_users(self):
+        """일별 전체 사용자/신규 사용자 수 (date, users, new_users)"""
+        lo, _ = self._bounds
+        present = self._values('rows', True).sum(axis=0) > 0
+        days = np.flatnonzero(present)
+        return pd.DataFrame({
+            'date': self.index.dates[lo + days],
+            'users': self._values('users', True).sum(axis=0)[days],
+            'new_users': self._values('new_users', True).sum(axis=0)[days]
+        })
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import altair as alt
+import pandas as pd
+
+from profiling import mark_cache_miss
+
+# 결과 캐시 메모리 한도 (환경 변수로 변경 가능)
+DEFAULT_MAX_BYTES = int(os.environ.get('GA4_RESULT_CACHE_MB', 256)) * 1024 ** 2
+
+# 차트 객체의 데이터 외 스펙 크기 추정치
+CHART_OVERHEAD_BYTES = 4096
+
+
+def estimate_size(obj):
+    """캐시에 보관할 결과 객체의 메모리 사용량을 대략 추정합니다."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    if isinstance(obj, alt.TopLevelMixin):
+        # Altair 차트: 각 레이어에 들어 있는 데이터프레임 크기 + 스펙 크기
+        size = CHART_OVERHEAD_BYTES
+        data = getattr(obj, 'data', None)
+        if isinstance(data, pd.DataFrame):
+            size += estimate_size(data)
+        for layer in getattr(obj, 'layer', None) or []:
+            size += estimate_size(layer)
+        return size
+    return sys.getsizeof(obj)
+
+
+class ResultCache:
+    """필터 상태를 키로 섹션 결과(표, 차트)를 보관하는 메모리 한도 LRU 캐시입니다.
+
+    여러 세션이 같은 인스턴스를 공유하므로 모든 변경은 잠금 안에서 수행합니다.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """키에 해당하는 결과를 반환하고, 없으면 계산해서 저장합니다."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        mark_cache_miss()
+
+        # 계산은 잠금 밖에서 수행해 다른 세션을 막지 않음
+        value = compute()
+        size = estimate_size(value)
+
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.current_bytes += size
+                self._evict()
+        return value
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+
+    def stats(self):
+        """캐시 적중/미스 횟수와 사용량을 반환합니다."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
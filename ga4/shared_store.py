@@ -0,0 +1,124 @@
+"""메모리 매핑으로 공유하는 데이터셋 저장소.
+
+누적 데이터셋의 큐브와 날짜 누적합 인덱스를 압축하지 않은 Arrow IPC 파일로 한 번만
+저장하고, 모든 세션과 서버 프로세스(배치 리포트 워커 포함)는 이 파일을 읽기 전용으로
+메모리 매핑해 복사 없이 사용합니다. 매핑한 페이지는 운영체제 페이지 캐시에 한 벌만
+올라가므로 세션이나 프로세스가 늘어도 데이터셋 메모리는 늘지 않고, 세션별 메모리는
+필터 상태와 작은 결과 표만 남습니다.
+"""
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from cube import DIMENSIONS, cache_key
+from dataset_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DatasetCache
+from incremental import IncrementalDataset
+from prefix_index import PrefixSumIndex
+
+# 매핑용 데이터셋 파일을 둘 폴더 (기본값은 디스크 캐시 폴더 아래)
+SHARED_DIR = os.environ.get('GA4_SHARED_DIR', os.path.join(DEFAULT_CACHE_DIR, 'shared'))
+
+# 누적합 인덱스 파일 이름의 접미사 ({키}.prefix.arrow)
+PREFIX_SUFFIX = '.prefix'
+
+
+def map_table(path):
+    """Arrow IPC 파일을 메모리 매핑해 테이블로 엽니다 (버퍼는 파일 페이지를 그대로 가리킴)."""
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def write_table(table, path):
+    """테이블을 매핑할 수 있도록 압축하지 않은 Arrow IPC 파일로 저장합니다."""
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+class SharedDatasetStore(DatasetCache):
+    """누적 데이터셋 식별자를 키로 하는 메모리 매핑용 Arrow IPC 저장소입니다.
+
+    큐브 파일의 스키마 메타데이터에 manifest와 누적합 인덱스 저장 여부를 함께 기록하므로
+    다른 프로세스가 만든 데이터셋도 원본 파일을 다시 읽지 않고 열 수 있습니다.
+    with_prefix_index가 참이면 저장할 때 누적합 인덱스도 계산해 별도 파일로 둡니다.
+    이미 매핑한 파일은 용량 한도로 삭제되어도 매핑을 닫을 때까지 계속 읽을 수 있습니다.
+    """
+
+    suffix = '.arrow'
+
+    def __init__(self, root=SHARED_DIR, max_bytes=DEFAULT_MAX_BYTES, with_prefix_index=True):
+        super().__init__(root, max_bytes)
+        self.with_prefix_index = with_prefix_index
+
+    def _read(self, path):
+        return map_table(path)
+
+    def _write(self, table, path):
+        write_table(table, path)
+
+    def share(self, dataset):
+        """데이터셋을 저장소에 올리고(이미 있으면 생략) 매핑한 스냅샷을 반환합니다.
+
+        매핑한 스냅샷은 큐브와 누적합 인덱스만 파일에서 가져오고, 이어 붙이기 기준값과
+        이미 계산한 파생 값은 dataset의 것을 이어받아 새 행만 반영하는 경로를 유지합니다.
+        """
+        key = cache_key(dataset.dataset_hash)
+        if not os.path.exists(self.path_for(key)):
+            self.publish(key, dataset)
+        shared = self.open(key)
+        return dataset if shared is None else dataset.remap(shared)
+
+    def publish(self, key, dataset):
+        """데이터셋의 큐브(와 누적합 인덱스)를 파일로 저장합니다. 큐브 파일은 마지막에 씁니다."""
+        prefix_state = 'unknown'
+        if self.with_prefix_index:
+            index = dataset.prefix_index
+            prefix_state = 'none'
+            if index is not None:
+                self.put(key + PREFIX_SUFFIX, index.to_arrow())
+                prefix_state = 'file'
+
+        table = pa.Table.from_pandas(dataset.cube, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'ga4_manifest'] = json.dumps(
+            [_encode_entry(entry) for entry in dataset.manifest], ensure_ascii=False
+        ).encode('utf-8')
+        metadata[b'ga4_prefix_index'] = prefix_state.encode('ascii')
+        self.put(key, table.replace_schema_metadata(metadata))
+
+    def open(self, key):
+        """저장된 데이터셋을 매핑해 스냅샷으로 엽니다. 없으면 None을 반환합니다."""
+        table = self.get(key)
+        if table is None:
+            return None
+        metadata = table.schema.metadata
+        # 숫자/날짜 컬럼과 범주 코드는 매핑한 버퍼를 그대로 쓰는 읽기 전용 배열이 됨
+        cube = table.to_pandas(split_blocks=True)
+        manifest = [_decode_entry(entry) for entry in json.loads(metadata[b'ga4_manifest'])]
+
+        derived = {}
+        prefix_state = metadata[b'ga4_prefix_index']
+        if prefix_state == b'none':
+            derived['prefix_index'] = None
+        elif prefix_state == b'file':
+            index_table = self.get(key + PREFIX_SUFFIX)
+            if index_table is not None:
+                categories = {col: cube[col].cat.categories for col in DIMENSIONS}
+                derived['prefix_index'] = PrefixSumIndex.from_arrow(index_table, categories)
+        return IncrementalDataset(cube, manifest, derived=derived)
+
+
+def _encode_entry(entry):
+    return {
+        name: value.isoformat() if isinstance(value, pd.Timestamp) else value
+        for name, value in entry.items()
+    }
+
+
+def _decode_entry(entry):
+    return {
+        name: pd.Timestamp(value) if name in ('start', 'end') and value is not None else value
+        for name, value in entry.items()
+    }
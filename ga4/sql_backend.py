@@ -0,0 +1,125 @@
+import os
+import threading
+from datetime import timedelta
+from functools import cached_property
+
+from aggregation import AggregationContext
+
+try:
+    import duckdb
+except ImportError:  # duckdb가 없으면 pandas 백엔드만 사용
+    duckdb = None
+
+# 집계 백엔드 선택 (pandas 또는 duckdb)
+QUERY_BACKEND = os.environ.get('GA4_QUERY_BACKEND', 'pandas')
+
+
+def is_available():
+    """DuckDB 백엔드를 사용할 수 있는지 확인합니다."""
+    return duckdb is not None
+
+
+def _source_relation(path):
+    """파일 확장자에 맞는 DuckDB 테이블 함수 표현식을 반환합니다."""
+    escaped = path.replace("'", "''")
+    if path.endswith('.csv'):
+        return f"read_csv('{escaped}', header=true, dateformat='%Y-%m-%d')"
+    return f"read_parquet('{escaped}')"
+
+
+class SharedConnection:
+    """프로세스에서 하나만 여는 DuckDB 연결입니다.
+
+    연결 객체는 스레드 간에 공유할 수 없으므로 스레드마다 커서(같은 데이터베이스를 쓰는
+    가벼운 연결)를 하나씩 만들어 재사용합니다. 스레드가 끝나면 커서도 함께 정리됩니다.
+    """
+
+    def __init__(self):
+        self.connection = duckdb.connect()
+        self._local = threading.local()
+
+    def cursor(self):
+        """현재 스레드의 커서"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self.connection.cursor()
+        return cursor
+
+    def close(self):
+        self.connection.close()
+
+
+_default_connection = None
+_default_lock = threading.Lock()
+
+
+def default_connection():
+    """connection을 주지 않은 컨텍스트가 함께 쓰는 프로세스 기본 연결을 반환합니다."""
+    global _default_connection
+    with _default_lock:
+        if _default_connection is None:
+            _default_connection = SharedConnection()
+        return _default_connection
+
+
+class SqlAggregationContext(AggregationContext):
+    """AggregationContext와 같은 집계를 DuckDB SQL로 계산합니다.
+
+    집계는 Parquet 변환본(또는 CSV) 파일을 직접 조회하며, 사이드바 필터는
+    WHERE 절로 전달되어 파일 스캔 단계에서 걸러지고 필요한 컬럼만 읽습니다.
+    그룹 합계와 일별 합계만 SQL로 바꾸고 나머지 조회는 AggregationContext를 그대로 사용하며,
+    결과는 차트에 필요한 작은 표만 pandas로 반환합니다. connection(SharedConnection)을
+    주지 않으면 프로세스 기본 연결을 사용합니다.
+    """
+
+    def __init__(self, path, spec=None, connection=None):
+        self.path = path
+        self.spec = spec
+        self.connection = connection or default_connection()
+
+    @property
+    def df(self):
+        raise AttributeError("SqlAggregationContext does not materialize filtered rows")
+
+    def _execute(self, sql, params):
+        return self.connection.cursor().execute(sql, params)
+
+    def _where(self):
+        """필터 상태를 WHERE 절과 바인딩 파라미터로 변환합니다."""
+        if self.spec is None:
+            return '', []
+        start, end = self.spec.date_range
+        clauses = ['date >= ?::TIMESTAMP', 'date < ?::TIMESTAMP']
+        params = [start.isoformat(), (end + timedelta(days=1)).isoformat()]
+        if self.spec.sources:
+            clauses.append(f"source_medium IN ({', '.join('?' for _ in self.spec.sources)})")
+            params.extend(self.spec.sources)
+        if self.spec.device is not None:
+            clauses.append('device_category = ?')
+            params.append(self.spec.device)
+        return 'WHERE ' + ' AND '.join(clauses), params
+
+    def _query(self, keys, measures=('users',)):
+        where, params = self._where()
+        key_list = ', '.join(keys)
+        sums = ', '.join(f'SUM({m})::BIGINT AS {m}' for m in measures)
+        sql = (
+            f"SELECT {key_list}, {sums} FROM {_source_relation(self.path)} "
+            f"{where} GROUP BY {key_list} ORDER BY {key_list}"
+        )
+        return self._execute(sql, params).df()
+
+    def _sum_users(self, keys):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return self._query(keys).set_index(keys)['users']
+
+    def count(self):
+        """필터 상태에 해당하는 행 수"""
+        where, params = self._where()
+        sql = f"SELECT COUNT(*) FROM {_source_relation(self.path)} {where}"
+        return self._execute(sql, params).fetchone()[0]
+
+    @cached_property
+    def daily_users(self):
+        """일별 전체 사용자/신규 사용자 수 (date, users, new_users)"""
+        return self._query(['date'], measures=('users', 'new_users'))
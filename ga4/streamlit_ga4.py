@@ -1,8 +1,34 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
 from datetime import datetime
 import io
+import math
+import os
+
+from aggregation import AggregationContext
+from analytics import (COMPARISON_MODES, MIN_CHANNEL_PAGEVIEWS, compare_funnel, compare_kpis,
+                       comparison_spec, compute_kpi_metrics, funnel_comparison_table, funnel_stats)
+from anomalies import Z_THRESHOLD
+from background import PROGRESS_POLL_SECONDS, IngestManager
+from catalog import SOURCE_PAGE_SIZE
+from chart_payload import prepare_outputs
+from charts import (create_event_analysis_charts, create_funnel_chart, create_purchase_trend_chart,
+                    create_users_chart)
+from cube import build_cube, cache_key, memory_report
+from dataset_cache import DatasetCache, content_hash
+from export import (EXPORT_FORMATS, FORMAT_LABELS, available_formats, export_bundle,
+                    export_file_name, export_table)
+from filter_index import FilterSpec
+from funnel import BREAKDOWN_DIMENSIONS, FUNNEL_STEPS, funnel_breakdown
+from incremental import WATCH_DIR, DatasetRegistry, scan_directory
+from ingest import (MALFORMED_RULES, REQUIRED_COLUMNS, STREAMING_THRESHOLD_BYTES, DateFormatError,
+                    SchemaError, file_size, malformed_key, read_cube)
+from prefix_index import PrefixAggregationContext
+from profiling import Profiler, mark_cache_miss, panel_enabled, render_panel
+from result_cache import ResultCache
+from shared_store import SharedDatasetStore
+from sql_backend import (QUERY_BACKEND, SharedConnection, SqlAggregationContext,
+                         is_available as sql_backend_available)
 
 # 페이지 설정
 st.set_page_config(
@@ -14,89 +40,92 @@ st.set_page_config(
 # 제목
 st.title('GA4 데이터 분석 대시보드 📊')
 
-def convert_df_to_csv(df):
-    """데이터프레임을 CSV 문자열로 변환합니다."""
-    return df.to_csv(index=False).encode('utf-8-sig')  # UTF-8 with BOM for Excel compatibility
-
-def create_download_button(data, file_name, button_text):
-    """다운로드 버튼을 생성합니다."""
-    csv = convert_df_to_csv(data)
-    st.download_button(
-        label=f"📥 {button_text}",
-        data=csv,
-        file_name=file_name,
-        mime='text/csv'
+# 이번 재실행의 단계별 성능 측정 (DASHBOARD_PROFILE_* 설정 또는 ?debug=1 일 때만 측정)
+profiler = Profiler('ga4', panel=panel_enabled())
+
+# 집계 백엔드 설정 (GA4_QUERY_BACKEND=duckdb 이면 파일을 직접 SQL로 조회)
+USE_SQL_BACKEND = QUERY_BACKEND == 'duckdb' and sql_backend_available()
+if QUERY_BACKEND == 'duckdb' and not USE_SQL_BACKEND:
+    st.warning("duckdb 패키지가 설치되어 있지 않아 pandas 백엔드로 집계합니다.")
+
+def show_chart(chart_spec, name):
+    """서버에서 최적화한 차트 스펙을 표시하고 전송량을 기록합니다."""
+    with profiler.stage(f"chart:{name}"):
+        st.vega_lite_chart(spec=chart_spec.spec, use_container_width=True)
+    st.session_state.setdefault('chart_payloads', {})[name] = (
+        chart_spec.raw_bytes, chart_spec.payload_bytes
     )
 
-def display_kpi_metrics(df):
-    """주요 KPI 지표를 계산하고 표시합니다."""
-    # 구매 전환 관련 데이터 계산
-    purchase_data = df[df['event_name'] == 'purchase']
-    total_purchases = purchase_data['users'].sum()
-    
-    # 최대 구매 발생일 계산
-    if not purchase_data.empty:
-        max_purchase_date = purchase_data.groupby('date')['users'].sum().idxmax()
-        max_purchase_count = purchase_data.groupby('date')['users'].sum().max()
-    else:
-        max_purchase_date = None
-        max_purchase_count = 0
-    
-    # 채널별 전환율 계산
-    channel_pageviews = df[df['event_name'] == 'page_view'].groupby('source_medium')['users'].sum()
-    channel_purchases = df[df['event_name'] == 'purchase'].groupby('source_medium')['users'].sum()
-    
-    # 전환율 계산을 위해 데이터프레임 생성
-    channel_conversion = pd.DataFrame({
-        'pageviews': channel_pageviews,
-        'purchases': channel_purchases
-    }).fillna(0)  # NaN 값을 0으로 채움
-    
-    # 전환율 계산
-    channel_conversion['conversion_rate'] = (
-        channel_conversion['purchases'] / channel_conversion['pageviews'] * 100
-    ).round(2)
-    
-    # 전환율이 가장 높은 채널 찾기 (0으로 나누기 방지)
-    channel_conversion = channel_conversion[channel_conversion['pageviews'] > 0]  # 페이지뷰가 0인 채널 제외
-    if not channel_conversion.empty:
-        best_channel_idx = channel_conversion['conversion_rate'].idxmax()
-        best_channel = {
-            'source_medium': best_channel_idx,
-            'conversion_rate': channel_conversion.loc[best_channel_idx, 'conversion_rate']
-        }
-    else:
-        best_channel = {
-            'source_medium': "데이터 없음",
-            'conversion_rate': 0
-        }
+def create_download_button(data, base_name, button_text, export_key):
+    """형식별 다운로드 버튼을 생성합니다. 파일은 버튼을 누를 때 만들어 결과 캐시에 보관합니다."""
+    result_cache = get_result_cache()
+    formats = available_formats()
+    
+    def export(fmt):
+        with profiler.stage(f"export:{fmt}", cached=True) as stage:
+            stage.rows = len(data)
+            return result_cache.get_or_compute(export_key + ('export', fmt), lambda: export_table(data, fmt))
+    
+    st.caption(f"📥 {button_text}")
+    for col, fmt in zip(st.columns(len(formats)), formats):
+        with col:
+            st.download_button(
+                label=FORMAT_LABELS[fmt],
+                data=lambda fmt=fmt: export(fmt),
+                file_name=export_file_name(base_name, fmt),
+                mime=EXPORT_FORMATS[fmt][1],
+                on_click='ignore'
+            )
+
+def display_kpi_metrics(kpis, changes=None, comparison_label=None):
+    """주요 KPI 지표를 표시합니다. changes(compare_kpis 결과)가 있으면 비교 기간 대비 변화를 함께 표시합니다."""
+    total_purchases = kpis['total_purchases']
+    best_channel = kpis['best_channel']
+    max_purchase_date = kpis['max_purchase_date']
+    max_purchase_count = kpis['max_purchase_count']
     
     # KPI 메트릭 표시
     st.markdown("### 📈 핵심 성과 지표")
+    if changes is not None:
+        st.caption(f"선택한 조건 기준, {comparison_label} 대비 변화")
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
+        purchases_delta = None
+        if changes is not None:
+            difference, rate = changes['total_purchases']
+            purchases_delta = f"{difference:+,}건" + ("" if pd.isna(rate) else f" ({rate:+.1f}%)")
         st.metric(
             label="총 전환 수",
             value=f"{total_purchases:,}",
+            delta=purchases_delta,
             help="총 purchase 이벤트 발생 횟수"
         )
     
     with col2:
+        rate_delta = f"{best_channel['conversion_rate']:.1f}%"
+        if changes is not None:
+            rate_delta += f" ({changes['best_channel_rate']:+.1f}%p)"
+        channel_help = f"방문자 대비 구매 전환율이 가장 높은 채널 (page_view 사용자 {MIN_CHANNEL_PAGEVIEWS:,}명 이상)"
+        if best_channel['below_threshold']:
+            channel_help += ". 기준을 넘는 채널이 없어 page_view 사용자가 있는 채널 중에서 골랐습니다."
         st.metric(
-            label="최고 전환율 채널",
+            label="최고 전환율 채널" + (" (방문 기준 미달)" if best_channel['below_threshold'] else ""),
             value=f"{best_channel['source_medium']}",
-            delta=f"{best_channel['conversion_rate']:.1f}%",
-            help="방문자 대비 구매 전환율이 가장 높은 채널"
+            delta=rate_delta,
+            help=channel_help
         )
     
     with col3:
         if max_purchase_date:
+            count_delta = f"{max_purchase_count:,}건"
+            if changes is not None:
+                count_delta += f" ({changes['max_purchase_count']:+,}건)"
             st.metric(
                 label="최대 구매 발생일",
                 value=max_purchase_date.strftime('%Y-%m-%d'),
-                delta=f"{max_purchase_count:,}건",
+                delta=count_delta,
                 help="하루 동안 가장 많은 구매가 발생한 날짜"
             )
         else:
@@ -108,530 +137,545 @@ def display_kpi_metrics(df):
     
     st.markdown("---")  # 구분선 추가
 
-# 데이터 로딩 함수
+@st.cache_resource
+def get_dataset_cache():
+    """프로세스 전체에서 공유하는 디스크 데이터셋 저장소를 반환합니다."""
+    return DatasetCache()
+
+def show_missing_columns_error(missing_columns):
+    """필수 컬럼 누락 안내를 표시하고 실행을 중단합니다."""
+    st.error(f"CSV 파일에 다음 필수 컬럼이 없습니다: {', '.join(missing_columns)}")
+    st.write("필요한 컬럼:")
+    for col in REQUIRED_COLUMNS:
+        st.write(f"- {col}")
+    st.stop()
+
+def show_date_format_error():
+    """날짜 형식 오류 안내를 표시하고 실행을 중단합니다."""
+    st.error("날짜 형식이 올바르지 않습니다. YYYY-MM-DD 형식인지 확인해주세요.")
+    st.stop()
+
+def show_malformed_rows(sources):
+    """수집할 때 제외한 형식 오류 행이 있는 파일마다 규칙별 행 수와 예시 행 번호를 표시합니다.
+
+    보고서를 하나라도 표시했으면 True를 반환합니다.
+    """
+    dataset_cache = get_dataset_cache()
+    result_cache = get_result_cache()
+    shown = False
+    for file_hash, (name, _) in sources.items():
+        report = result_cache.get_or_compute(
+            (file_hash, 'malformed'), lambda: dataset_cache.get(malformed_key(file_hash))
+        )
+        if report is None:
+            continue
+        shown = True
+        report = report[report['rows'] > 0]
+        st.warning(f"{name}: 형식이 잘못된 행을 집계에서 제외했습니다.")
+        with st.expander("제외한 행 보기"):
+            st.dataframe(pd.DataFrame({
+                '문제': report['rule'].map(MALFORMED_RULES),
+                '행 수': report['rows'],
+                '예시 행 번호': [', '.join(map(str, lines)) for lines in report['lines']]
+            }), hide_index=True)
+    return shown
+
+@st.cache_resource
+def get_sql_connection():
+    """세션 간에 공유하는 DuckDB 연결을 반환합니다 (스레드마다 커서를 재사용)."""
+    return SharedConnection()
+
+@st.cache_resource
+def get_result_cache():
+    """세션 간에 공유하는 필터 상태별 결과 캐시를 반환합니다."""
+    return ResultCache()
+
+@st.cache_resource
+def get_shared_store():
+    """세션과 서버 프로세스가 메모리 매핑으로 공유하는 데이터셋 저장소를 반환합니다."""
+    return SharedDatasetStore(with_prefix_index=not USE_SQL_BACKEND)
+
+@st.cache_resource
+def get_dataset_registry():
+    """세션 간에 공유하는 누적 데이터셋 스냅샷 보관소를 반환합니다 (큐브는 공유 저장소 파일을 매핑)."""
+    return DatasetRegistry(store=get_shared_store())
+
+def get_dataset_path(dataset):
+    """SQL 백엔드가 조회할 Parquet 파일 경로를 반환합니다 (삭제되었으면 다시 저장)."""
+    dataset_cache = get_dataset_cache()
+    dataset_key = cache_key(dataset.dataset_hash)
+    path = dataset_cache.path_for(dataset_key)
+    if not os.path.exists(path):
+        path = dataset_cache.put(dataset_key, dataset.cube)
+    return path
+
+def create_aggregation_context(dataset, filter_spec=None):
+    """설정된 백엔드(pandas 또는 duckdb)에 맞는 집계 컨텍스트를 생성합니다."""
+    if USE_SQL_BACKEND:
+        return SqlAggregationContext(get_dataset_path(dataset), filter_spec, get_sql_connection())
+    if dataset.prefix_index is not None:
+        # 날짜 범위와 비교 기간 합계를 누적합 조회로 계산 (큐브 행을 다시 훑지 않음)
+        return PrefixAggregationContext(dataset.prefix_index, filter_spec)
+    if filter_spec is None:
+        return AggregationContext(dataset.cube)
+    filter_index = dataset.filter_index
+    
+    def select():
+        with profiler.stage('filter') as stage:
+            df = filter_index.select(filter_spec)
+            stage.rows = len(df)
+        return df
+    return AggregationContext(select)
+
+def count_filtered_rows(dataset, ctx, filter_spec):
+    """필터 상태에 해당하는 큐브 행 수를 계산합니다."""
+    if USE_SQL_BACKEND or isinstance(ctx, PrefixAggregationContext):
+        return ctx.count()
+    return dataset.filter_index.count(filter_spec)
+
 @st.cache_data
-def load_data(uploaded_file):
-    """CSV 파일을 로드하고 기본적인 전처리를 수행합니다."""
-    df = pd.read_csv(uploaded_file)
-    
-    # 필수 컬럼 확인
-    required_columns = ['date', 'source_medium', 'sessions', 'users', 'new_users', 
-                       'device_category', 'event_name', 'step']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    
-    if missing_columns:
-        st.error(f"CSV 파일에 다음 필수 컬럼이 없습니다: {', '.join(missing_columns)}")
-        st.write("필요한 컬럼:")
-        for col in required_columns:
-            st.write(f"- {col}")
-        st.stop()
-    
-    # 날짜 컬럼 변환
+def hash_watched_file(path, size, mtime_ns):
+    """감시 폴더 파일의 내용 해시를 계산합니다. 크기나 수정 시각이 바뀔 때만 다시 읽습니다."""
+    with open(path, 'rb') as f:
+        return content_hash(f)
+
+def collect_sources(uploaded_files):
+    """감시 폴더의 파일(이름순)과 업로드한 파일(올린 순서)을 {해시: (이름, 파일)}로 모읍니다."""
+    sources = {}
+    for path in scan_directory(WATCH_DIR):
+        stat = os.stat(path)
+        file_hash = hash_watched_file(path, stat.st_size, stat.st_mtime_ns)
+        sources.setdefault(file_hash, (os.path.basename(path), path))
+    for uploaded_file in uploaded_files:
+        sources.setdefault(content_hash(uploaded_file), (uploaded_file.name, uploaded_file))
+    return sources
+
+@st.cache_resource
+def get_ingest_manager():
+    """세션 간에 공유하는 백그라운드 수집 작업 관리자를 반환합니다."""
+    return IngestManager(get_dataset_cache())
+
+def start_background_ingest(sources):
+    """디스크 캐시에 없는 대용량 파일은 워커 프로세스에 집계를 맡기고, 진행 중인 작업 목록을 반환합니다.
+
+    워커가 처리하지 못한 파일은 오류를 안내하고 sources와 이 세션에서 제외합니다.
+    """
+    dataset_cache = get_dataset_cache()
+    ingest_manager = get_ingest_manager()
+    pending_jobs = []
+    failed_files = []
+    for file_hash, (name, source) in sources.items():
+        if os.path.exists(dataset_cache.path_for(cache_key(file_hash))):
+            ingest_manager.discard(file_hash)
+            continue
+        size = os.path.getsize(source) if isinstance(source, str) else file_size(source)
+        if size < STREAMING_THRESHOLD_BYTES:
+            continue
+        
+        job = ingest_manager.submit(file_hash, name, source)
+        if isinstance(job.error, SchemaError):
+            show_missing_columns_error(job.error.missing_columns)
+        elif isinstance(job.error, DateFormatError):
+            show_date_format_error()
+        elif job.error is not None:
+            # 예상하지 못한 오류는 이 파일만 제외하고 나머지 파일로 계속 진행 (같은 파일을 다시 읽지 않음)
+            st.error(f"{job.name}: 파일을 처리하지 못해 제외했습니다. ({job.error})")
+            ingest_manager.discard(file_hash)
+            failed_files.append(file_hash)
+        if job.state in ('queued', 'running'):
+            pending_jobs.append(job)
+    for file_hash in failed_files:
+        del sources[file_hash]
+    st.session_state.setdefault('failed_files', set()).update(failed_files)
+    return pending_jobs
+
+def cancel_ingest(job):
+    """수집 작업을 취소하고 이 세션에서는 해당 파일을 제외합니다."""
+    job.cancel()
+    get_ingest_manager().discard(job.file_hash)
+    st.session_state.setdefault('cancelled_files', set()).add(job.file_hash)
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def render_ingest_progress(jobs):
+    """백그라운드 수집 진행률과 부분 집계 기준 KPI를 표시합니다. 모두 끝나면 앱을 다시 실행합니다."""
+    if all(job.state not in ('queued', 'running') for job in jobs):
+        st.rerun()
+    
+    for job in jobs:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            if job.state == 'queued':
+                st.progress(0.0, text=f"{job.name}: 다른 파일 처리가 끝나기를 기다리는 중입니다...")
+            else:
+                fraction = job.progress()
+                st.progress(fraction, text=f"{job.name}: 대용량 파일을 나누어 읽는 중입니다... {fraction:.0%}")
+        with col2:
+            st.button("취소", key=f"cancel_{job.file_hash}", on_click=cancel_ingest, args=(job,))
+    
+    # 먼저 읽힌 부분만으로 계산한 KPI (완료되면 전체 기준으로 바뀜)
+    partial_cubes = [cube for cube in (job.partial_cube() for job in jobs) if cube is not None]
+    if partial_cubes:
+        partial = partial_cubes[0] if len(partial_cubes) == 1 else build_cube(pd.concat(partial_cubes))
+        display_kpi_metrics(compute_kpi_metrics(AggregationContext(partial)))
+        st.caption("지금까지 읽은 데이터 기준의 중간 집계입니다.")
+
+def load_dataset(sources):
+    """파일들을 누적 데이터셋으로 합칩니다. 이미 반영한 파일은 다시 읽지 않습니다."""
+    def load_cube(file_hash):
+        source = sources[file_hash][1]
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                return load_data(file_hash, f)
+        return load_data(file_hash, source)
+
+    files = [(file_hash, name) for file_hash, (name, _) in sources.items()]
+    dataset = get_dataset_registry().get(files, load_cube)
+    # 차원 목록과 날짜 누적합 인덱스는 로드할 때 스냅샷에 만들어 두어 재실행 때는 조회만 수행
+    # (SQL 백엔드는 파일을 직접 조회하므로 누적합 인덱스가 필요 없음)
+    if USE_SQL_BACKEND:
+        return dataset.warm('catalog')
+    return dataset.warm('catalog', 'prefix_index')
+
+# 데이터 로딩 함수
+def load_data(file_hash, uploaded_file):
+    """CSV 파일 하나를 로드하고 (날짜, 소스/매체, 기기, 이벤트) 롤업 큐브로 변환합니다.
+
+    변환된 큐브는 파일 해시를 키로 디스크 저장소에 Parquet으로 보관되어
+    다른 세션이나 재시작 이후에는 CSV를 다시 파싱하지 않습니다. 메모리에는
+    파일별 큐브 대신 누적 데이터셋(get_dataset_registry)만 보관합니다.
+    파일 오류는 SchemaError/DateFormatError로 전달되어 호출한 쪽에서 안내하고,
+    제외한 형식 오류 행의 보고서는 큐브와 함께 저장해 show_malformed_rows가 표시합니다.
+    """
+    dataset_cache = get_dataset_cache()
+    dataset_key = cache_key(file_hash)
+    df = dataset_cache.get(dataset_key)
+    if df is not None:
+        return df
+    mark_cache_miss()
+    
+    # 대용량 파일은 청크 단위로 읽으면서 진행률 표시
+    progress_text = "대용량 파일을 나누어 읽는 중입니다..."
+    progress_bar = st.empty()
     try:
-        df['date'] = pd.to_datetime(df['date'])
-    except Exception as e:
-        st.error("날짜 형식이 올바르지 않습니다. YYYY-MM-DD 형식인지 확인해주세요.")
-        st.stop()
+        df = read_cube(
+            uploaded_file,
+            on_progress=lambda fraction: progress_bar.progress(
+                fraction, text=f"{progress_text} {fraction:.0%}"
+            ),
+            on_malformed=lambda report: dataset_cache.put(malformed_key(file_hash), report)
+        )
+    finally:
+        progress_bar.empty()
     
+    dataset_cache.put(dataset_key, df)
     return df
 
-# 퍼널 단계 정의
-FUNNEL_STEPS = ['page_view', 'login', 'view_item', 'add_to_cart', 'begin_checkout', 'purchase']
-
-def create_funnel_chart(filtered_df):
-    """퍼널 차트를 생성합니다."""
-    # 기본 퍼널 데이터 계산
-    funnel_data = []
-    prev_users = None
-    prev_step = None
+def display_event_analysis(selected_event, source_chart, source_total, device_chart):
+    """이벤트 분석 차트들을 두 열로 표시합니다."""
+    # 두 열 레이아웃 생성
+    col1, col2 = st.columns(2)
     
-    for step in FUNNEL_STEPS:
-        step_users = filtered_df[filtered_df['event_name'] == step]['users'].sum()
-        conversion_from_start = (step_users / filtered_df[filtered_df['event_name'] == FUNNEL_STEPS[0]]['users'].sum() * 100).round(1)
-        
-        # 이전 단계 대비 전환율 계산
-        step_to_step_rate = None
-        if prev_users is not None and prev_users > 0:
-            step_to_step_rate = (step_users / prev_users * 100).round(1)
-        
-        # 통합된 메트릭 라벨 생성 (2줄로 구성)
-        main_metrics = f"{step_users:,.0f}명 (전체 대비 {conversion_from_start:.1f}%)"
-        step_conversion = f"이전 단계 전환율: {step_to_step_rate:.1f}%" if step_to_step_rate is not None else ""
+    with col1:
+        st.subheader(f"{selected_event} 이벤트의 소스/매체 분포")
         
-        funnel_data.append({
-            'step': step,
-            'users': step_users,
-            'conversion_from_start': conversion_from_start,
-            'step_to_step_rate': step_to_step_rate,
-            'main_metrics': main_metrics,
-            'step_conversion': step_conversion
-        })
+        # 차트 표시
+        show_chart(source_chart, 'event_source')
         
-        prev_users = step_users
-        prev_step = step
-    
-    funnel_df = pd.DataFrame(funnel_data)
-    
-    # 기본 막대 차트
-    bars = alt.Chart(funnel_df).mark_bar().encode(
-        y=alt.Y('step:N', 
-                sort=FUNNEL_STEPS,
-                title='퍼널 단계'),
-        x=alt.X('users:Q',
-                title='사용자 수'),
-        tooltip=[
-            alt.Tooltip('step:N', title='단계'),
-            alt.Tooltip('users:Q', title='사용자 수', format=','),
-            alt.Tooltip('conversion_from_start:Q', title='전체 전환율', format='.1f'),
-            alt.Tooltip('step_to_step_rate:Q', title='이전 단계 대비 전환율', format='.1f')
-        ]
-    )
-    
-    # 주요 메트릭 텍스트 (사용자 수 + 전체 전환율)
-    main_metrics_text = alt.Chart(funnel_df).mark_text(
-        align='left',
-        baseline='middle',
-        dx=5,  # 막대 끝에서 약간 띄움
-        fontSize=11,
-        fontWeight='bold'  # 텍스트를 진하게 표시
-    ).encode(
-        y=alt.Y('step:N', sort=FUNNEL_STEPS),
-        x='users:Q',
-        text='main_metrics'
-    )
-    
-    # 이전 단계 전환율 텍스트 (두 번째 줄)
-    conversion_text = alt.Chart(funnel_df[funnel_df['step_to_step_rate'].notna()]).mark_text(
-        align='left',
-        baseline='middle',
-        dx=5,  # 막대 끝에서 약간 띄움
-        dy=12,  # 첫 번째 텍스트보다 아래에 배치
-        fontSize=10,
-        color='#666666'  # 진한 회색으로 설정
-    ).encode(
-        y=alt.Y('step:N', sort=FUNNEL_STEPS),
-        x='users:Q',
-        text='step_conversion'
-    )
-    
-    # 차트 결합
-    final_chart = (bars + main_metrics_text + conversion_text).properties(
-        width=800,  # 너비 증가하여 긴 텍스트 수용
-        height=min(len(funnel_df) * 70, 500)  # 각 단계별 높이 증가
-    ).configure_axis(
-        labelFontSize=12,
-        titleFontSize=13
-    ).configure_view(
-        strokeWidth=0
-    )
-    
-    # 데이터 다운로드를 위한 DataFrame 생성
-    download_df = pd.DataFrame({
-        '단계': funnel_df['step'],
-        '사용자 수': funnel_df['users'],
-        '전체 대비 전환율(%)': funnel_df['conversion_from_start'],
-        '이전 단계 대비 전환율(%)': funnel_df['step_to_step_rate']
-    })
-    
-    # 다운로드 버튼 생성
-    create_download_button(
-        download_df,
-        '퍼널_분석_데이터.csv',
-        '퍼널 분석 데이터 다운로드'
-    )
-    
-    return final_chart
-
-def create_users_chart(filtered_df):
-    """신규/기존 사용자 차트를 생성합니다."""
-    # 일별 사용자 집계
-    users_df = filtered_df.groupby('date').agg({
-        'users': 'sum',
-        'new_users': 'sum'
-    }).reset_index()
-    
-    users_df['returning_users'] = users_df['users'] - users_df['new_users']
-    users_df['new_users_ratio'] = (users_df['new_users'] / users_df['users'] * 100).round(1)
-    
-    # 신규 사용자 비율의 통계값 계산
-    ratio_mean = users_df['new_users_ratio'].mean()
-    ratio_std = users_df['new_users_ratio'].std()
-    users_df['is_significant'] = abs(users_df['new_users_ratio'] - ratio_mean) > (1.5 * ratio_std)
-    users_df['significant_label'] = users_df.apply(
-        lambda x: f"신규 유입 급증 ({x['new_users_ratio']:.1f}%)" if x['is_significant'] else "", 
-        axis=1
-    )
-    
-    # 1. 누적 막대 차트 데이터 준비
-    users_melted = pd.melt(
-        users_df,
-        id_vars=['date'],
-        value_vars=['new_users', 'returning_users'],
-        var_name='user_type',
-        value_name='count'
-    )
-    users_melted['user_type'] = users_melted['user_type'].map({
-        'new_users': '신규 사용자',
-        'returning_users': '기존 사용자'
-    })
-    
-    # 누적 막대 차트
-    bar_chart = alt.Chart(users_melted).mark_bar().encode(
-        x=alt.X('date:T', title='날짜'),
-        y=alt.Y('count:Q', title='사용자 수'),
-        color=alt.Color('user_type:N', 
-                       scale=alt.Scale(domain=['신규 사용자', '기존 사용자'],
-                                     range=['#1f77b4', '#ff7f0e']),
-                       title='사용자 유형'),
-        tooltip=[
-            alt.Tooltip('date:T', title='날짜'),
-            alt.Tooltip('user_type:N', title='유형'),
-            alt.Tooltip('count:Q', title='사용자 수', format=',')
-        ]
-    ).properties(
-        title='일별 신규/기존 사용자 수',
-        height=300
-    )
-    
-    # 2. 신규 사용자 비율 라인 차트
-    line_base = alt.Chart(users_df).encode(
-        x=alt.X('date:T', title='날짜')
-    )
+        # 총계 표시
+        st.markdown(f"<h4 style='text-align: center; color: #1f77b4;'>총 {source_total:,}명</h4>", unsafe_allow_html=True)
     
-    # 기준선 (평균)
-    mean_line = line_base.mark_rule(
-        strokeDash=[4, 4],
-        stroke='gray',
-        opacity=0.5
-    ).encode(
-        y=alt.Y(
-            datum=ratio_mean,
-            title='신규 사용자 비율 (%)'
+    with col2:
+        st.subheader(f"{selected_event} 이벤트의 기기유형 분포")
+        show_chart(device_chart, 'event_device')
+
+# 섹션 결과 조회 (화면과 전체 내보내기가 같은 캐시 항목을 사용)
+def get_funnel_outputs(ctx, section_key, funnel_steps):
+    """퍼널 섹션의 캐시 키와 (차트, 데이터 표)를 반환합니다."""
+    key = section_key + ('funnel', tuple(funnel_steps))
+    with profiler.stage('funnel', cached=True):
+        outputs = get_result_cache().get_or_compute(
+            key, lambda: prepare_outputs(create_funnel_chart(ctx, funnel_steps))
         )
-    )
-    
-    # 비율 라인
-    ratio_line = line_base.mark_line(
-        color='red'
-    ).encode(
-        y=alt.Y('new_users_ratio:Q',
-                title='신규 사용자 비율 (%)',
-                scale=alt.Scale(zero=False)),
-        tooltip=[
-            alt.Tooltip('date:T', title='날짜'),
-            alt.Tooltip('new_users_ratio:Q', title='신규 사용자 비율', format='.1f')
-        ]
-    )
-    
-    # 유의한 포인트 표시
-    significant_points = line_base.mark_point(
-        color='red',
-        size=100
-    ).encode(
-        y=alt.Y('new_users_ratio:Q'),
-        opacity=alt.condition(
-            'datum.is_significant == true',
-            alt.value(1),
-            alt.value(0)
+    return key, outputs
+
+def get_users_outputs(ctx, section_key):
+    """신규/기존 사용자 섹션의 캐시 키와 (막대 차트, 비율 차트, 데이터 표)를 반환합니다."""
+    key = section_key + ('users',)
+    with profiler.stage('users', cached=True):
+        outputs = get_result_cache().get_or_compute(
+            key, lambda: prepare_outputs(create_users_chart(ctx))
         )
-    )
-    
-    # 유의한 포인트 레이블
-    text_labels = line_base.mark_text(
-        align='left',
-        baseline='bottom',
-        dx=5,
-        dy=-5,
-        fontSize=11
-    ).encode(
-        y=alt.Y('new_users_ratio:Q'),
-        text='significant_label',
-        opacity=alt.condition(
-            'datum.is_significant == true',
-            alt.value(1),
-            alt.value(0)
+    return key, outputs
+
+def get_purchase_outputs(ctx, section_key):
+    """구매 추이 섹션의 캐시 키와 (차트, 데이터 표)를 반환합니다."""
+    key = section_key + ('purchase_trend',)
+    with profiler.stage('purchase_trend', cached=True):
+        outputs = get_result_cache().get_or_compute(
+            key, lambda: prepare_outputs(create_purchase_trend_chart(ctx))
         )
+    return key, outputs
+
+def build_export_bundle(ctx, section_key, funnel_steps):
+    """모든 섹션의 데이터 표를 CSV zip 하나로 묶습니다."""
+    tables = {}
+    if len(funnel_steps) >= 2:
+        _, (_, tables['퍼널_분석_데이터']) = get_funnel_outputs(ctx, section_key, funnel_steps)
+    _, (_, _, tables['사용자_유형_분석_데이터']) = get_users_outputs(ctx, section_key)
+    _, (_, purchase_download_df) = get_purchase_outputs(ctx, section_key)
+    if purchase_download_df is not None:
+        tables['구매_추이_데이터'] = purchase_download_df
+    with profiler.stage('export:zip') as stage:
+        stage.rows = sum(len(table) for table in tables.values())
+        return export_bundle(tables)
+
+# 섹션별 렌더링 (각 섹션은 fragment로 분리되어 자기 위젯이 바뀔 때 해당 섹션만 다시 실행)
+@st.fragment
+def render_funnel_section(ctx, section_key, event_options, comparison=None):
+    """퍼널 분석 섹션을 표시합니다. comparison은 (비교 기간 이름, 집계 컨텍스트, 섹션 키)입니다."""
+    result_cache = get_result_cache()
+    funnel_steps = st.multiselect(
+        "퍼널 단계를 순서대로 선택하세요",
+        options=event_options,
+        default=[step for step in FUNNEL_STEPS if step in event_options],
+        key="funnel_steps"
     )
     
-    ratio_chart = (ratio_line + mean_line + significant_points + text_labels).properties(
-        title=f'신규 사용자 비율 추이 (평균: {ratio_mean:.1f}%)',
-        height=300
-    )
-    
-    # 데이터 다운로드를 위한 DataFrame 생성
-    download_df = pd.DataFrame({
-        '날짜': users_df['date'],
-        '전체 사용자': users_df['users'],
-        '신규 사용자': users_df['new_users'],
-        '재방문 사용자': users_df['returning_users'],
-        '신규 사용자 비율(%)': users_df['new_users_ratio']
-    })
+    if len(funnel_steps) < 2:
+        st.info("퍼널 분석을 위해 두 개 이상의 단계를 선택해 주세요.")
+        return
     
-    # 다운로드 버튼 생성
+    funnel_key, (funnel_chart, funnel_download_df) = get_funnel_outputs(ctx, section_key, funnel_steps)
     create_download_button(
-        download_df,
-        '사용자_유형_분석_데이터.csv',
-        '사용자 유형 분석 데이터 다운로드'
+        funnel_download_df,
+        '퍼널_분석_데이터',
+        '퍼널 분석 데이터 다운로드',
+        funnel_key
     )
-    
-    return bar_chart, ratio_chart
-
-def create_purchase_trend_chart(filtered_df):
-    """구매 추이 차트를 생성합니다."""
-    # 구매 이벤트 데이터 집계
-    purchase_df = filtered_df[filtered_df['event_name'] == 'purchase'].groupby('date')['users'].sum().reset_index()
-    
-    if len(purchase_df) == 0:
-        return alt.Chart().mark_text().encode(
-            text=alt.value('구매 데이터가 없습니다.')
-        ).properties(
-            width=600,
-            height=300
+    show_chart(funnel_chart, 'funnel')
+    
+    # 단계별 비교 기간 대비 변화 (두 기간 모두 이벤트별 합계만 사용)
+    if comparison is not None:
+        comparison_label, compare_ctx, compare_key = comparison
+        with profiler.stage('funnel_comparison', cached=True):
+            comparison_df = result_cache.get_or_compute(
+                section_key + ('funnel_comparison', compare_key, tuple(funnel_steps)),
+                lambda: funnel_comparison_table(
+                    compare_funnel(funnel_stats(ctx, funnel_steps), funnel_stats(compare_ctx, funnel_steps))
+                )
+            )
+        st.markdown(f"**{comparison_label} 대비 단계별 변화**")
+        st.dataframe(
+            comparison_df.style.format({
+                '사용자 수': '{:,.0f}',
+                '비교 기간 사용자 수': '{:,.0f}',
+                '사용자 변화율(%)': '{:+.1f}%',
+                '전체 대비 전환율(%)': '{:.1f}%',
+                '전체 대비 전환율 변화(%p)': '{:+.1f}',
+                '이전 단계 대비 전환율(%)': '{:.1f}%',
+                '이전 단계 대비 전환율 변화(%p)': '{:+.1f}'
+            }, na_rep='-'),
+            hide_index=True,
+            use_container_width=True
         )
     
-    # 최대값 찾기
-    max_point = purchase_df.loc[purchase_df['users'].idxmax()]
-    max_date_str = max_point['date'].strftime('%Y-%m-%d')
-    max_users = int(max_point['users'])
-    
-    max_df = pd.DataFrame([{
-        'date': max_point['date'],
-        'users': max_users
-    }])
-    
-    # 기본 라인 차트
-    base = alt.Chart(purchase_df).encode(
-        x=alt.X('date:T',
-                title='날짜',
-                axis=alt.Axis(
-                    format='%Y-%m-%d',
-                    labelAngle=0,  # 날짜 라벨을 수평으로
-                    labelOverlap=False,  # 라벨 겹침 방지
-                    labelPadding=10,  # 라벨 여백 추가
-                    tickCount=5,  # 표시할 틱 개수 조정
-                    titlePadding=20  # 축 제목 여백
-                )),
-        y=alt.Y('users:Q',
-                title='구매 사용자 수',
-                axis=alt.Axis(
-                    labelPadding=10,  # 라벨 여백 추가
-                    titlePadding=20,  # 제목 여백 추가
-                    offset=10  # 축과 차트 사이 여백
-                )),
-        tooltip=[
-            alt.Tooltip('date:T', title='날짜', format='%Y-%m-%d'),
-            alt.Tooltip('users:Q', title='구매 사용자 수', format=',')
-        ]
-    ).properties(
-        width=600,
-        height=400  # 높이 증가
-    )
-    
-    # 라인
-    line = base.mark_line()
-    
-    # 일반 포인트
-    points = base.mark_circle(size=60)
-    
-    # 최대값 포인트 강조
-    max_point = alt.Chart(max_df).mark_circle(
-        color='red',
-        size=200,
-        opacity=1
-    ).encode(
-        x=alt.X('date:T'),
-        y=alt.Y('users:Q'),
-        tooltip=[
-            alt.Tooltip('date:T', title='최다 구매 발생일', format='%Y-%m-%d'),
-            alt.Tooltip('users:Q', title='구매 사용자 수', format=',')
-        ]
-    )
-    
-    # 최대값 레이블 추가
-    max_label = alt.Chart(max_df).mark_text(
-        align='left',
-        baseline='bottom',
-        dx=5,
-        dy=-10,
-        fontSize=11,
-        fontWeight='bold'
-    ).encode(
-        x='date:T',
-        y='users:Q',
-        text=alt.value(f"{max_users:,}")
-    )
-    
-    # 차트 결합
-    final_chart = (line + points + max_point + max_label).properties(
-        title={
-            "text": ["일별 구매 사용자 수 추이", f"최다 구매일: {max_date_str} ({max_users:,}명)"],
-            "subtitle": [""],  # 부제목을 별도 라인으로 분리
-            "align": "left",
-            "anchor": "start",
-            "fontSize": 16,
-            "dy": 20,  # 제목 위치 조정
-            "offset": 20  # 제목과 차트 사이 여백
-        }
-    ).configure_view(
-        strokeWidth=0  # 테두리 제거
-    ).configure_axis(
-        labelFontSize=11,
-        titleFontSize=12,
-        grid=True  # 그리드 추가
-    )
-    
-    # 데이터 다운로드를 위한 DataFrame 생성
-    download_df = pd.DataFrame({
-        '날짜': purchase_df['date'],
-        '구매 사용자 수': purchase_df['users']
-    })
-    
-    # 다운로드 버튼 생성
+    # 채널/기기별 퍼널 비교 (세그먼트 × 단계 행렬, 펼쳤을 때만 계산)
+    breakdown_expander = st.expander("세그먼트별 퍼널 비교", on_change="rerun", key="breakdown_expander")
+    with breakdown_expander:
+        if not breakdown_expander.open:
+            return
+        breakdown_labels = {'source_medium': '소스/매체', 'device_category': '기기 유형'}
+        breakdown_dimension = st.radio(
+            "비교 기준",
+            options=BREAKDOWN_DIMENSIONS,
+            format_func=breakdown_labels.get,
+            horizontal=True
+        )
+        with profiler.stage('funnel_breakdown', cached=True):
+            breakdown = result_cache.get_or_compute(
+                section_key + ('funnel_breakdown', breakdown_dimension, tuple(funnel_steps)),
+                lambda: funnel_breakdown(ctx.segment_event_users(breakdown_dimension), funnel_steps)
+            )
+        st.dataframe(
+            breakdown['conversion_from_start'].rename_axis(
+                index=breakdown_labels[breakdown_dimension], columns=None
+            ).style.format('{:.1f}%', na_rep='-'),
+            use_container_width=True
+        )
+        st.caption("각 단계의 첫 단계 대비 전환율(%)입니다.")
+
+@st.fragment
+def render_users_section(ctx, section_key):
+    """신규/기존 사용자 분석 섹션을 표시합니다."""
+    users_key, (bar_chart, ratio_chart, users_download_df) = get_users_outputs(ctx, section_key)
     create_download_button(
-        download_df,
-        '구매_추이_데이터.csv',
-        '구매 추이 데이터 다운로드'
+        users_download_df,
+        '사용자_유형_분석_데이터',
+        '사용자 유형 분석 데이터 다운로드',
+        users_key
     )
     
-    return final_chart
-
-def create_event_analysis_charts(filtered_df, selected_event):
-    """선택된 이벤트에 대한 분석 차트들을 생성합니다."""
-    event_df = filtered_df[filtered_df['event_name'] == selected_event]
-    
-    # 두 열 레이아웃 생성
     col1, col2 = st.columns(2)
-    
     with col1:
-        st.subheader(f"{selected_event} 이벤트의 소스/매체 분포")
-        
-        # 소스/매체 분포 데이터 준비 (전체 데이터 사용)
-        source_dist = event_df.groupby('source_medium')['users'].sum().reset_index()
-        total_users = source_dist['users'].sum()
-        source_dist['percentage'] = (source_dist['users'] / total_users * 100).round(1)
-        # 퍼센트 기호를 포함한 텍스트 컬럼 추가
-        source_dist['percentage_label'] = source_dist['percentage'].apply(lambda x: f"{x:.1f}%")
-        
-        # 수평 막대 차트 생성
-        bars = alt.Chart(source_dist).mark_bar().encode(
-            y=alt.Y('source_medium:N',
-                   sort=alt.EncodingSortField(field='users', op='sum', order='descending'),
-                   title='소스/매체'),
-            x=alt.X('users:Q', 
-                   title='사용자 수'),
-            tooltip=[
-                alt.Tooltip('source_medium:N', title='소스/매체'),
-                alt.Tooltip('users:Q', title='사용자 수', format=','),
-                alt.Tooltip('percentage:Q', title='비율', format='.1f')
-            ]
-        )
-        
-        # 비율(%) 텍스트 레이블 추가
-        text = alt.Chart(source_dist).mark_text(
-            align='left',
-            baseline='middle',
-            dx=5,  # 막대 끝에서 약간 띄워서 표시
-            fontSize=11
-        ).encode(
-            y=alt.Y('source_medium:N',
-                   sort=alt.EncodingSortField(field='users', op='sum', order='descending')),
-            x='users:Q',
-            text='percentage_label'  # 미리 포맷팅된 텍스트 사용
-        )
-        
-        # 차트 결합
-        source_chart = (bars + text).properties(
-            # 전체 소스/매체를 표시할 수 있도록 충분한 높이 확보
-            height=min(len(source_dist) * 50, 800)  # 각 막대의 높이를 50px로 증가하고 최대 800px로 확장
-        ).configure_axis(
-            labelFontSize=11,  # 축 레이블 폰트 크기
-            titleFontSize=12   # 축 제목 폰트 크기
+        show_chart(bar_chart, 'users_bar')
+    with col2:
+        show_chart(ratio_chart, 'users_ratio')
+
+@st.fragment
+def render_purchase_section(ctx, section_key):
+    """구매 전환 집중 날짜 섹션을 표시합니다."""
+    purchase_key, (purchase_chart, purchase_download_df) = get_purchase_outputs(ctx, section_key)
+    if purchase_download_df is not None:
+        create_download_button(
+            purchase_download_df,
+            '구매_추이_데이터',
+            '구매 추이 데이터 다운로드',
+            purchase_key
         )
-        
-        # 차트 표시
-        st.altair_chart(source_chart, use_container_width=True)
-        
-        # 총계 표시
-        st.markdown(f"<h4 style='text-align: center; color: #1f77b4;'>총 {total_users:,}명</h4>", unsafe_allow_html=True)
+    show_chart(purchase_chart, 'purchase_trend')
+
+@st.fragment
+def render_event_section(ctx, section_key, dataset, filter_spec):
+    """행동 탐색 섹션을 표시합니다."""
+    selected_event = st.selectbox(
+        "분석할 이벤트를 선택하세요",
+        options=FUNNEL_STEPS
+    )
     
-    with col2:
-        st.subheader(f"{selected_event} 이벤트의 기기유형 분포")
-        
-        # 기기 분포 데이터 준비
-        device_dist = event_df.groupby('device_category')['users'].sum().reset_index()
-        total_users = device_dist['users'].sum()
-        device_dist['percentage'] = (device_dist['users'] / total_users * 100).round(1)
-        device_dist['label'] = device_dist.apply(
-            lambda x: f"{x['device_category']} ({x['percentage']:.1f}%)", axis=1
+    with profiler.stage('event_analysis', cached=True):
+        event_outputs = get_result_cache().get_or_compute(
+            section_key + ('event_analysis', selected_event),
+            lambda: prepare_outputs(create_event_analysis_charts(ctx, selected_event))
         )
-        
-        # 기본 파이 차트 (라벨 없이)
-        pie = alt.Chart(device_dist).mark_arc(outerRadius=100).encode(
-            theta=alt.Theta(field='users', type='quantitative', stack=True),
-            color=alt.Color(
-                'device_category:N',
-                title='기기 유형',
-                scale=alt.Scale(scheme='category10')
-            ),
-            tooltip=[
-                alt.Tooltip('device_category:N', title='기기'),
-                alt.Tooltip('users:Q', title='사용자 수', format=','),
-                alt.Tooltip('percentage:Q', title='비율', format='.1f')
-            ]
+    display_event_analysis(selected_event, *event_outputs)
+    
+    # 마지막 날짜에 기준선에서 크게 벗어난 (소스/매체, 기기, 이벤트) 시계열 (펼쳤을 때만 계산)
+    anomaly_expander = st.expander("🚨 오늘의 이상 징후", on_change="rerun", key="anomaly_expander")
+    with anomaly_expander:
+        if not anomaly_expander.open:
+            return
+        with profiler.stage('anomalies', cached=True) as stage:
+            detector = dataset.anomaly_detector
+            anomalies = detector.ranked(filter_spec)
+            stage.rows = len(anomalies)
+        if anomalies.empty:
+            st.info("마지막 날짜에 기준선에서 크게 벗어난 시계열이 없습니다.")
+            return
+        st.dataframe(
+            pd.DataFrame({
+                '소스/매체': anomalies['source_medium'],
+                '기기 유형': anomalies['device_category'],
+                '이벤트': anomalies['event_name'],
+                '사용자 수': anomalies['value'],
+                '기준선': anomalies['baseline'],
+                'z-점수': anomalies['zscore'],
+                '변화': anomalies['direction'].map({'up': '급증', 'down': '급감'})
+            }).style.format({'사용자 수': '{:,.0f}', '기준선': '{:,.1f}', 'z-점수': '{:+.1f}'}),
+            hide_index=True,
+            use_container_width=True
         )
-        
-        # 바깥쪽 레이블 (모든 기기 유형에 대해 동일하게 적용)
-        text = alt.Chart(device_dist).mark_text(
-            radius=120,  # 파이 차트 바깥쪽으로 고정 거리
-            size=12,    # 텍스트 크기 증가
-            align='left',
-            baseline='middle',
-            dx=8        # 약간 오른쪽으로 이동
-        ).encode(
-            theta=alt.Theta(
-                field='users',
-                type='quantitative',
-                stack=True,
-                sort='descending'
-            ),
-            text='label',
-            color=alt.value('black')  # 텍스트 색상 통일
+        st.caption(
+            f"{detector.last_date:%Y-%m-%d} 기준, 이전 날짜들로 만든 기준선 대비 "
+            f"|z| {Z_THRESHOLD:g} 이상인 시계열을 크게 벗어난 순서로 보여줍니다."
         )
-        
-        # 중앙 텍스트를 위한 데이터
-        center_df = pd.DataFrame([{'text': f'총 {total_users:,}명'}])
-        
-        # 중앙 텍스트 (단순화)
-        center_text = alt.Chart(center_df).mark_text(
-            fontSize=14,
-            fontWeight='bold',
-            align='center',
-            baseline='middle'
-        ).encode(
-            text='text:N'
-        )
-        
-        # 차트 결합 및 표시
-        device_chart = (pie + text + center_text).properties(
-            width=350,  # 차트 크기 증가
-            height=350
-        ).configure_view(
-            strokeWidth=0  # 테두리 제거
-        )
-        
-        st.altair_chart(device_chart, use_container_width=True)
+
+def select_sources(catalog):
+    """소스/매체를 검색해 페이지 단위로 고르고 선택한 목록을 반환합니다.
+
+    값이 수만 개여도 위젯에는 한 페이지(SOURCE_PAGE_SIZE개)와 이미 고른 값만 넘기며,
+    검색어나 페이지를 바꿔도 고른 값은 세션에 유지됩니다.
+    """
+    source_users = catalog.values['source_medium']['users']
+    selected = [value for value in st.session_state.get('selected_sources', []) if value in source_users.index]
+    query = st.text_input("소스/매체 검색", placeholder="예: google", key="source_query")
+    _, total = catalog.page('source_medium', query)
+    pages = max(math.ceil(total / SOURCE_PAGE_SIZE), 1)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"페이지 (총 {pages:,}쪽)", min_value=1, max_value=pages, value=1, step=1)
+    page_df, total = catalog.page('source_medium', query, page)
+    
+    # 위젯 값은 키로 세션에 보관되므로 선택지가 바뀌어도 고른 값 유지
+    st.session_state['selected_sources'] = selected
+    options = selected + [value for value in page_df['source_medium'] if value not in selected]
+    selected = st.multiselect(
+        "소스/매체를 선택하세요 (미선택 시 전체)",
+        options=options,
+        format_func=lambda value: f"{value} ({source_users[value]:,}명)",
+        key="selected_sources"
+    )
+    if total:
+        first = (page - 1) * SOURCE_PAGE_SIZE + 1
+        st.caption(f"검색 결과 {total:,}개 중 {first:,}~{first + len(page_df) - 1:,}번째 (사용자 수 순)")
+    else:
+        st.caption("검색 결과가 없습니다.")
+    return selected
 
 # 파일 업로더
-uploaded_file = st.file_uploader("GA4 데이터 파일을 업로드하세요 (CSV)", type=['csv'])
+uploaded_files = st.file_uploader(
+    "GA4 데이터 파일을 업로드하세요 (CSV, 여러 개 선택 가능)",
+    type=['csv'],
+    accept_multiple_files=True
+)
+with profiler.stage('collect_sources') as stage:
+    sources = collect_sources(uploaded_files or [])
+    stage.rows = len(sources)
+
+# 이 세션에서 수집을 취소했거나 처리하지 못한 파일은 제외
+cancelled_files = st.session_state.get('cancelled_files', set())
+failed_files = st.session_state.get('failed_files', set())
+skipped_count = sum(file_hash in cancelled_files for file_hash in sources)
+if skipped_count:
+    st.caption(f"수집을 취소한 파일 {skipped_count}개는 제외했습니다. 다시 반영하려면 페이지를 새로 고쳐 주세요.")
+failed_count = sum(file_hash in failed_files for file_hash in sources)
+if failed_count:
+    st.caption(f"처리하지 못한 파일 {failed_count}개는 제외했습니다. 다시 시도하려면 페이지를 새로 고쳐 주세요.")
+sources = {
+    file_hash: source for file_hash, source in sources.items()
+    if file_hash not in cancelled_files and file_hash not in failed_files
+}
+
+# 대용량 파일은 워커 프로세스에서 집계 (스크립트는 기다리지 않고 진행률만 표시)
+with profiler.stage('background_ingest'):
+    pending_jobs = start_background_ingest(sources)
 
-if uploaded_file is not None:
-    # 데이터 로드
-    df = load_data(uploaded_file)
+if pending_jobs:
+    render_ingest_progress(pending_jobs)
+elif sources:
+    # 데이터 로드 (새 파일만 읽어 누적 큐브에 추가, 이후 모든 조회는 롤업 큐브 대상)
+    try:
+        with profiler.stage('load_data', cached=True) as stage:
+            dataset = load_dataset(sources)
+            stage.rows = len(dataset.cube)
+    except SchemaError as e:
+        show_missing_columns_error(e.missing_columns)
+    except DateFormatError:
+        show_date_format_error()
+    has_malformed = show_malformed_rows(sources)
+    if dataset.cube.empty:
+        # 모든 행이 형식 오류로 제외되면 날짜 범위가 없으므로 사이드바를 만들기 전에 중단
+        message = "집계할 수 있는 유효한 행이 없습니다."
+        if has_malformed:
+            message += " 위의 제외한 행 보고서를 확인해주세요."
+        st.warning(message)
+        st.stop()
+    file_hash = dataset.dataset_hash
+    catalog = dataset.catalog
     
-    # KPI 메트릭 표시
-    display_kpi_metrics(df)
+    # 필터 상태별 섹션 결과 캐시 (최근 조합은 재계산 없이 표시)
+    result_cache = get_result_cache()
+    
+    # 메모리 최적화 결과 표시 (범주형 인코딩 + 정수 다운캐스팅)
+    report = result_cache.get_or_compute((file_hash, 'memory_report'), lambda: memory_report(dataset.cube))
+    st.caption(
+        f"메모리 사용량: {report['before_bytes'] / 1024 ** 2:,.1f}MB → "
+        f"{report['after_bytes'] / 1024 ** 2:,.1f}MB ({report['ratio']:.1f}배 절감)"
+    )
     
-    # 글로벌 필터 - 사이드바에 배치
+    # KPI 메트릭 자리 (기간 비교 설정을 읽은 뒤 채움)
+    kpi_container = st.container()
+    
+    # 글로벌 필터 - 사이드바에 배치 (선택지는 로드할 때 만든 차원 목록에서 읽음)
     with st.sidebar:
         st.header("분석 조건 설정 🎯")
         
@@ -639,68 +683,162 @@ if uploaded_file is not None:
         st.subheader("1. 날짜 범위")
         date_range = st.slider(
             "분석 기간을 선택하세요",
-            min_value=df['date'].min().date(),
-            max_value=df['date'].max().date(),
-            value=(df['date'].min().date(), df['date'].max().date())
+            min_value=catalog.start.date(),
+            max_value=catalog.end.date(),
+            value=(catalog.start.date(), catalog.end.date())
         )
         
-        # 2. 소스/매체 선택
+        # 2. 소스/매체 선택 (검색 + 페이지)
         st.subheader("2. 소스/매체")
-        source_mediums = sorted(df['source_medium'].unique())
-        selected_sources = st.multiselect(
-            "소스/매체를 선택하세요 (미선택 시 전체)",
-            options=source_mediums,
-            default=[]
-        )
+        selected_sources = select_sources(catalog)
         
         # 3. 기기 유형 선택
         st.subheader("3. 기기 유형")
-        device_categories = sorted(df['device_category'].unique())
+        device_categories = catalog.distinct('device_category')
         selected_device = st.radio(
             "기기 유형을 선택하세요",
             options=['전체'] + list(device_categories)
         )
-    
-    # 필터 적용
-    mask = (df['date'].dt.date >= date_range[0]) & (df['date'].dt.date <= date_range[1])
-    if selected_sources:
-        mask = mask & (df['source_medium'].isin(selected_sources))
-    if selected_device != '전체':
-        mask = mask & (df['device_category'] == selected_device)
-    
-    filtered_df = df[mask]
-    
-    # 메인 컨텐츠
-    if len(filtered_df) > 0:
-        # 1. 퍼널 분석
-        st.subheader("1️⃣ 퍼널 분석")
-        funnel_chart = create_funnel_chart(filtered_df)
-        st.altair_chart(funnel_chart, use_container_width=True)
         
-        # 2. 신규/기존 사용자 분석
-        st.subheader("2️⃣ 신규/기존 사용자 분석")
-        bar_chart, ratio_chart = create_users_chart(filtered_df)
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            st.altair_chart(bar_chart, use_container_width=True)
-        with col2:
-            st.altair_chart(ratio_chart, use_container_width=True)
+        # 4. 기간 비교 선택
+        st.subheader("4. 기간 비교")
+        comparison_mode = st.selectbox(
+            "비교할 기간을 선택하세요",
+            options=[None] + list(COMPARISON_MODES),
+            format_func=lambda mode: COMPARISON_MODES.get(mode, '비교 안 함')
+        )
+    
+    # 필터 적용 (pandas는 인덱스로 행 위치를 바로 찾고, duckdb는 WHERE 절로 전달)
+    filter_spec = FilterSpec(
+        date_range=tuple(date_range),
+        sources=tuple(selected_sources),
+        device=None if selected_device == '전체' else selected_device
+    )
+    
+    # 모든 섹션이 공유하는 집계 컨텍스트 (같은 집계를 한 번만 계산하며,
+    # 모든 섹션이 결과 캐시에 있으면 필터링도 하지 않음)
+    ctx = create_aggregation_context(dataset, filter_spec)
+    section_key = (file_hash, filter_spec)
+    
+    # 비교 기간 (같은 소스/매체와 기기, 날짜만 이동). 데이터가 없으면 비교하지 않음
+    comparison = None
+    if comparison_mode is not None:
+        compare_spec = comparison_spec(filter_spec, comparison_mode)
+        compare_ctx = create_aggregation_context(dataset, compare_spec)
+        if count_filtered_rows(dataset, compare_ctx, compare_spec) > 0:
+            comparison = (COMPARISON_MODES[comparison_mode], compare_ctx, (file_hash, compare_spec))
+        else:
+            st.sidebar.caption(
+                f"{COMPARISON_MODES[comparison_mode]}({compare_spec.date_range[0]} ~ "
+                f"{compare_spec.date_range[1]})에 데이터가 없어 비교하지 않습니다."
+            )
+    
+    # KPI 메트릭 표시 (비교하지 않으면 전체 데이터, 비교하면 선택한 조건 기준)
+    with kpi_container:
+        with profiler.stage('kpi', cached=True):
+            if comparison is None:
+                kpis = result_cache.get_or_compute(
+                    (file_hash, 'kpi'),
+                    lambda: compute_kpi_metrics(create_aggregation_context(dataset))
+                )
+                kpi_changes = None
+            else:
+                comparison_label, compare_ctx, compare_key = comparison
+                kpis = result_cache.get_or_compute(section_key + ('kpi',), lambda: compute_kpi_metrics(ctx))
+                previous_kpis = result_cache.get_or_compute(
+                    compare_key + ('kpi',), lambda: compute_kpi_metrics(compare_ctx)
+                )
+                kpi_changes = compare_kpis(kpis, previous_kpis)
+        display_kpi_metrics(kpis, kpi_changes, comparison and comparison[0])
+    
+    # 메인 컨텐츠 (선택된 탭만 실행)
+    with profiler.stage('filter_count') as stage:
+        filtered_rows = stage.rows = count_filtered_rows(dataset, ctx, filter_spec)
+    if filtered_rows > 0:
+        event_options = catalog.distinct('event_name')
+        funnel_tab, users_tab, purchase_tab, event_tab = st.tabs(
+            ["1️⃣ 퍼널 분석", "2️⃣ 신규/기존 사용자 분석", "3️⃣ 구매 전환 집중 날짜", "4️⃣ 행동 탐색"],
+            on_change="rerun",
+            key="section_tab"
+        )
         
-        # 3. 구매 전환 집중 날짜
-        st.subheader("3️⃣ 구매 전환 집중 날짜")
-        purchase_chart = create_purchase_trend_chart(filtered_df)
-        st.altair_chart(purchase_chart, use_container_width=True)
+        if funnel_tab.open:
+            with funnel_tab:
+                render_funnel_section(ctx, section_key, event_options, comparison)
+        if users_tab.open:
+            with users_tab:
+                render_users_section(ctx, section_key)
+        if purchase_tab.open:
+            with purchase_tab:
+                render_purchase_section(ctx, section_key)
+        if event_tab.open:
+            with event_tab:
+                render_event_section(ctx, section_key, dataset, filter_spec)
         
-        # 4. 행동 탐색 섹션
-        st.subheader("4️⃣ 행동 탐색")
-        selected_event = st.selectbox(
-            "분석할 이벤트를 선택하세요",
-            options=FUNNEL_STEPS
+        # 전체 데이터 내려받기 (누를 때 모든 섹션 표를 zip 하나로 묶음)
+        funnel_steps = st.session_state.get(
+            'funnel_steps', [step for step in FUNNEL_STEPS if step in event_options]
+        )
+        st.sidebar.download_button(
+            label="📦 전체 데이터 내려받기 (ZIP)",
+            data=lambda: result_cache.get_or_compute(
+                section_key + ('export_bundle', tuple(funnel_steps)),
+                lambda: build_export_bundle(ctx, section_key, funnel_steps)
+            ),
+            file_name='GA4_분석_데이터.zip',
+            mime='application/zip',
+            on_click='ignore'
         )
-        
-        create_event_analysis_charts(filtered_df, selected_event)
     else:
         st.warning("선택한 조건에 해당하는 데이터가 없습니다. 필터 조건을 조정해 주세요.")
+    
+    # 차트별 전송량 표시
+    chart_payloads = st.session_state.get('chart_payloads', {})
+    if chart_payloads:
+        with st.sidebar.expander("차트 전송량"):
+            st.dataframe(
+                pd.DataFrame(
+                    [(name, raw / 1024, sent / 1024) for name, (raw, sent) in chart_payloads.items()],
+                    columns=['차트', '원본(KB)', '전송(KB)']
+                ).style.format({'원본(KB)': '{:,.1f}', '전송(KB)': '{:,.1f}'}),
+                hide_index=True
+            )
+    
+    # 수집된 파일 목록 (파일 해시 기준으로 한 번씩만 반영)
+    with st.sidebar.expander(f"수집된 파일 ({len(dataset.manifest)}개)"):
+        st.dataframe(
+            pd.DataFrame(
+                [(entry['name'], entry['start'], entry['end'], entry['days']) for entry in dataset.manifest],
+                columns=['파일', '시작일', '종료일', '일수']
+            ),
+            hide_index=True
+        )
+        if WATCH_DIR:
+            st.caption(f"감시 폴더: {WATCH_DIR}")
+    
+    # 이벤트별 데이터 범위 (차원 목록에서 읽음)
+    with st.sidebar.expander(f"이벤트별 데이터 범위 ({len(catalog.events)}개)"):
+        st.dataframe(
+            pd.DataFrame({
+                '이벤트': catalog.events.index,
+                '시작일': catalog.events['first_date'].dt.date,
+                '종료일': catalog.events['last_date'].dt.date,
+                '일수': catalog.events['days'],
+                '사용자 수': catalog.events['users']
+            }).style.format({'사용자 수': '{:,}'}),
+            hide_index=True
+        )
+    
+    # 결과 캐시 상태 표시
+    cache_stats = result_cache.stats()
+    st.sidebar.caption(
+        f"결과 캐시: 적중 {cache_stats['hits']:,} / 미스 {cache_stats['misses']:,} "
+        f"({cache_stats['bytes'] / 1024 ** 2:,.1f}MB / {cache_stats['max_bytes'] / 1024 ** 2:,.0f}MB)"
+    )
 else:
-    st.info("GA4 데이터 파일(CSV)을 업로드해 주세요.")
+    st.info("GA4 데이터 파일(CSV)을 업로드해 주세요. 날짜가 겹치면 나중에 올린 파일 기준으로 합칩니다.")
+
+# 이번 재실행의 측정 결과 기록 (디버그 패널이 켜져 있으면 사이드바에 표시)
+profiler.finish()
+if profiler.panel:
+    render_panel(profiler)
@@ -0,0 +1,132 @@
+"""GA4 형식의 합성 CSV 생성기.
+
+같은 인자로 만들면 항상 같은 파일이 나오며(청크 크기와 무관),
+1만 행부터 1억 행까지 메모리 사용량을 청크 크기로 제한해 씁니다.
+
+    python synthetic.py --rows 1000000 --days 365 --sources 20 --devices 3 --out data.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from funnel import FUNNEL_STEPS
+from ingest import REQUIRED_COLUMNS
+
+# 한 번에 만들어 쓰는 행 수
+GENERATE_CHUNK_ROWS = int(os.environ.get('GA4_SYNTHETIC_CHUNK_ROWS', 1_000_000))
+
+# 실제 데이터와 비슷한 이름을 먼저 쓰고, 부족하면 번호를 붙인 이름을 만듦
+SOURCE_NAMES = ['google / organic', 'naver / cpc', 'direct / none', 'facebook / social',
+                'kakao / referral', 'google / cpc', 'naver / organic', 'instagram / social',
+                'youtube / video', 'newsletter / email']
+DEVICE_NAMES = ['desktop', 'mobile', 'tablet']
+
+# 이전 단계 대비 기본 전환율 (page_view는 1)
+STEP_RATES = np.array([1.0, 0.6, 0.6, 0.6, 0.55, 0.5])
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _names(base, count, pattern):
+    return base[:count] + [pattern.format(i) for i in range(len(base), count)]
+
+
+def _uniform(keys, salt):
+    """정수 키마다 [0, 1) 난수를 결정적으로 만듭니다. (splitmix64 해시)"""
+    with np.errstate(over='ignore'):
+        z = keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(salt)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = (z ^ (z >> np.uint64(31))) & _MASK64
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _normal(keys, salt):
+    """정수 키마다 표준정규 난수를 결정적으로 만듭니다. (Box-Muller)"""
+    u1 = np.maximum(_uniform(keys, salt), 1e-12)
+    u2 = _uniform(keys, salt + 1)
+    return np.sqrt(-2 * np.log(u1)) * np.cos(2 * np.pi * u2)
+
+
+def generate_chunk(start_row, stop_row, rows, days=365, sources=10, devices=3, seed=42,
+                   start_date='2024-01-01'):
+    """전체 rows행 중 [start_row, stop_row) 구간의 합성 데이터를 만듭니다.
+
+    (날짜, 소스/매체, 기기, 퍼널 단계) 셀을 날짜순으로 고르게 채우며,
+    행 수가 셀 수보다 많으면 한 셀을 여러 행으로 나눠(실제 내보내기의 세부 차원처럼)
+    같은 키가 반복됩니다. 단계별 사용자 수는 같은 (날짜, 소스, 기기) 안에서
+    퍼널 순서대로 줄어듭니다.
+    """
+    steps = len(FUNNEL_STEPS)
+    n_cells = days * sources * devices * steps
+    index = np.arange(start_row, stop_row, dtype=np.int64)
+    cell = index * n_cells // rows
+    replicas = max(rows / n_cells, 1.0)
+
+    step = cell % steps
+    group = cell // steps
+    device = group % devices
+    source = (group // devices) % sources
+    day = group // (devices * sources)
+
+    # (날짜, 소스, 기기)별 기본 방문자 수: 소스/기기 규모 × 요일 패턴 × 잡음
+    source_scale = np.exp(1.5 * _normal(source + seed * 1_000_003, 11))
+    device_scale = np.array([1.0, 1.6, 0.3] + [0.2] * max(devices - 3, 0))[device]
+    weekday = 1 + 0.2 * np.sin(2 * np.pi * (day % 7) / 7)
+    base = 800 * source_scale * device_scale * weekday * np.exp(0.25 * _normal(group + seed * 7_919, 13))
+
+    # 단계별 전환율(잡음 포함)을 누적해 퍼널 모양 유지
+    rates = np.cumprod(STEP_RATES)[step] * np.exp(0.1 * _normal(cell + seed * 104_729, 17) * (step > 0))
+    users = np.maximum(np.round(base * rates / replicas * (0.8 + 0.4 * _uniform(index + seed, 19))), 1)
+    new_users = np.floor(users * (0.25 + 0.25 * _uniform(index + seed, 23)))
+    sessions = np.ceil(users * (1.1 + 0.4 * _uniform(index + seed, 29)))
+
+    source_names = np.array(_names(SOURCE_NAMES, sources, 'source{} / referral'))
+    device_names = np.array(_names(DEVICE_NAMES, devices, 'device{}'))
+    frame = pd.DataFrame({
+        'date': (pd.Timestamp(start_date) + pd.to_timedelta(day, unit='D')).strftime('%Y-%m-%d'),
+        'source_medium': source_names[source],
+        'sessions': sessions.astype(np.int64),
+        'users': users.astype(np.int64),
+        'new_users': new_users.astype(np.int64),
+        'device_category': device_names[device],
+        'event_name': np.array(FUNNEL_STEPS)[step],
+        'step': step + 1
+    })
+    return frame[REQUIRED_COLUMNS]
+
+
+def generate_frame(rows, **options):
+    """합성 데이터 전체를 데이터프레임으로 만듭니다. (작은 크기용)"""
+    return generate_chunk(0, rows, rows, **options)
+
+
+def write_csv(path, rows, chunk_rows=GENERATE_CHUNK_ROWS, **options):
+    """합성 데이터를 청크 단위로 CSV 파일에 씁니다."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for start in range(0, rows, chunk_rows):
+            chunk = generate_chunk(start, min(start + chunk_rows, rows), rows, **options)
+            chunk.to_csv(f, index=False, header=start == 0)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GA4 형식의 합성 CSV를 만듭니다.")
+    parser.add_argument('--rows', type=int, default=100_000, help="행 수 (1만~1억)")
+    parser.add_argument('--days', type=int, default=365, help="날짜 수")
+    parser.add_argument('--sources', type=int, default=10, help="소스/매체 수")
+    parser.add_argument('--devices', type=int, default=3, help="기기 유형 수")
+    parser.add_argument('--seed', type=int, default=42, help="난수 시드")
+    parser.add_argument('--start-date', default='2024-01-01', help="시작일 (YYYY-MM-DD)")
+    parser.add_argument('--out', required=True, help="저장할 CSV 경로")
+    args = parser.parse_args(argv)
+
+    write_csv(args.out, args.rows, days=args.days, sources=args.sources, devices=args.devices,
+              seed=args.seed, start_date=args.start_date)
+    print(f"{args.rows:,} rows written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
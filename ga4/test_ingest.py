@@ -0,0 +1,49 @@
+import io
+
+import pandas as pd
+import pytest
+
+from ingest import DateFormatError, read_cube, stream_aggregate
+from synthetic import generate_frame
+
+
+def csv_bytes(frame):
+    return frame.to_csv(index=False).encode('utf-8')
+
+
+@pytest.mark.parametrize('row', [3, 35000])
+def test_stream_aggregate_falls_back_on_non_integer_count(row):
+    # 첫 블록(open_csv가 변환)과 뒤쪽 블록 모두 느린 경로로 다시 읽어야 함
+    frame = generate_frame(40000, days=30).astype({'users': object})
+    frame.loc[row, 'users'] = '1.5'
+    data = csv_bytes(frame)
+
+    cube = stream_aggregate(io.BytesIO(data), chunk_rows=5000)
+    expected = read_cube(io.BytesIO(data))
+    pd.testing.assert_frame_equal(cube, expected)
+
+
+@pytest.mark.parametrize('bad_date', ['not-a-date', '2024-02-30'])
+@pytest.mark.parametrize('streaming', [False, True])
+def test_loose_path_reports_bad_dates(bad_date, streaming):
+    # 빈 지표 값으로 느린 경로를 타는 파일도 날짜 오류 행만 제외하고 보고해야 함
+    frame = generate_frame(2000, days=30).astype({'sessions': object})
+    frame.loc[5, 'sessions'] = ''
+    frame.loc[7, 'date'] = bad_date
+    reports = []
+    if streaming:
+        stream_aggregate(io.BytesIO(csv_bytes(frame)), chunk_rows=500, on_malformed=reports.append)
+    else:
+        read_cube(io.BytesIO(csv_bytes(frame)), on_malformed=reports.append)
+
+    report = reports[0].set_index('rule')
+    assert report.loc['bad_date', 'rows'] == 1
+    assert report.loc['bad_date', 'lines'] == [9]
+
+
+def test_loose_path_rejects_file_without_any_date():
+    frame = generate_frame(100, days=5).assign(date='not-a-date')
+    with pytest.raises(DateFormatError):
+        read_cube(io.BytesIO(csv_bytes(frame)))
+    with pytest.raises(DateFormatError):
+        stream_aggregate(io.BytesIO(csv_bytes(frame)), chunk_rows=30)
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from anomalies import AnomalyDetector
+from catalog import DimensionCatalog
+from cube import build_cube
+from incremental import DatasetRegistry
+from shared_store import SharedDatasetStore
+from synthetic import generate_frame
+
+
+def daily_cubes(files=3, days=30):
+    """날짜가 이어지는 파일별 큐브 {해시: 큐브}"""
+    frame = generate_frame(3000, days=files * days)
+    frame['date'] = pd.to_datetime(frame['date'])
+    bounds = pd.date_range(frame['date'].min(), periods=files + 1, freq=f'{days}D')
+    return {
+        f'file{i}': build_cube(frame[(frame['date'] >= start) & (frame['date'] < end)])
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    }
+
+
+def count_calls(monkeypatch, cls, name, counts):
+    original = getattr(cls, name)
+
+    def wrapper(*args, **kwargs):
+        key = f'{cls.__name__}.{name}'
+        counts[key] = counts.get(key, 0) + 1
+        return original(*args, **kwargs)
+    monkeypatch.setattr(cls, name, wrapper)
+
+
+@pytest.mark.parametrize('with_store', [False, True])
+def test_append_after_share_extends_derived_values(tmp_path, monkeypatch, with_store):
+    counts = {}
+    for cls, name in [(DimensionCatalog, '__init__'), (DimensionCatalog, 'extend'),
+                      (AnomalyDetector, 'fit'), (AnomalyDetector, 'update')]:
+        count_calls(monkeypatch, cls, name, counts)
+
+    cubes = daily_cubes()
+    store = SharedDatasetStore(str(tmp_path)) if with_store else None
+    registry = DatasetRegistry(store=store)
+    files = []
+    for file_hash in cubes:
+        files.append((file_hash, f'{file_hash}.csv'))
+        dataset = registry.get(files, cubes.__getitem__).warm('catalog', 'anomaly_detector')
+
+    # 첫 파일만 처음부터 계산하고, 이후 파일은 새 행만 반영
+    assert counts == {
+        'DimensionCatalog.__init__': 1, 'DimensionCatalog.extend': 2,
+        'AnomalyDetector.fit': 1, 'AnomalyDetector.update': 2,
+    }
+    expected = DimensionCatalog(dataset.cube)
+    assert dataset.catalog.rows == expected.rows == len(dataset.cube)
+    pd.testing.assert_frame_equal(dataset.catalog.events, expected.events)
@@ -0,0 +1,262 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# 단계별 측정 결과를 한 줄씩 추가할 JSON Lines 파일 (비어 있으면 사용 안 함)
+PROFILE_JSONL = os.environ.get('DASHBOARD_PROFILE_JSONL', '')
+
+# Prometheus node_exporter textfile 수집기용 파일 (비어 있으면 사용 안 함)
+PROFILE_TEXTFILE = os.environ.get('DASHBOARD_PROFILE_TEXTFILE', '')
+
+# 사이드바 디버그 패널 표시 여부 (URL에 ?debug=1 을 붙여도 표시)
+PROFILE_PANEL = os.environ.get('DASHBOARD_PROFILE_PANEL', '') == '1'
+
+# 소요 시간 히스토그램 구간(초)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 패널에 p50/p99를 보여줄 때 사용하는 최근 재실행 수
+RECENT_RUNS = 200
+
+_local = threading.local()
+
+
+def _rss_bytes():
+    """현재 프로세스의 상주 메모리(RSS). 확인할 수 없는 플랫폼에서는 None입니다."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _active_stages():
+    stages = getattr(_local, 'stages', None)
+    if stages is None:
+        stages = _local.stages = []
+    return stages
+
+
+def mark_cache_miss():
+    """현재 스레드에서 측정 중인 가장 안쪽의 캐시 사용 단계를 미스로 표시합니다.
+
+    캐시된 계산의 본문(캐시 미스일 때만 실행됨)에서 호출합니다.
+    측정 중인 단계가 없으면 아무것도 하지 않습니다.
+    """
+    for stage in reversed(_active_stages()):
+        if stage.cache is not None:
+            stage.cache = 'miss'
+            return
+
+
+class StageRecord:
+    """한 단계의 측정 결과입니다. rows는 측정 중에 호출한 쪽에서 채웁니다."""
+
+    __slots__ = ('name', 'wall_seconds', 'cpu_seconds', 'rows', 'memory_delta_bytes', 'cache')
+
+    def __init__(self, name, cached=False):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = None
+        self.memory_delta_bytes = None
+        self.cache = 'hit' if cached else None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MetricsRegistry:
+    """프로세스 전체의 단계별 소요 시간 히스토그램과 캐시 적중 횟수를 누적합니다.
+
+    여러 세션이 같은 인스턴스에 기록하므로 모든 변경은 잠금 안에서 수행합니다.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, recent_runs=RECENT_RUNS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._cache_counts = {}
+        self._recent = {}
+        self._recent_runs = recent_runs
+        self._lock = threading.Lock()
+
+    def observe(self, app, record):
+        with self._lock:
+            counts, total = self._histograms.get((app, record.name), ([0] * len(self.buckets), [0.0, 0]))
+            for i, bound in enumerate(self.buckets):
+                if record.wall_seconds <= bound:
+                    counts[i] += 1
+            total[0] += record.wall_seconds
+            total[1] += 1
+            self._histograms[(app, record.name)] = (counts, total)
+            if record.cache is not None:
+                key = (app, record.name, record.cache)
+                self._cache_counts[key] = self._cache_counts.get(key, 0) + 1
+            if record.name == 'rerun':
+                self._recent.setdefault(app, deque(maxlen=self._recent_runs)).append(record.wall_seconds)
+
+    def rerun_percentiles(self, app):
+        """최근 재실행 소요 시간의 (p50, p99, 표본 수). 기록이 없으면 None입니다."""
+        with self._lock:
+            samples = sorted(self._recent.get(app, ()))
+        if not samples:
+            return None
+
+        def percentile(q):
+            return samples[max(math.ceil(q * len(samples)) - 1, 0)]
+        return percentile(0.5), percentile(0.99), len(samples)
+
+    def render_textfile(self):
+        """Prometheus 텍스트 형식으로 변환합니다."""
+        lines = [
+            '# HELP dashboard_stage_seconds Wall time of each dashboard stage.',
+            '# TYPE dashboard_stage_seconds histogram'
+        ]
+        with self._lock:
+            for (app, stage), (counts, (total, count)) in sorted(self._histograms.items()):
+                labels = f'app="{app}",stage="{stage}"'
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'dashboard_stage_seconds_bucket{{{labels},le="{bound}"}} {bucket_count}')
+                lines.append(f'dashboard_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'dashboard_stage_seconds_sum{{{labels}}} {total:.6f}')
+                lines.append(f'dashboard_stage_seconds_count{{{labels}}} {count}')
+            lines.append('# HELP dashboard_stage_cache_total Cache hits and misses of cached stages.')
+            lines.append('# TYPE dashboard_stage_cache_total counter')
+            for (app, stage, result), count in sorted(self._cache_counts.items()):
+                lines.append(f'dashboard_stage_cache_total{{app="{app}",stage="{stage}",result="{result}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """textfile 수집기가 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체합니다."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_textfile())
+        os.replace(tmp_path, path)
+
+
+_REGISTRY = MetricsRegistry()
+_jsonl_lock = threading.Lock()
+
+
+def get_registry():
+    """프로세스 전체에서 공유하는 지표 누적기를 반환합니다."""
+    return _REGISTRY
+
+
+class Profiler:
+    """스크립트 실행 한 번(rerun)의 단계별 소요 시간, CPU 시간, 처리 행 수,
+    메모리 변화, 캐시 적중 여부를 기록합니다.
+
+    각 단계는 끝날 때 JSON Lines 파일에 기록되고 프로세스 지표에 누적됩니다.
+    finish()를 호출하면 전체 재실행 시간을 'rerun' 단계로 남기고
+    Prometheus textfile을 갱신합니다. fragment만 다시 실행될 때처럼 finish() 이후에
+    기록된 단계는 textfile에도 바로 반영합니다. 기록할 곳도 패널도 없으면
+    측정하지 않습니다.
+    """
+
+    def __init__(self, app, panel=False, jsonl_path=PROFILE_JSONL, textfile_path=PROFILE_TEXTFILE,
+                 registry=None):
+        self.app = app
+        self.panel = panel
+        self.jsonl_path = jsonl_path
+        self.textfile_path = textfile_path
+        self.enabled = bool(panel or jsonl_path or textfile_path)
+        self.registry = registry or _REGISTRY
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self.finished = False
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+
+    @contextmanager
+    def stage(self, name, cached=False):
+        """with 블록을 한 단계로 측정합니다. cached=True면 mark_cache_miss()가 없을 때 적중으로 기록합니다."""
+        record = StageRecord(name, cached)
+        if not self.enabled:
+            yield record
+            return
+        rss_before = _rss_bytes()
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+        stages = _active_stages()
+        stages.append(record)
+        try:
+            yield record
+        finally:
+            stages.remove(record)
+            record.wall_seconds = time.perf_counter() - started
+            record.cpu_seconds = time.thread_time() - cpu_started
+            rss_after = _rss_bytes()
+            if rss_before is not None and rss_after is not None:
+                record.memory_delta_bytes = rss_after - rss_before
+            self._emit(record)
+
+    def finish(self):
+        """재실행 전체 시간을 기록하고 textfile을 갱신합니다."""
+        if not self.enabled or self.finished:
+            return
+        record = StageRecord('rerun')
+        record.wall_seconds = time.perf_counter() - self._started
+        record.cpu_seconds = time.thread_time() - self._cpu_started
+        self.finished = True
+        self._emit(record)
+
+    def _emit(self, record):
+        self.records.append(record)
+        self.registry.observe(self.app, record)
+        if self.jsonl_path:
+            line = json.dumps({'ts': time.time(), 'app': self.app, 'run_id': self.run_id,
+                               **record.as_dict()})
+            with _jsonl_lock, open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        if self.textfile_path and self.finished:
+            self.registry.write_textfile(self.textfile_path)
+
+    def table(self):
+        """패널에 표시할 단계별 측정 결과 행 목록"""
+        return [
+            {
+                '단계': record.name,
+                '시간(ms)': record.wall_seconds * 1000,
+                'CPU(ms)': record.cpu_seconds * 1000,
+                '행 수': record.rows,
+                '메모리(MB)': (record.memory_delta_bytes / 1024 ** 2
+                             if record.memory_delta_bytes is not None else None),
+                '캐시': record.cache or '-'
+            }
+            for record in self.records
+        ]
+
+
+def panel_enabled():
+    """디버그 패널을 표시할지 여부 (DASHBOARD_PROFILE_PANEL=1 또는 URL의 ?debug=1)"""
+    import streamlit as st
+    return PROFILE_PANEL or st.query_params.get('debug') == '1'
+
+
+def render_panel(profiler):
+    """사이드바에 이번 재실행의 단계별 측정 결과와 최근 재실행 p50/p99를 표시합니다.
+
+    profiler.finish()를 먼저 호출해 재실행 전체 시간까지 포함되게 합니다.
+    """
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ 성능 프로파일", expanded=True):
+        percentiles = profiler.registry.rerun_percentiles(profiler.app)
+        if percentiles is not None:
+            p50, p99, count = percentiles
+            st.caption(f"최근 {count}회 재실행: p50 {p50 * 1000:,.0f}ms / p99 {p99 * 1000:,.0f}ms")
+        st.dataframe(
+            pd.DataFrame(profiler.table()).style.format({
+                '시간(ms)': '{:,.1f}',
+                'CPU(ms)': '{:,.1f}',
+                '행 수': '{:,.0f}',
+                '메모리(MB)': '{:+,.1f}'
+            }, na_rep='-'),
+            hide_index=True
+        )
@@ -4,6 +4,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from profiling import Profiler, mark_cache_miss, panel_enabled, render_panel
+
 # Streamlit 페이지 설정
 st.set_page_config(page_title="Titanic 데이터 시각화 대시보드", layout="wide")
 
@@ -11,9 +13,13 @@ st.set_page_config(page_title="Titanic 데이터 시각화 대시보드", layout
 st.title("🚢 Titanic 데이터 시각화 대시보드")
 st.markdown("---")
 
+# 이번 재실행의 단계별 성능 측정 (DASHBOARD_PROFILE_* 설정 또는 ?debug=1 일 때만 측정)
+profiler = Profiler('titanic', panel=panel_enabled())
+
 # 데이터 생성 함수
 @st.cache_data
 def generate_titanic_data():
+    mark_cache_miss()
     # Set random seed for reproducibility
     np.random.seed(42)
     
@@ -81,7 +87,9 @@ def generate_titanic_data():
     return df
 
 # 데이터 생성
-df = generate_titanic_data()
+with profiler.stage('generate_data', cached=True) as stage:
+    df = generate_titanic_data()
+    stage.rows = len(df)
 
 # 데이터 개요
 st.subheader("📊 데이터 개요")
@@ -105,43 +113,47 @@ st.markdown("---")
 # 시각화 섹션
 st.subheader("📈 데이터 시각화")
 
-# 세 개의 그래프를 하나의 subplot으로 생성
-fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 5))
-
-# 첫 번째 그래프: 성별별 생존율
-survival_by_sex = df.groupby('Sex')['Survived'].mean().reset_index()
-sns.barplot(data=survival_by_sex, x='Sex', y='Survived', hue='Sex', palette='viridis', legend=False, ax=ax1)
-ax1.set_title('Survival Rate by Gender', fontsize=12, fontweight='bold')
-ax1.set_xlabel('Gender', fontsize=10)
-ax1.set_ylabel('Survival Rate', fontsize=10)
-ax1.set_ylim(0, 1)
-
-# 값 표시
-for i, v in enumerate(survival_by_sex['Survived']):
-    ax1.text(i, v + 0.02, f'{v:.1%}', ha='center', va='bottom', fontweight='bold', fontsize=9)
-
-# 두 번째 그래프: 나이 분포
-sns.histplot(data=df, x='Age', bins=20, kde=True, color='skyblue', ax=ax2)
-ax2.set_title('Age Distribution of Passengers', fontsize=12, fontweight='bold')
-ax2.set_xlabel('Age', fontsize=10)
-ax2.set_ylabel('Frequency', fontsize=10)
-ax2.axvline(df['Age'].mean(), color='red', linestyle='--', 
-            label=f'Mean: {df["Age"].mean():.1f} years')
-ax2.legend(fontsize=8)
-
-# 세 번째 그래프: Pclass별 요금 평균
-fare_by_class = df.groupby('Pclass')['Fare'].mean().reset_index()
-sns.barplot(data=fare_by_class, x='Pclass', y='Fare', hue='Pclass', palette='Set2', legend=False, ax=ax3)
-ax3.set_title('Average Fare by Passenger Class', fontsize=12, fontweight='bold')
-ax3.set_xlabel('Passenger Class', fontsize=10)
-ax3.set_ylabel('Average Fare ($)', fontsize=10)
-
-# 값 표시
-for i, v in enumerate(fare_by_class['Fare']):
-    ax3.text(i, v + 1, f'${v:.1f}', ha='center', va='bottom', fontweight='bold', fontsize=9)
-
-plt.tight_layout()
-st.pyplot(fig)
+with profiler.stage('plots') as stage:
+    stage.rows = len(df)
+    # 세 개의 그래프를 하나의 subplot으로 생성
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 5))
+
+    # 첫 번째 그래프: 성별별 생존율
+    survival_by_sex = df.groupby('Sex')['Survived'].mean().reset_index()
+    sns.barplot(data=survival_by_sex, x='Sex', y='Survived', hue='Sex', palette='viridis', legend=False, ax=ax1)
+    ax1.set_title('Survival Rate by Gender', fontsize=12, fontweight='bold')
+    ax1.set_xlabel('Gender', fontsize=10)
+    ax1.set_ylabel('Survival Rate', fontsize=10)
+    ax1.set_ylim(0, 1)
+
+    # 값 표시
+    for i, v in enumerate(survival_by_sex['Survived']):
+        ax1.text(i, v + 0.02, f'{v:.1%}', ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+    # 두 번째 그래프: 나이 분포
+    sns.histplot(data=df, x='Age', bins=20, kde=True, color='skyblue', ax=ax2)
+    ax2.set_title('Age Distribution of Passengers', fontsize=12, fontweight='bold')
+    ax2.set_xlabel('Age', fontsize=10)
+    ax2.set_ylabel('Frequency', fontsize=10)
+    ax2.axvline(df['Age'].mean(), color='red', linestyle='--', 
+                label=f'Mean: {df["Age"].mean():.1f} years')
+    ax2.legend(fontsize=8)
+
+    # 세 번째 그래프: Pclass별 요금 평균
+    fare_by_class = df.groupby('Pclass')['Fare'].mean().reset_index()
+    sns.barplot(data=fare_by_class, x='Pclass', y='Fare', hue='Pclass', palette='Set2', legend=False, ax=ax3)
+    ax3.set_title('Average Fare by Passenger Class', fontsize=12, fontweight='bold')
+    ax3.set_xlabel('Passenger Class', fontsize=10)
+    ax3.set_ylabel('Average Fare ($)', fontsize=10)
+
+    # 값 표시
+    for i, v in enumerate(fare_by_class['Fare']):
+        ax3.text(i, v + 1, f'${v:.1f}', ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+    plt.tight_layout()
+
+with profiler.stage('render:pyplot'):
+    st.pyplot(fig)
 
 # 추가 인사이트
 st.markdown("---")
@@ -168,10 +180,17 @@ with insight_col3:
 st.markdown("---")
 st.subheader("💾 데이터 다운로드")
 
-csv = df.to_csv(index=False)
+with profiler.stage('export:csv') as stage:
+    csv = df.to_csv(index=False)
+    stage.rows = len(df)
 st.download_button(
     label="CSV 파일로 다운로드",
     data=csv,
     file_name='titanic_random_data.csv',
     mime='text/csv'
 )
+
+# 이번 재실행의 측정 결과 기록 (디버그 패널이 켜져 있으면 사이드바에 표시)
+profiler.finish()
+if profiler.panel:
+    render_panel(profiler)